@@ -94,15 +94,29 @@ if %errorlevel% == 0 (
 goto :eof
 
 :compress_assets
+echo    Publishing content-hashed images...
+rem Copies the variants image_manifest.json names by content hash (--hashed-names) into build/web
+python scripts\hashed_assets.py build/web
+if %errorlevel% neq 0 (
+    echo    WARNING: Publishing hashed images failed, continuing...
+)
 echo    Creating compressed versions...
-powershell -Command "Get-ChildItem -Recurse build/web -Include *.js,*.css,*.json,*.html | ForEach-Object { $gzFile = $_.FullName + '.gz'; if (!(Test-Path $gzFile)) { $input = [System.IO.File]::ReadAllBytes($_.FullName); $output = New-Object System.IO.MemoryStream; $gzip = New-Object System.IO.Compression.GZipStream $output, ([System.IO.Compression.CompressionMode]::Compress); $gzip.Write($input, 0, $input.Length); $gzip.Close(); [System.IO.File]::WriteAllBytes($gzFile, $output.ToArray()); $output.Close(); Write-Host \"Compressed: $($_.Name)\" } }"
-echo    Assets compressed with gzip
+rem Writes .br/.zst/.gz sidecars only where they save bytes (brotli/zstandard optional)
+python scripts\precompress.py build/web
+if %errorlevel% neq 0 (
+    echo    WARNING: Precompression failed, continuing...
+)
 goto :eof
 
 :generate_sw
 echo    Generating service worker...
-powershell -Command "$sw = '@echo off`nconst CACHE_NAME = \"tripbasket-v' + (Get-Date -Format 'yyyyMMddHHmm') + '\";`nconst urlsToCache = [`n  \"/\",`n  \"/main.dart.js\",`n  \"/flutter.js\",`n  \"/assets/FontManifest.json\",`n  \"/assets/AssetManifest.json\"`n];`n`nself.addEventListener(\"install\", event => {`n  event.waitUntil(`n    caches.open(CACHE_NAME).then(cache => cache.addAll(urlsToCache))`n  );`n});`n`nself.addEventListener(\"fetch\", event => {`n  event.respondWith(`n    caches.match(event.request).then(response => {`n      return response || fetch(event.request);`n    })`n  );`n});'; $sw | Out-File -FilePath 'build/web/sw.js' -Encoding UTF8"
-echo    Service worker generated
+rem Injects the precache manifest (app shell + hero variants) into web\sw-optimized.js
+python scripts\precache_manifest.py build/web --sw-name sw.js
+if %errorlevel% neq 0 (
+    echo    WARNING: Service worker generation failed, continuing...
+) else (
+    echo    Service worker generated
+)
 goto :eof
 
 :end
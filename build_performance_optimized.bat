@@ -143,8 +143,11 @@ Set-Content 'index.html' $indexContent;"
 
 echo.
 echo [7/8] Service Worker optimization...
-if exist "..\..\web\sw-optimized.js" (
-  copy "..\..\web\sw-optimized.js" "flutter_service_worker.js" >nul
+REM Injects the precache manifest (app shell + hero variants) into web\sw-optimized.js
+python ..\..\scripts\precache_manifest.py . --sw-name flutter_service_worker.js
+if %errorlevel% neq 0 (
+  echo Warning: Precache manifest generation failed
+) else (
   echo Optimized service worker installed
 )
 
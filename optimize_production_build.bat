@@ -28,11 +28,12 @@ echo Source maps removed
 
 echo.
 echo [3/6] Optimizing service worker...
-if exist "..\..\web\sw-optimized.js" (
-  copy "..\..\web\sw-optimized.js" "sw.js" >nul
-  echo Custom service worker installed
+REM Injects the precache manifest (app shell + hero variants) into web\sw-optimized.js
+python ..\..\scripts\precache_manifest.py . --sw-name sw.js
+if %errorlevel% neq 0 (
+  echo Warning: Precache manifest generation failed
 ) else (
-  echo Warning: Optimized service worker not found
+  echo Custom service worker installed
 )
 
 echo.
@@ -0,0 +1,975 @@
+#!/usr/bin/env python3
+"""
+TripBasket Unified Asset Pipeline
+- Walks the project once and decodes every source image once
+- Renders every image target from the same decoded pixels:
+    optimized  assets/images/optimized/<name>.webp   (auto_optimize_images.py)
+    variants   responsive sizes + .br/.zst/.gz sidecars (optimize_web_images.py)
+    webp       PNG -> WebP next to the source         (optimize_images.py)
+    hero       byte-budgeted hero WebP                (compress_hero_images.py)
+    atlas      icons/badges packed into sprite atlases (sprite_atlas.py)
+- Stages: discover -> filter -> decode -> resize -> encode -> compress -> manifest
+- Remote trip images (--trips-csv) are prefetched and rendered as variants (remote_images.py)
+- Shares the build cache, should_optimize / should_convert_to_webp and size_configs
+- The single-target scripts run it with PipelineSettings and their own report, keeping their output
+- --profile records per-stage timings (and --profile-memory peak memory) as a Chrome trace
+- --quality-search picks WebP qualities per image by SSIM (perceptual_quality.py)
+- --memory-budget decodes at reduced scale and admits work by estimated memory (memory_budget.py)
+- --watch rebuilds only added/changed sources and cleans up after deleted ones (watch_assets.py)
+- The atlas target packs the small icons and badges the other targets skip (sprite_atlas.py)
+- --dedup encodes duplicate and near-duplicate sources once, aliasing the rest (image_dedup.py)
+- --hashed-names points srcset at content-hashed variant URLs for immutable caching (hashed_assets.py)
+"""
+
+import os
+import sys
+import json
+import argparse
+import importlib.util
+from dataclasses import dataclass, field
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+
+from build_cache import BuildCache
+from image_formats import DEFAULT_QUALITY_TARGET
+from image_modes import normalize, MODE_HANDLING_VERSION
+from memory_budget import (DEFAULT_MAX_PIXELS, MB, open_image, bounding_box, apply_draft,
+                           reduce_for, estimate_bytes, pool_size, budgeted_map, parse_budget)
+from perceptual_quality import QualitySearch, DEFAULT_SSIM_TARGET
+from file_index import FileIndex, PRUNED_DIRS, default_index_path, project_pruned_paths
+from instrumentation import PROFILER, stage
+from auto_optimize_images import TripBasketImageOptimizer
+from optimize_web_images import WebImageOptimizer
+from optimize_images import should_convert_to_webp, save_as_webp, webp_settings, update_pubspec_references
+from compress_hero_images import compress_loaded_image
+from precompress import ENCODINGS
+from sprite_atlas import SpriteAtlasPacker
+from image_dedup import DedupIndex, DEFAULT_MAX_DISTANCE
+from hashed_assets import missing_header_rules
+
+# Pipeline stages, in execution order
+STAGES = ['discover', 'filter', 'dedup', 'decode', 'resize', 'encode', 'compress', 'atlas', 'manifest']
+
+# Output targets, in render order (hero runs after optimized so it wins on a shared path).
+# atlas packs the small images the other targets skip, after them
+TARGETS = ['optimized', 'variants', 'webp', 'hero', 'atlas']
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+# Targets whose outputs a duplicate source takes from its canonical source
+# (webp and hero outputs sit at fixed paths that code refers to, so they are kept)
+DEDUP_TARGETS = ('optimized', 'variants')
+
+# Hero images compressed to a byte budget
+HERO_IMAGES = [
+    '200611101955-01-egypt-dahab.webp'
+]
+
+
+@dataclass
+class PipelineSettings:
+    """Options of a pipeline run; each field matches the asset_pipeline.py flag of the same name"""
+    targets: list = field(default_factory=lambda: list(TARGETS))
+    jobs: Optional[int] = None              # worker processes (None = CPU count, 1 = serial)
+    use_cache: bool = True
+    use_index: bool = True
+
+    # variants
+    resize_mode: str = 'direct'
+    min_psnr: Optional[float] = None
+    min_ssim: Optional[float] = None
+    formats: Optional[list] = None
+    quality_target: Optional[float] = None
+    hashed_names: bool = False
+
+    # webp and hero
+    webp_quality: int = 85
+    hero_images: list = field(default_factory=lambda: list(HERO_IMAGES))
+    hero_max_size_kb: float = 150
+    hero_min_scale: Optional[float] = None
+
+    # optimized and variants
+    quality_search: bool = False
+    ssim_target: Optional[float] = None
+    dedup: bool = False
+    dedup_distance: int = DEFAULT_MAX_DISTANCE
+
+    memory_budget: Optional[int] = None     # bytes (None = unbounded)
+    max_pixels: Optional[int] = DEFAULT_MAX_PIXELS
+    update_pubspec: bool = False
+    profile: bool = False
+    profile_memory: bool = False
+
+
+class PipelineReport:
+    """
+    Console output of a run. The single-target scripts pass their own report
+    (same methods) so they keep printing the format they always have.
+    """
+
+    def start(self, pipeline):
+        print("TripBasket Asset Pipeline")
+        print("=" * 60)
+        print(f"Targets: {', '.join(pipeline.targets)}")
+
+    def planned(self, pipeline, candidates, planned, incremental):
+        if incremental:
+            print(f"Changed {len(candidates)} image files")
+        else:
+            print(f"Found {len(candidates)} image files ({pipeline.index.summary()})")
+        print(f"Processing {len(planned)} sources ({sum(len(o) for _, o in planned)} outputs)")
+        print("-" * 60)
+
+    def source(self, pipeline, path, outputs, results):
+        print(f"Processing: {path.relative_to(pipeline.project_root).as_posix()}")
+        for output, result in zip(outputs, results):
+            if not result['success']:
+                name = output['paths'][0].relative_to(pipeline.project_root).as_posix()
+                print(f"   {name}: failed ({result['error']})")
+                continue
+            name = pipeline.primary_path(output, result).relative_to(pipeline.project_root).as_posix()
+            status = " (cached)" if result.get('cached') else ""
+            print(f"   {name}: {pipeline.output_size(output, result):,} bytes"
+                  f"{pipeline.describe(output, result)}{status}")
+
+    def summary(self, pipeline, totals, total_original):
+        print("=" * 60)
+        print("PIPELINE SUMMARY")
+        print("=" * 60)
+        print(f"Source total size:     {total_original:,} bytes ({total_original/1024/1024:.2f} MB)")
+        for target, total in totals.items():
+            failed = f", {total['failed']} failed" if total['failed'] else ""
+            print(f"{target:<10} {total['outputs']} outputs, {total['bytes']:,} bytes{failed}")
+        print(pipeline.cache.summary())
+        if pipeline.quality_search is not None:
+            print(pipeline.quality_search.summary())
+
+
+class AssetPipeline:
+    def __init__(self, project_root, settings=None, report=None):
+        self.project_root = Path(project_root)
+        self.assets_path = self.project_root / 'assets' / 'images'
+        self.settings = settings = settings or PipelineSettings()
+        self.report = report or PipelineReport()
+        self.targets = [target for target in TARGETS if target in settings.targets]
+
+        # Worker processes used to render sources (1 = serial)
+        self.jobs = settings.jobs or os.cpu_count() or 1
+
+        # Memory budget in bytes (None = unbounded). When set, sources are decoded
+        # at reduced scale where every pending output is smaller, and work is
+        # only submitted while the in-flight estimates fit the budget
+        self.memory_budget = settings.memory_budget
+        self.bounded = settings.memory_budget is not None
+        
+        # Sources above this many pixels are skipped before decoding (None or 0 = no
+        # limit); it stands in for Pillow's limit only around our own opens (open_image)
+        self.max_pixels = settings.max_pixels or None
+        
+        # Source headers (size, mode, format) recorded while planning, for estimates
+        self.headers = {}
+
+        # Per-image WebP quality by SSIM for the optimized and variants targets;
+        # workers get a snapshot and their choices are recorded in execute()
+        self.quality_search = None
+        if settings.quality_search:
+            self.quality_search = QualitySearch(self.project_root, settings.ssim_target or DEFAULT_SSIM_TARGET,
+                                                use_cache=settings.use_cache)
+
+        # Exact and near-duplicate sources are encoded once; the others become
+        # aliases of their group's canonical source ({path: alias info})
+        self.dedup = None
+        if settings.dedup:
+            self.dedup = DedupIndex(self.project_root, settings.dedup_distance, use_cache=settings.use_cache)
+        self.aliases = {}
+
+        # Target implementations; the pipeline owns caching, so theirs is off
+        self.optimizer = TripBasketImageOptimizer(self.project_root, jobs=1, use_cache=False,
+                                                  quality_search=self.quality_search,
+                                                  bounded_memory=self.bounded, max_pixels=self.max_pixels)
+        self.web = WebImageOptimizer(self.project_root, use_cache=False,
+                                     resize_mode=settings.resize_mode, min_psnr=settings.min_psnr,
+                                     min_ssim=settings.min_ssim,
+                                     formats=settings.formats, quality_target=settings.quality_target,
+                                     quality_search=self.quality_search, hashed_names=settings.hashed_names)
+        self.cache = BuildCache(self.project_root, enabled=settings.use_cache)
+
+        # Persisted directory listings so unchanged directories aren't listed again
+        self.index_path = default_index_path(self.project_root) if settings.use_index else None
+        self.index = None
+
+        # Icons and badges skipped above, packed into sprite atlases
+        self.atlas = SpriteAtlasPacker(self.project_root, optimizer=self.optimizer, web=self.web,
+                                       use_index=settings.use_index)
+
+        # Stage instrumentation (see instrumentation.py); off unless requested
+        self.profile = settings.profile or settings.profile_memory
+        PROFILER.configure(self.profile, settings.profile_memory)
+
+        # (source, outputs, results) for every processed source, in order
+        self.records = []
+
+    def __getstate__(self):
+        # Worker processes only need the target settings
+        state = self.__dict__.copy()
+        state['cache'] = None
+        state['records'] = []
+        state['headers'] = {}
+        state['dedup'] = None
+        state['aliases'] = {}
+        return state
+
+    def hero_settings(self):
+        """Settings that affect the bytes of a hero output"""
+        return {
+            'tool': 'compress_hero_images',
+            'max_size_kb': self.settings.hero_max_size_kb,
+            'quality': 55,
+            'min_quality': 35,
+            'min_scale': self.settings.hero_min_scale,
+            'mode_handling': MODE_HANDLING_VERSION,
+        }
+
+    # Stage: discover
+
+    def discover(self):
+        """Walk the tree once (pruned, index-backed), returning candidate image files in sorted order"""
+        # Only in-place WebP conversion looks outside assets/images
+        root = self.project_root if 'webp' in self.targets else self.assets_path
+
+        # optimized/ holds this pipeline's own outputs
+        self.index = FileIndex(root, IMAGE_EXTENSIONS, PRUNED_DIRS | {self.web.optimized_path.name},
+                               self.index_path, project_pruned_paths(self.project_root, root))
+        return self.index.paths()
+
+    # Stage: filter
+
+    def plan(self, path):
+        """
+        List the outputs each enabled target wants for a source. Each output is
+        a dict with 'target', 'paths' (first path is the cache key), 'settings'
+        and 'box', the largest size it needs from the decode (None = full size).
+        """
+        outputs = []
+        suffix = path.suffix.lower()
+        in_assets = self.assets_path in path.parents
+        if self.web.optimized_path in path.parents:
+            return outputs
+
+        # Path and size filters first, so only sources some target wants are opened
+        wants_optimized = ('optimized' in self.targets and in_assets
+                           and suffix in ('.jpg', '.jpeg', '.png') and self.optimizer.should_optimize(path))
+        wants_variants = ('variants' in self.targets and path.parent == self.assets_path
+                          and self.web.should_process(path) and not self.is_converted_sibling(path))
+        wants_webp = 'webp' in self.targets and suffix == '.png' and should_convert_to_webp(path)
+        hero_source = None
+        if 'hero' in self.targets and path.parent == self.assets_path and path.name in self.settings.hero_images:
+            hero_source = self.hero_source(path)
+        wants_hero = hero_source is not None and hero_source.stat().st_size > self.settings.hero_max_size_kb * 1024
+        if not (wants_optimized or wants_variants or wants_webp or wants_hero):
+            return outputs
+
+        # Header only: oversized sources are rejected before anything is decoded
+        with open_image(path, self.max_pixels) as img:
+            self.headers[path] = (img.size, img.mode, img.format)
+            if wants_variants:
+                image_type = self.web.detect_image_type(path.name)
+                planned = self.web.plan_variants(img, self.web.optimized_path / path.stem, image_type)
+
+        if wants_optimized:
+            outputs.append({
+                'target': 'optimized',
+                'paths': [self.optimizer.optimized_path / (path.stem + '.webp')],
+                'settings': self.optimizer.encoder_settings(),
+                'box': (self.optimizer.max_width, self.optimizer.max_height),
+            })
+
+        if wants_variants:
+            for index, paths in planned:
+                outputs.append({
+                    'target': 'variants',
+                    'paths': paths,
+                    'settings': self.web.variant_settings(image_type, index),
+                    'box': self.web.size_configs[image_type]['sizes'][index],
+                    'type': image_type,
+                    'index': index,
+                })
+
+        if wants_webp:
+            outputs.append({
+                'target': 'webp',
+                'paths': [path.with_suffix('.webp')],
+                'settings': webp_settings(self.settings.webp_quality),
+                'box': None,
+            })
+
+        if wants_hero:
+            outputs.append({
+                'target': 'hero',
+                'paths': [self.hero_path(path)],
+                'settings': self.hero_settings(),
+                'box': None,
+                'source': hero_source,
+            })
+
+        if self.bounded:
+            # Reduced-scale decodes change the output bytes
+            for output in outputs:
+                output['settings'] = dict(output['settings'], decode='bounded')
+        elif self.web.resize_mode == 'pyramid':
+            # JPEGs are drafted to the largest output (see decode_box)
+            for output in outputs:
+                if output['box'] is not None:
+                    output['settings'] = dict(output['settings'], decode='draft')
+
+        return outputs
+
+    def hero_path(self, path):
+        """Where the hero target writes a hero source"""
+        return self.optimizer.optimized_path / (path.stem + '.webp')
+
+    def hero_source(self, path):
+        """
+        The file a hero is compressed from: its optimized/ copy, as
+        compress_hero_images.py has always preferred, unless the source was
+        edited after it was written; otherwise the source itself
+        """
+        copy = self.hero_path(path)
+        if copy.exists() and copy.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+            return copy
+        return path
+
+    def is_converted_sibling(self, path):
+        """
+        A WebP next to a PNG/JPEG of the same stem: the webp target's in-place
+        conversion. Its variants would land on the original's output paths.
+        """
+        if path.suffix.lower() != '.webp':
+            return False
+        return any(path.with_suffix(extension).exists()
+                   for extension in ('.png', '.jpg', '.jpeg', '.PNG', '.JPG', '.JPEG'))
+
+    # Stage: dedup
+
+    def output_signature(self, output):
+        """Outputs with equal signatures are interchangeable between duplicate sources"""
+        return (output['target'], output.get('type'))
+
+    def deduplicate(self, planned, incremental=False):
+        """
+        Group duplicate sources and drop the DEDUP_TARGETS outputs an alias
+        would share with its canonical source (anything it built before is
+        deleted). Incremental runs also plan the rest of every touched group.
+        """
+        plans = dict(planned)
+        touched = set()
+        if incremental:
+            # Groups before the update: a source edited out of a group frees its aliases
+            touched.update(other for path in plans for other in self.dedup.members(path))
+        self.dedup.update(list(plans), prune=not incremental)
+        groups = self.dedup.groups()
+        if incremental:
+            touched.update(other for path in plans for other in self.dedup.members(path))
+            for path in sorted(touched - set(plans)):
+                try:
+                    outputs = self.plan(path)
+                except Exception as e:
+                    print(f"Skipping {path}: {e}")
+                    continue
+                if outputs:
+                    plans[path] = outputs
+
+        self.aliases = {}
+        for group in groups:
+            canonical = group['canonical']
+            if canonical not in plans:
+                continue
+            signatures = {self.output_signature(output) for output in plans[canonical]}
+            canonical_paths = {path for output in plans[canonical] for path in output['paths']}
+            for path, match, distance in group['aliases']:
+                if path not in plans:
+                    continue
+                shared = [output for output in plans[path]
+                          if output['target'] in DEDUP_TARGETS and self.output_signature(output) in signatures]
+                if not shared:
+                    continue
+                plans[path] = [output for output in plans[path] if output not in shared]
+                self.aliases[path] = {'canonical': canonical, 'match': match, 'distance': distance,
+                                      'targets': {output['target'] for output in shared}}
+                # Outputs built before it was known to be a duplicate (same-stem
+                # siblings such as foo.png / foo.webp share the canonical's paths)
+                for output in shared:
+                    if output['paths'][0] not in canonical_paths:
+                        self.cache.forget(output['paths'])
+                        self.delete_outputs([output_path for output_path in output['paths']
+                                            if output_path not in canonical_paths])
+
+        print(self.dedup.summary(groups))
+        return [(path, outputs) for path, outputs in plans.items() if outputs]
+
+    # Stages: decode -> resize -> encode -> compress
+
+    def decode(self, img, box=None):
+        """
+        Decode pixels once as RGB, or RGBA for transparent sources (every target
+        writes WebP). With a box, JPEGs are drafted (before load(), after which
+        draft() does nothing) and, under a memory budget, other formats reduced
+        to no less than what the largest output needs.
+        """
+        if box is not None:
+            apply_draft(img, box)
+        img.load()
+        img = normalize(img, keep_alpha=True)
+        return reduce_for(img, box) if self.bounded and box is not None else img
+
+    def decode_box(self, outputs, size):
+        """
+        Largest size the pending outputs of a source of this size need, or None to
+        decode at full size: their bounding box under a memory budget, and in
+        pyramid mode the largest size they are fitted to (the DCT-domain
+        downscale render_variants asks for)
+        """
+        if self.bounded:
+            return bounding_box([output['box'] for output in outputs])
+        if self.web.resize_mode == 'pyramid' and all(output['box'] is not None for output in outputs):
+            return max((self.web.fit_size(size, output['box']) for output in outputs),
+                       key=lambda fitted: fitted[0] * fitted[1])
+        return None
+
+    def estimate(self, path, outputs):
+        """Estimated peak bytes of rendering outputs of a source (see memory_budget.py)"""
+        size, mode, image_format = self.headers[path]
+        return estimate_bytes(size, mode, self.decode_box(outputs, size), jpeg=image_format == 'JPEG')
+
+    def process_source(self, path, outputs):
+        """
+        Decode a source once and render every pending output from it (a hero
+        compressed from its optimized/ copy decodes that file instead)
+        """
+        results = [None] * len(outputs)
+        inputs = {}
+        for k, output in enumerate(outputs):
+            inputs.setdefault(output.get('source', path), []).append(k)
+
+        for source, slots in inputs.items():
+            pending = [outputs[k] for k in slots]
+            try:
+                with open_image(source, self.max_pixels) as img:
+                    with stage('decode', file=source.name):
+                        decoded = self.decode(img, self.decode_box(pending, img.size))
+                    rendered = self.render(decoded, path, pending)
+            except Exception as e:
+                rendered = [{'success': False, 'error': str(e)} for _ in pending]
+            for k, result in zip(slots, rendered):
+                results[k] = result
+        return results
+
+    def process_source_profiled(self, path, outputs):
+        """process_source in a worker process, returning the worker's stage events too"""
+        PROFILER.configure(self.profile, self.settings.profile_memory)
+        results = self.process_source(path, outputs)
+        # A forked worker inherits the parent's events; only ship back its own
+        pid = os.getpid()
+        return results, [event for event in PROFILER.drain() if event['pid'] == pid]
+
+    def render(self, img, path, outputs):
+        """Resize, encode and compress each output from the decoded image"""
+        results = [None] * len(outputs)
+
+        variants = [(k, output) for k, output in enumerate(outputs) if output['target'] == 'variants']
+        if variants:
+            slots = {output['index']: k for k, output in variants}
+            try:
+                rendered = self.web.render_variants(
+                    img, path, variants[0][1]['type'],
+                    [(output['index'], output['paths']) for _, output in variants])
+                for index, result in rendered:
+                    results[slots[index]] = dict(result, success=True)
+            except Exception as e:
+                for k, _ in variants:
+                    if results[k] is None:
+                        results[k] = {'success': False, 'error': str(e)}
+
+        for k, output in enumerate(outputs):
+            if output['target'] == 'variants':
+                continue
+            output_path = output['paths'][0]
+            try:
+                if output['target'] == 'optimized':
+                    results[k] = self.optimizer.optimize_loaded_image(img, path, output_path, 'webp')
+                elif output['target'] == 'webp':
+                    save_as_webp(img, output_path, self.settings.webp_quality)
+                    results[k] = {
+                        'success': True,
+                        'original_size': path.stat().st_size,
+                        'optimized_size': output_path.stat().st_size,
+                    }
+                elif output['target'] == 'hero':
+                    # The input may be the file about to be overwritten
+                    original_size = output.get('source', path).stat().st_size
+                    result = compress_loaded_image(img, output_path, self.settings.hero_max_size_kb,
+                                                   min_scale=self.settings.hero_min_scale, verbose=False)
+                    results[k] = dict(result, original_size=original_size)
+            except Exception as e:
+                results[k] = {'success': False, 'error': str(e)}
+
+        return results
+
+    def execute(self, sources):
+        """Yield (source, outputs, results) in source order, skipping cached outputs"""
+        work = []
+        for path, outputs in sources:
+            with stage('cache', file=path.name):
+                cached = [self.cache.lookup(output.get('source', path), output['paths'], output['settings'])
+                          for output in outputs]
+            if self.web.multi_format and any(hit is None for output, hit in zip(outputs, cached)
+                                             if output['target'] == 'variants'):
+                # Formats are chosen per image, so its variants are rendered together
+                cached = [None if output['target'] == 'variants' else hit for output, hit in zip(outputs, cached)]
+            work.append((path, outputs, cached))
+
+        fresh_results = self.render_pending([
+            (path, [output for output, hit in zip(outputs, cached) if hit is None])
+            for path, outputs, cached in work if None in cached
+        ])
+
+        for path, outputs, cached in work:
+            rendered = iter(next(fresh_results)) if None in cached else iter(())
+            results = []
+            for output, hit in zip(outputs, cached):
+                if hit is not None:
+                    results.append(dict(hit, cached=True))
+                    continue
+                result = next(rendered)
+                if result['success']:
+                    self.cache.store(output.get('source', path), output['paths'], output['settings'], result)
+                    if self.quality_search is not None:
+                        self.quality_search.remember(result)
+                results.append(result)
+            yield path, outputs, results
+
+        fresh_results.close()
+
+    def render_pending(self, work):
+        """Run process_source for each (source, outputs), serially or across a process pool"""
+        jobs = min(self.jobs, len(work))
+        estimates = None
+        if self.memory_budget is not None and work:
+            estimates = [self.estimate(path, outputs) for path, outputs in work]
+            jobs = pool_size(estimates, self.memory_budget, jobs)
+            print(f"Memory budget: {self.memory_budget / MB:,.0f} MB, {jobs} workers "
+                  f"(largest source ~{max(estimates) / MB:,.0f} MB)")
+        if jobs <= 1:
+            for path, outputs in work:
+                yield self.process_source(path, outputs)
+            return
+
+        # Both maps keep submission order, so reports are deterministic
+        process = self.process_source_profiled if self.profile else self.process_source
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            if estimates is not None:
+                results = budgeted_map(executor, process, work, estimates, self.memory_budget)
+            else:
+                results = executor.map(process, [path for path, _ in work], [outputs for _, outputs in work])
+            for result in results:
+                if self.profile:
+                    result, events = result
+                    PROFILER.merge(events)
+                yield result
+
+    # Stage: manifest
+
+    def write_manifests(self, incremental=False):
+        """
+        Write the per-target manifests, reports and pubspec updates. Incremental
+        runs update the existing image manifest in place and leave the
+        whole-project optimization report alone.
+        """
+        if incremental and not self.web.manifest:
+            self.web.load_manifest()
+        elif not incremental:
+            # Rebuilt from this run's records, so deleted sources drop out
+            self.web.manifest = {}
+
+        optimization_log = []
+        converted_files = []
+
+        for path, outputs, results in self.records:
+            variant_results = []
+            for output, result in zip(outputs, results):
+                if not result['success']:
+                    continue
+                if output['target'] == 'optimized':
+                    optimization_log.append({
+                        'original_path': str(path.relative_to(self.assets_path)),
+                        'optimized_path': f"optimized/{output['paths'][0].name}",
+                        'original_size': result['original_size'],
+                        'optimized_size': result['optimized_size'],
+                        'savings_percent': result['savings_percent'],
+                        'resized': result.get('resized', False)
+                    })
+                    if 'quality' in result:
+                        optimization_log[-1]['quality'] = result['quality']
+                elif output['target'] == 'variants':
+                    variant_results.append({key: result[key] for key in
+                                            ('size', 'path', 'width', 'height', 'format', 'mime',
+                                             'file_size', 'compression_ratio') if key in result})
+                    variant_results[-1]['precompressed'] = result.get('precompressed', {})
+                    if 'quality' in result:
+                        variant_results[-1].update(quality=result['quality'], ssim=result['ssim'])
+                    if 'formats' in result:
+                        variant_results[-1]['formats'] = result['formats']
+                elif output['target'] == 'webp':
+                    converted_files.append((path, output['paths'][0]))
+
+            if variant_results:
+                image_type = next(output['type'] for output in outputs if output['target'] == 'variants')
+                self.web.manifest[str(path.relative_to(self.assets_path))] = self.web.manifest_entry(
+                    path, image_type, variant_results)
+
+        # Duplicates point at their canonical source's files instead of having their own
+        for path, alias in sorted(self.aliases.items()):
+            canonical = str(alias['canonical'].relative_to(self.assets_path))
+            alias_fields = {'alias_of': canonical, 'duplicate': alias['match'],
+                            'original_size': path.stat().st_size}
+            if 'variants' in alias['targets'] and canonical in self.web.manifest:
+                self.web.manifest[str(path.relative_to(self.assets_path))] = dict(
+                    self.web.manifest[canonical], **alias_fields)
+            if 'optimized' in alias['targets']:
+                logged = next((log for log in optimization_log if log['original_path'] == canonical), None)
+                if logged is not None:
+                    savings = round((1 - logged['optimized_size'] / alias_fields['original_size']) * 100, 1)
+                    optimization_log.append(dict(logged, original_path=str(path.relative_to(self.assets_path)),
+                                                 savings_percent=savings, **alias_fields))
+
+        if 'variants' in self.targets:
+            self.web.save_manifest()
+            print(f"Manifest saved: {self.web.manifest_path}")
+            if self.web.hashed_names:
+                self.check_cache_headers()
+        if self.settings.update_pubspec:
+            # Lists just the referenced images and their outputs
+            self.optimizer.update_pubspec_yaml()
+        if optimization_log and not incremental:
+            self.optimizer.generate_optimization_report(optimization_log)
+        if converted_files:
+            update_pubspec_references(self.project_root, converted_files)
+
+    def check_cache_headers(self):
+        """Warn when firebase.json lacks the immutable rules for hashed filenames"""
+        missing = missing_header_rules(self.project_root)
+        if missing:
+            print("Warning: firebase.json does not mark hashed images immutable; add to hosting.headers:")
+            print(json.dumps(missing, indent=2))
+
+    # Stage: atlas
+
+    def pack_atlases(self):
+        """Repack the sprite atlases (unchanged atlases are not rewritten); returns the map"""
+        if 'atlas' not in self.targets:
+            return None
+        with stage('atlas'):
+            atlas_map = self.atlas.pack()
+        for atlas in atlas_map['atlases']:
+            print(f"   assets/images/{atlas['file']}: {atlas['width']}x{atlas['height']}, "
+                  f"{atlas['sprites']} sprites, {atlas['file_size']:,} bytes")
+        print(self.atlas.summary(atlas_map))
+        return atlas_map
+
+    def remove_source(self, path):
+        """
+        Forget a deleted source: drop its build cache and manifest entries and
+        delete the files it produced under assets/images/optimized (with their
+        precompressed sidecars). In-place WebP conversions are left alone.
+        Returns the deleted files.
+        """
+        path = Path(path)
+        outputs = {self.project_root / key for key in self.cache.forget_source(path)}
+
+        if not self.web.manifest:
+            self.web.load_manifest()
+        entry = None
+        if self.assets_path in path.parents:
+            entry = self.web.manifest.pop(str(path.relative_to(self.assets_path)), None)
+        if entry is not None and 'alias_of' not in entry:
+            # An alias entry lists its canonical source's files, which stay
+            for variant in entry.get('variants', []):
+                for encoded in variant.get('formats') or [variant]:
+                    outputs.add(self.web.resolve_manifest_path(encoded['path']))
+
+        removed = self.delete_outputs(outputs)
+
+        if entry is not None:
+            self.web.save_manifest()
+        if self.dedup is not None:
+            self.dedup.forget(path)
+            self.dedup.save()
+        self.cache.save()
+        return removed
+
+    def duplicates_of(self, path):
+        """Sources grouped with path as duplicates (to rebuild when it is deleted)"""
+        if self.dedup is None:
+            return []
+        return [other for other in self.dedup.members(path) if other.exists()]
+
+    def delete_outputs(self, outputs):
+        """
+        Delete output files under assets/images/optimized and their
+        precompressed sidecars, unless a build cache entry still records them;
+        returns the deleted files
+        """
+        # Another source with the same stem may still own an output
+        claimed = {key for cached in self.cache.entries.values() for key in cached.get('outputs', {})}
+
+        removed = []
+        for output in sorted(outputs):
+            if self.web.optimized_path not in output.parents:
+                continue
+            if output.relative_to(self.project_root).as_posix() in claimed:
+                continue
+            for file in [output] + [output.with_name(output.name + suffix) for suffix in ENCODINGS]:
+                if file.exists():
+                    file.unlink()
+                    removed.append(file)
+        return removed
+
+    def describe(self, output, result):
+        """Detail appended to an output's report line"""
+        detail = self.target_detail(output, result)
+        if 'quality_key' in result:
+            # Chosen by the perceptual quality search
+            detail = f" at quality {result['quality']} (SSIM {result['ssim']:.4f})" + detail
+        return detail
+
+    def target_detail(self, output, result):
+        """Target-specific detail appended to an output's report line"""
+        if output['target'] == 'optimized' and result.get('resized'):
+            width, height = result['dimensions']
+            return f", resized to {width}x{height}"
+        if output['target'] == 'variants':
+            if 'formats' in result:
+                kept = ', '.join(f"{entry['format']} {entry['file_size']:,}" for entry in result['formats'])
+                return f" ({result['compression_ratio']}% smaller; kept {kept})"
+            return f" ({result['compression_ratio']}% smaller)"
+        if output['target'] == 'hero':
+            detail = f" at {result['final_quality']}% quality ({result['encodes']} encodes)"
+            if result['final_scale'] < 1:
+                detail += f", scaled to {result['final_scale']:.0%}"
+            if not result['achieved_target']:
+                detail += f", over {self.settings.hero_max_size_kb:g}KB target"
+            return detail
+        return ""
+
+    def primary_path(self, output, result):
+        """An output's primary file: the best kept format for multi-format variants"""
+        path = output['paths'][0]
+        if 'formats' in result:
+            return path.with_name(Path(result['path']).name)
+        return path
+
+    def output_size(self, output, result):
+        """Bytes written for an output's primary file"""
+        path = self.primary_path(output, result)
+        return path.stat().st_size if path.exists() else 0
+
+    def run(self, sources=None):
+        """
+        Run every stage over the project, or only over the given source paths
+        (watch mode); the image manifest is then updated rather than rebuilt
+        """
+        self.report.start(self)
+
+        # A watching pipeline runs many times; counts and records are per run
+        self.reset()
+        incremental = sources is not None
+
+        # discover + filter
+        with stage('discover'):
+            if incremental:
+                candidates = sorted(Path(path) for path in sources
+                                    if Path(path).suffix.lower() in IMAGE_EXTENSIONS and Path(path).is_file())
+            else:
+                candidates = list(self.discover())
+        planned = []
+        for path in candidates:
+            try:
+                with stage('filter', file=path.name):
+                    outputs = self.plan(path)
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            if outputs:
+                planned.append((path, outputs))
+
+        if self.dedup is not None:
+            with stage('dedup'):
+                planned = self.deduplicate(planned, incremental)
+
+        self.report.planned(self, candidates, planned, incremental)
+
+        # decode -> resize -> encode -> compress
+        totals = {target: {'outputs': 0, 'bytes': 0, 'failed': 0} for target in self.targets}
+        total_original = 0
+
+        for path, outputs, results in self.execute(planned):
+            self.records.append((path, outputs, results))
+            total_original += path.stat().st_size
+            for output, result in zip(outputs, results):
+                if not result['success']:
+                    totals[output['target']]['failed'] += 1
+                    continue
+                totals[output['target']]['outputs'] += 1
+                totals[output['target']]['bytes'] += self.output_size(output, result)
+            self.report.source(self, path, outputs, results)
+
+        # Atlases first: the pubspec update in the manifest stage lists them
+        atlas_map = self.pack_atlases()
+        if atlas_map is not None:
+            totals['atlas']['outputs'] = len(atlas_map['atlases'])
+            totals['atlas']['bytes'] = sum(atlas['file_size'] for atlas in atlas_map['atlases'])
+        self.report.summary(self, totals, total_original)
+
+        # manifest
+        with stage('manifest'):
+            self.write_manifests(incremental)
+
+        self.cache.save()
+        if self.quality_search is not None:
+            self.quality_search.save()
+        if self.dedup is not None:
+            self.dedup.save()
+
+        if self.profile:
+            # Written next to image_optimization_report.json
+            PROFILER.write(self.project_root)
+
+        return self.records
+
+    def reset(self):
+        """Clear the records and counters of the previous run"""
+        self.records = []
+        self.cache.hits = self.cache.misses = 0
+        if self.dedup is not None:
+            self.dedup.fingerprinted = self.dedup.reused = 0
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='TripBasket unified image asset pipeline')
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=TARGETS,
+                        help='outputs to build (default: all)')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='number of worker processes (default: CPU count, 1 = serial)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='re-encode every output, ignoring the build cache')
+    parser.add_argument('--resize-mode', choices=['direct', 'pyramid'], default='direct',
+                        help='resample every size from the source, or cascade from the next larger size')
+    parser.add_argument('--min-psnr', type=float, default=None,
+                        help='in pyramid mode, fall back to a direct resize below this PSNR (dB)')
+    parser.add_argument('--min-ssim', type=float, default=None,
+                        help='in pyramid mode, fall back to a direct resize below this luma SSIM (needs NumPy)')
+    parser.add_argument('--formats', nargs='+', choices=['avif', 'webp', 'jpeg'], default=['webp'],
+                        help='variant formats, most modern first (e.g. avif webp jpeg); the last is the fallback')
+    parser.add_argument('--quality-target', type=float, default=None,
+                        help=f'multi-format PSNR target in dB (default: {DEFAULT_QUALITY_TARGET:g})')
+    parser.add_argument('--quality-search', action='store_true',
+                        help='choose WebP qualities per image by SSIM instead of the fixed constants (needs NumPy)')
+    parser.add_argument('--ssim-target', type=float, default=None,
+                        help=f'SSIM target for --quality-search (default: {DEFAULT_SSIM_TARGET:g})')
+    parser.add_argument('--memory-budget', default=None, metavar='MB|auto',
+                        help='decode large sources at reduced scale and keep estimated worker memory '
+                             'within this many MB (auto: half the available memory)')
+    parser.add_argument('--max-pixels', type=int, default=DEFAULT_MAX_PIXELS,
+                        help=f'skip sources with more pixels than this, 0 for no limit (default: {DEFAULT_MAX_PIXELS:,})')
+    parser.add_argument('--dedup', action='store_true',
+                        help='encode exact and near-duplicate sources once and alias the rest in the manifest (needs NumPy)')
+    parser.add_argument('--dedup-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                        help=f'bits two 64-bit perceptual hashes may differ by for --dedup (default: {DEFAULT_MAX_DISTANCE})')
+    parser.add_argument('--update-pubspec', action='store_true',
+                        help='list just the referenced images and their outputs in pubspec.yaml afterwards')
+    parser.add_argument('--hashed-names', action='store_true',
+                        help='use content-hashed variant URLs in srcset (publish them with hashed_assets.py after the build)')
+    parser.add_argument('--hero-max-size-kb', type=float, default=150,
+                        help='byte budget per hero image in KB (default: 150)')
+    parser.add_argument('--hero-min-scale', type=float, default=None,
+                        help='allow downscaling hero images to this factor to reach the budget')
+    parser.add_argument('--no-index', action='store_true',
+                        help='list every directory again instead of reusing the file index')
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-stage timings as a Chrome trace and summary JSON')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='also sample peak memory per stage with tracemalloc (slower)')
+    parser.add_argument('--trips-csv', type=Path, default=None,
+                        help='also prefetch and optimize the image URLs of this trips CSV')
+    parser.add_argument('--watch', action='store_true',
+                        help='after the first run, rebuild assets/images sources as they are added, '
+                             'changed or deleted (Ctrl+C to stop)')
+    parser.add_argument('--poll', action='store_true',
+                        help='with --watch, poll for changes instead of using inotify')
+    parser.add_argument('--debounce', type=float, default=None,
+                        help='with --watch, seconds without changes before a batch is processed (default: 0.5)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    project_root = Path(__file__).parent.parent
+    print(f"Project root: {project_root}")
+
+    if args.quality_search and args.formats != ['webp']:
+        print("ERROR: --quality-search only applies to WebP output; use --quality-target with --formats")
+        sys.exit(1)
+
+    if args.quality_search or args.dedup or args.min_ssim is not None:
+        if importlib.util.find_spec('numpy') is None:
+            option = '--quality-search' if args.quality_search else '--dedup' if args.dedup else '--min-ssim'
+            print(f"ERROR: {option} needs NumPy. Install with: pip install numpy")
+            sys.exit(1)
+
+    settings = PipelineSettings(
+        targets=args.targets,
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+        use_index=not args.no_index,
+        resize_mode=args.resize_mode,
+        min_psnr=args.min_psnr,
+        min_ssim=args.min_ssim,
+        formats=args.formats,
+        quality_target=args.quality_target,
+        hashed_names=args.hashed_names,
+        hero_max_size_kb=args.hero_max_size_kb,
+        hero_min_scale=args.hero_min_scale,
+        quality_search=args.quality_search,
+        ssim_target=args.ssim_target,
+        dedup=args.dedup,
+        dedup_distance=args.dedup_distance,
+        memory_budget=parse_budget(args.memory_budget),
+        max_pixels=args.max_pixels,
+        update_pubspec=args.update_pubspec,
+        profile=args.profile,
+        profile_memory=args.profile_memory,
+    )
+    pipeline = AssetPipeline(project_root, settings)
+    pipeline.run()
+
+    if args.trips_csv:
+        from remote_images import RemoteImagePrefetcher
+        prefetcher = RemoteImagePrefetcher(project_root, jobs=args.jobs, use_cache=not args.no_cache,
+                                           resize_mode=args.resize_mode, min_psnr=args.min_psnr,
+                                           min_ssim=args.min_ssim)
+        prefetcher.run(args.trips_csv)
+
+    if args.watch:
+        from watch_assets import watch, DEFAULT_DEBOUNCE
+        watch(pipeline, debounce=args.debounce or DEFAULT_DEBOUNCE, polling=args.poll)
+
+    print("\nAsset pipeline completed!")
+    print("Run 'flutter clean && flutter pub get' to refresh assets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Asset reference scanner for the TripBasket pubspec
+- Indexes the asset paths referenced from lib/**/*.dart (and the web/ pages)
+- Expands every referenced image to the files the image scripts generated for
+  it: optimized/<name>.webp, its image_manifest.json variants in every format
+  and the sprite atlas holding it (content-hashed copies are published into build/web)
+- Regenerates the images part of the pubspec assets: section as an explicit
+  file list, so Flutter no longer bundles every variant, .gz/.br/.zst sidecar
+  and the raw image_manifest.json
+- Reports unused files under assets/images (asset_usage_report.json) and lists
+  unused sources in unused_assets.txt for scripts/cleanup_unused_assets.bat
+"""
+
+import os
+import re
+import json
+import argparse
+from pathlib import Path
+
+from file_index import find_files, PRUNED_DIRS
+
+# Directories scanned for references, with the file types read in each
+REFERENCE_SOURCES = [
+    ('lib', {'.dart'}),
+    ('web', {'.html', '.js', '.json'}),
+]
+
+# Only tool state is pruned there: a lib/ui/web/ page is still Dart source
+REFERENCE_PRUNED_DIRS = {'.dart_tool', 'node_modules'}
+
+# A quoted literal starting with assets/ (or /assets/ in web pages)
+ASSET_LITERAL = re.compile(r"""['"]/?(assets/[^'"\s]*)['"]""")
+
+# Interpolation in a literal ('assets/images/$name.png'): everything after it is dynamic
+INTERPOLATION = re.compile(r'\$')
+
+# Directories under assets/images that are never bundled or reported; the
+# platform folder names are only pruned at the project root, so not here
+SKIPPED_DIRS = PRUNED_DIRS | {'backup'}
+
+BLOCK_START = '# BEGIN image assets (generated by scripts/asset_references.py)'
+BLOCK_END = '# END image assets'
+
+
+def stem_of(key):
+    """'assets/images/dahab.webp' -> 'assets/images/dahab'"""
+    return key.rsplit('.', 1)[0] if '.' in key.rsplit('/', 1)[-1] else key
+
+
+def format_size(size):
+    return f"{size / 1024:,.1f} KB" if size < 1024 * 1024 else f"{size / 1024 / 1024:,.2f} MB"
+
+
+class AssetReferenceScanner:
+    """
+    Works in project-relative POSIX paths ('assets/images/optimized/x_sm.webp'),
+    the form Flutter asset keys and pubspec entries use
+    """
+
+    def __init__(self, project_root):
+        self.project_root = Path(project_root)
+        self.assets_path = self.project_root / 'assets' / 'images'
+        self.optimized_path = self.assets_path / 'optimized'
+        self.pubspec_path = self.project_root / 'pubspec.yaml'
+        self.report_path = self.project_root / 'asset_usage_report.json'
+        self.unused_list_path = self.project_root / 'unused_assets.txt'
+
+    def _key(self, path):
+        return Path(path).relative_to(self.project_root).as_posix()
+
+    def _load_json(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def scan_references(self):
+        """
+        Return ({asset path: [referencing files]}, {dynamic prefix: [referencing files]}).
+        Directory literals ('assets/images/optimized/') are path constants, not references.
+        """
+        references = {}
+        prefixes = {}
+        for directory, extensions in REFERENCE_SOURCES:
+            root = self.project_root / directory
+            if not root.exists():
+                continue
+            for path in find_files(root, extensions, REFERENCE_PRUNED_DIRS):
+                text = path.read_text(encoding='utf-8', errors='replace')
+                where = self._key(path)
+                for match in ASSET_LITERAL.finditer(text):
+                    literal = match.group(1)
+                    dynamic = INTERPOLATION.search(literal)
+                    if dynamic:
+                        prefixes.setdefault(literal[:dynamic.start()], set()).add(where)
+                    elif not literal.endswith('/'):
+                        references.setdefault(literal, set()).add(where)
+        return ({key: sorted(files) for key, files in sorted(references.items())},
+                {key: sorted(files) for key, files in sorted(prefixes.items())})
+
+    def asset_files(self):
+        """Every file under assets/images except tool state (dotfiles) and backups"""
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.assets_path):
+            dirnames[:] = sorted(name for name in dirnames if name not in SKIPPED_DIRS)
+            for name in filenames:
+                if not name.startswith('.'):
+                    path = Path(dirpath) / name
+                    files[self._key(path)] = path.stat().st_size
+        return files
+
+    def generated_for(self, stem, manifest, atlas_map):
+        """
+        Files generated from a source stem ('assets/images/dahab'), and the
+        stems of the sources they are actually built from (aliases point at
+        their canonical source)
+        """
+        images = self._key(self.assets_path) + '/'
+        optimized = self._key(self.optimized_path) + '/'
+        relative_stem = stem[len(images):]
+
+        generated = {optimized + relative_stem.rsplit('/', 1)[-1] + '.webp'}
+        inputs = {stem}
+        for key, entry in manifest.items():
+            # Manifests written on Windows use backslashes
+            if stem_of(key.replace('\\', '/')) != relative_stem:
+                continue
+            for variant in entry.get('variants', []):
+                for encoded in variant.get('formats') or [variant]:
+                    generated.add(images + encoded['path'].replace('\\', '/'))
+            generated.add(optimized + 'image_manifest.min.json')
+            if 'alias_of' in entry:
+                inputs.add(images + stem_of(entry['alias_of'].replace('\\', '/')))
+        for key, sprite in atlas_map.get('sprites', {}).items():
+            if stem_of(key) == relative_stem:
+                generated.update({images + sprite['atlas'], optimized + 'sprite_atlas.json'})
+        return generated, inputs
+
+    def analyze(self):
+        """Work out which files under assets/images are bundled, build inputs or unused"""
+        references, prefixes = self.scan_references()
+        files = self.asset_files()
+        manifest = self._load_json(self.optimized_path / 'image_manifest.json')
+        atlas_map = self._load_json(self.optimized_path / 'sprite_atlas.json')
+        images = self._key(self.assets_path) + '/'
+        optimized = self._key(self.optimized_path) + '/'
+
+        referenced = set(references)
+        for prefix in prefixes:
+            referenced.update(key for key in files if key.startswith(prefix))
+
+        bundled = set()
+        input_stems = set()
+        for key in referenced:
+            if key in files:
+                bundled.add(key)
+            if key.startswith(images) and not key.startswith(optimized):
+                generated, inputs = self.generated_for(stem_of(key), manifest, atlas_map)
+                bundled.update(generated & set(files))
+                input_stems.update(inputs)
+
+        # Sources whose outputs are bundled are build inputs, not unused
+        inputs = {key for key in files if not key.startswith(optimized) and stem_of(key) in input_stems}
+        unused_sources = sorted(key for key in files if not key.startswith(optimized)
+                                and key not in bundled and key not in inputs)
+        unbundled_outputs = sorted(key for key in files if key.startswith(optimized) and key not in bundled)
+
+        # A dynamic reference can name any file in its directory, so the directory is listed
+        dynamic_dirs = sorted({prefix.rsplit('/', 1)[0] + '/' for prefix in prefixes if prefix.startswith(images)
+                               and (self.project_root / prefix.rsplit('/', 1)[0]).is_dir()})
+        entries = dynamic_dirs + sorted(key for key in bundled
+                                        if key.startswith(images)
+                                        and not any(key.startswith(d) and '/' not in key[len(d):]
+                                                    for d in dynamic_dirs))
+        return {
+            'references': references,
+            'dynamic_references': prefixes,
+            'pubspec_entries': entries,
+            'bundled': sorted(bundled),
+            'build_inputs': sorted(inputs - bundled),
+            'unused_sources': unused_sources,
+            'unbundled_outputs': unbundled_outputs,
+            'sizes': files,
+        }
+
+    def update_pubspec(self, entries):
+        """
+        Replace the assets/images directory entries (and any previous generated
+        block) in the pubspec assets: section with entries. Returns True if changed.
+        """
+        if not self.pubspec_path.exists():
+            print("Warning: pubspec.yaml not found")
+            return False
+        if not entries:
+            # Nothing resolved (no references found, or nothing generated yet);
+            # an empty block would drop every image from the bundle
+            print("Warning: no referenced image assets found, pubspec.yaml left unchanged")
+            return False
+        with open(self.pubspec_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        lines = content.split('\n')
+
+        start = next((i for i, line in enumerate(lines) if re.match(r'^\s+assets:\s*$', line)), None)
+        if start is None:
+            print("Warning: no assets: section in pubspec.yaml")
+            return False
+        end = start + 1
+        while end < len(lines) and re.match(r'^\s+(-\s|#)', lines[end]):
+            end += 1
+
+        section = lines[start + 1:end]
+        items = [line for line in section if line.strip().startswith('-')]
+        indent = re.match(r'^(\s*)', items[0]).group(1) if items else re.match(r'^(\s*)', lines[start]).group(1) + '  '
+
+        kept = []
+        insert_at = None
+        in_block = False
+        for line in section:
+            value = line.strip()
+            if value == BLOCK_START:
+                in_block = True
+            is_image_entry = value.startswith('-') and value[1:].strip().startswith('assets/images/')
+            if in_block or is_image_entry:
+                if insert_at is None:
+                    insert_at = len(kept)
+            else:
+                kept.append(line)
+            if value == BLOCK_END:
+                in_block = False
+
+        block = ([indent + BLOCK_START] + [f"{indent}- {entry}" for entry in entries] + [indent + BLOCK_END])
+        if insert_at is None:
+            insert_at = len(kept)
+        section = kept[:insert_at] + block + kept[insert_at:]
+
+        updated = '\n'.join(lines[:start + 1] + section + lines[end:])
+        if updated == content:
+            return False
+        with open(self.pubspec_path, 'w', encoding='utf-8') as f:
+            f.write(updated)
+        return True
+
+    def write_report(self, analysis):
+        """asset_usage_report.json plus unused_assets.txt (Windows paths, one per line) for the cleanup script"""
+        sizes = analysis['sizes']
+        report = {key: value for key, value in analysis.items() if key != 'sizes'}
+        report['unused_sources'] = [{'path': key, 'size': sizes[key]} for key in analysis['unused_sources']]
+        report['totals'] = {
+            'bundled_bytes': sum(sizes[key] for key in analysis['bundled']),
+            'unbundled_output_bytes': sum(sizes[key] for key in analysis['unbundled_outputs']),
+            'unused_source_bytes': sum(sizes[key] for key in analysis['unused_sources']),
+        }
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        with open(self.unused_list_path, 'w', encoding='utf-8', newline='\r\n') as f:
+            for key in analysis['unused_sources']:
+                f.write(key.replace('/', '\\') + '\n')
+        return report
+
+    def run(self, write_pubspec=True):
+        """Analyze, update pubspec.yaml and write the reports; returns the report"""
+        analysis = self.analyze()
+        report = self.write_report(analysis)
+        totals = report['totals']
+        print(f"Asset references: {len(analysis['references'])} literal, "
+              f"{len(analysis['dynamic_references'])} dynamic")
+        print(f"Bundled: {len(analysis['bundled'])} files ({format_size(totals['bundled_bytes'])}), "
+              f"left out: {len(analysis['unbundled_outputs'])} generated files "
+              f"({format_size(totals['unbundled_output_bytes'])})")
+        print(f"Unused sources: {len(analysis['unused_sources'])} ({format_size(totals['unused_source_bytes'])}), "
+              f"listed in {self.unused_list_path.name}")
+        if write_pubspec:
+            if self.update_pubspec(analysis['pubspec_entries']):
+                print(f"Updated pubspec.yaml: {len(analysis['pubspec_entries'])} image asset entries")
+            elif analysis['pubspec_entries']:
+                print("pubspec.yaml image assets already up to date")
+        return report
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(
+        description='List only referenced images in pubspec.yaml and report unused assets')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='write the reports but leave pubspec.yaml unchanged')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    project_root = Path(__file__).parent.parent
+    print(f"Project root: {project_root}")
+
+    scanner = AssetReferenceScanner(project_root)
+    report = scanner.run(write_pubspec=not args.dry_run)
+    if args.dry_run:
+        print("\nImage asset entries:")
+        for entry in report['pubspec_entries']:
+            print(f"   - {entry}")
+    print(f"Report saved: {scanner.report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,37 @@
 #!/usr/bin/env python3
 """
 TripBasket Automatic Image Optimization System
-- Converts JPG/PNG → WebP at 70-80% quality
+- Converts JPG/PNG → WebP at 70-80% quality (or a per-image quality chosen by SSIM)
 - Resizes images larger than 1920px width to max 1920px
 - Keeps small icons (favicons) untouched
 - Saves optimized versions in /assets/images/optimized/
-- Updates references in pubspec.yaml and code
+- Lists the referenced images and their outputs in pubspec.yaml (--update-pubspec, asset_references.py)
+- Optimizes files in parallel across a process pool (--jobs)
+- Skips files whose outputs are already up to date (build cache)
+- Optional bounded-memory decoding for very large uploads (memory_budget.py)
 """
 
 import os
 import sys
 import shutil
-import re
+import argparse
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image, ImageOps
 import json
 
+from asset_references import AssetReferenceScanner
+from build_cache import BuildCache
+from file_index import find_files
+from instrumentation import stage
+from image_modes import normalize_for, MODE_HANDLING_VERSION
+from memory_budget import DEFAULT_MAX_PIXELS, open_image, apply_draft, reduce_for, parse_budget
+from perceptual_quality import DEFAULT_SSIM_TARGET
+
 class TripBasketImageOptimizer:
-    def __init__(self, project_root):
+    def __init__(self, project_root, jobs=None, use_cache=True, quality_search=None,
+                 bounded_memory=False, max_pixels=DEFAULT_MAX_PIXELS):
         self.project_root = Path(project_root)
         self.assets_path = self.project_root / 'assets' / 'images'
         self.optimized_path = self.assets_path / 'optimized'
@@ -29,6 +43,18 @@ class TripBasketImageOptimizer:
         self.max_width = 1920
         self.max_height = 1080
         
+        # Optional perceptual_quality.QualitySearch replacing webp_quality with
+        # the lowest quality up to it that meets an SSIM target per image
+        self.quality_search = quality_search
+        
+        # Bounded memory: JPEGs are decoded at a reduced DCT scale and other
+        # formats reduce()d before the LANCZOS resize; sources over max_pixels are refused
+        self.bounded_memory = bounded_memory
+        self.max_pixels = max_pixels
+        
+        # Worker processes used by optimize_all_images (1 = serial)
+        self.jobs = jobs or os.cpu_count() or 1
+        
         # Files to skip optimization
         self.skip_patterns = [
             'favicon',
@@ -47,6 +73,32 @@ class TripBasketImageOptimizer:
         ]
         
         self.optimization_log = []
+        self.cache = BuildCache(self.project_root, enabled=use_cache)
+
+    def __getstate__(self):
+        # Worker processes only need the settings, not the cache index or log
+        state = self.__dict__.copy()
+        state['cache'] = None
+        state['optimization_log'] = []
+        return state
+
+    def encoder_settings(self):
+        """Settings that affect the bytes written by optimize_image"""
+        settings = {
+            'tool': 'auto_optimize_images',
+            'format': 'webp',
+            'quality': self.webp_quality,
+            'method': 6,
+            'max_width': self.max_width,
+            'max_height': self.max_height,
+            'mode_handling': MODE_HANDLING_VERSION,
+        }
+        if self.quality_search is not None:
+            # 'quality' stays: it is the highest quality the search may pick
+            settings['quality_search'] = self.quality_search.settings()
+        if self.bounded_memory:
+            settings['bounded_memory'] = True
+        return settings
 
     def should_optimize(self, file_path):
         """Determine if an image should be optimized"""
@@ -80,61 +132,69 @@ class TripBasketImageOptimizer:
     def optimize_image(self, input_path, output_path, target_format='webp'):
         """Optimize a single image"""
         try:
-            with Image.open(input_path) as img:
-                # Convert RGBA to RGB for WebP if needed
-                if img.mode in ('RGBA', 'LA') and target_format.lower() == 'webp':
-                    # Create white background for transparency
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'RGBA':
-                        background.paste(img, mask=img.split()[-1])
-                    else:
-                        background.paste(img, mask=img.split()[-1])
-                    img = background
-                elif img.mode == 'P':
-                    img = img.convert('RGB')
-                
-                # Get original dimensions
-                original_width, original_height = img.size
-                
-                # Resize if larger than max dimensions
-                if original_width > self.max_width or original_height > self.max_height:
-                    # Calculate new dimensions maintaining aspect ratio
-                    ratio = min(self.max_width / original_width, self.max_height / original_height)
-                    new_width = int(original_width * ratio)
-                    new_height = int(original_height * ratio)
-                    
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    print(f"   Resized: {original_width}x{original_height} → {new_width}x{new_height}")
-                
-                # Save optimized image
-                save_kwargs = {'optimize': True}
-                if target_format.lower() == 'webp':
-                    save_kwargs['quality'] = self.webp_quality
-                    save_kwargs['method'] = 6  # Best compression
-                elif target_format.lower() in ['jpg', 'jpeg']:
-                    save_kwargs['quality'] = self.webp_quality
-                    save_kwargs['progressive'] = True
-                
-                img.save(output_path, target_format.upper(), **save_kwargs)
-                
-                # Calculate savings
-                original_size = input_path.stat().st_size
-                optimized_size = output_path.stat().st_size
-                savings = original_size - optimized_size
-                savings_percent = (savings / original_size) * 100 if original_size > 0 else 0
-                
-                return {
-                    'success': True,
-                    'original_size': original_size,
-                    'optimized_size': optimized_size,
-                    'savings': savings,
-                    'savings_percent': savings_percent,
-                    'resized': img.size != (original_width, original_height)
-                }
+            with open_image(input_path, self.max_pixels) as img:
+                if self.bounded_memory:
+                    apply_draft(img, (self.max_width, self.max_height))
+                return self.optimize_loaded_image(img, input_path, output_path, target_format)
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def optimize_loaded_image(self, img, input_path, output_path, target_format='webp'):
+        """Resize and encode an already opened image (shared with the asset pipeline)"""
+        # RGB, or RGBA where the image is transparent and the format keeps alpha
+        img = normalize_for(img, target_format)
+        
+        # Get original dimensions
+        original_width, original_height = img.size
+        
+        # Resize if larger than max dimensions
+        if original_width > self.max_width or original_height > self.max_height:
+            # Calculate new dimensions maintaining aspect ratio
+            ratio = min(self.max_width / original_width, self.max_height / original_height)
+            new_width = int(original_width * ratio)
+            new_height = int(original_height * ratio)
+        
+            with stage('resize', file=input_path.name):
+                if self.bounded_memory:
+                    img = reduce_for(img, (new_width, new_height))
+                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        
+        # Save optimized image
+        save_kwargs = {'optimize': True}
+        if target_format.lower() == 'webp':
+            save_kwargs['quality'] = self.webp_quality
+            save_kwargs['method'] = 6  # Best compression
+        elif target_format.lower() in ['jpg', 'jpeg']:
+            save_kwargs['quality'] = self.webp_quality
+            save_kwargs['progressive'] = True
+        
+        chosen = {}
+        with stage('encode', file=input_path.name):
+            if self.quality_search is not None and target_format.lower() == 'webp':
+                chosen = self.quality_search.choose(img, 'webp', self.webp_quality)
+                output_path.write_bytes(chosen.pop('data'))
+            else:
+                img.save(output_path, target_format.upper(), **save_kwargs)
+        
+        # Calculate savings
+        original_size = input_path.stat().st_size
+        optimized_size = output_path.stat().st_size
+        savings = original_size - optimized_size
+        savings_percent = (savings / original_size) * 100 if original_size > 0 else 0
+        
+        return {
+            'success': True,
+            'original_size': original_size,
+            'optimized_size': optimized_size,
+            'savings': savings,
+            'savings_percent': savings_percent,
+            'resized': img.size != (original_width, original_height),
+            'original_dimensions': (original_width, original_height),
+            'dimensions': img.size,
+            **chosen
+        }
+
     def create_optimized_directory(self):
         """Create optimized directory structure"""
         self.optimized_path.mkdir(parents=True, exist_ok=True)
@@ -142,32 +202,20 @@ class TripBasketImageOptimizer:
 
     def optimize_all_images(self):
         """Optimize all eligible images in the assets directory"""
-        print("TripBasket Automatic Image Optimization")
-        print("=" * 60)
-        
-        # Create optimized directory
-        self.create_optimized_directory()
+        report = OptimizationReport()
+        report.print_header(self)
         
-        # Find all image files
+        # Find all image files in one pass (extensions match case-insensitively);
+        # sort so the processing order and the report are deterministic
         image_extensions = ['.jpg', '.jpeg', '.png']
-        image_files = []
-        
-        for ext in image_extensions:
-            image_files.extend(self.assets_path.rglob(f"*{ext}"))
-            image_files.extend(self.assets_path.rglob(f"*{ext.upper()}"))
+        image_files = sorted(find_files(self.assets_path, image_extensions))
         
         # Filter files that should be optimized
         optimizable_files = [f for f in image_files if self.should_optimize(f)]
+        report.print_counts(len(image_files), len(optimizable_files))
         
-        print(f"Found {len(image_files)} image files")
-        print(f"Optimizing {len(optimizable_files)} files")
-        print(f"Preserving {len(image_files) - len(optimizable_files)} icons/platform assets")
-        print("-" * 60)
-        
-        total_original = 0
-        total_optimized = 0
-        successful_optimizations = 0
-        
+        # Plan output paths up front so results can be reported in file order
+        tasks = []
         for image_file in optimizable_files:
             # Create relative path for organized structure
             rel_path = image_file.relative_to(self.assets_path)
@@ -178,18 +226,12 @@ class TripBasketImageOptimizer:
             else:
                 output_name = rel_path.name
             
-            output_path = self.optimized_path / output_name
-            
-            print(f"Processing: {rel_path.name}")
-            
-            # Optimize the image
-            result = self.optimize_image(image_file, output_path, 'webp')
+            tasks.append((image_file, rel_path, output_name, self.optimized_path / output_name))
+        
+        for (image_file, rel_path, output_name, output_path), result in zip(tasks, self.run_optimizations(tasks)):
+            report.print_result(rel_path, result)
             
             if result['success']:
-                total_original += result['original_size']
-                total_optimized += result['optimized_size']
-                successful_optimizations += 1
-                
                 # Log the optimization
                 log_entry = {
                     'original_path': str(rel_path),
@@ -200,62 +242,64 @@ class TripBasketImageOptimizer:
                     'resized': result.get('resized', False)
                 }
                 self.optimization_log.append(log_entry)
-                
-                print(f"   Original: {result['original_size']:,} bytes")
-                print(f"   Optimized: {result['optimized_size']:,} bytes")
-                print(f"   Savings: {result['savings']:,} bytes ({result['savings_percent']:.1f}%)")
-                if result.get('resized'):
-                    print(f"   Image resized to fit max dimensions")
-                print()
-                
-            else:
-                print(f"   Failed: {result['error']}")
-                print()
         
-        # Print summary
-        total_savings = total_original - total_optimized
-        savings_percent = (total_savings / total_original * 100) if total_original > 0 else 0
+        report.print_summary()
+        print(self.cache.summary())
         
-        print("=" * 60)
-        print("OPTIMIZATION SUMMARY")
-        print("=" * 60)
-        print(f"Successfully optimized: {successful_optimizations} files")
-        print(f"Original total size:   {total_original:,} bytes ({total_original/1024/1024:.2f} MB)")
-        print(f"Optimized total size:  {total_optimized:,} bytes ({total_optimized/1024/1024:.2f} MB)")
-        print(f"Total savings:        {total_savings:,} bytes ({total_savings/1024/1024:.2f} MB)")
-        print(f"Size reduction:       {savings_percent:.1f}%")
+        self.cache.save()
+        if self.quality_search is not None:
+            print(self.quality_search.summary())
+            self.quality_search.save()
         
         return self.optimization_log
 
-    def update_pubspec_yaml(self, optimization_log):
-        """Update pubspec.yaml to include optimized images"""
-        if not self.pubspec_path.exists():
-            print("Warning: pubspec.yaml not found")
-            return
+    def run_optimizations(self, tasks):
+        """Optimize planned (source, rel_path, output_name, output_path) tasks, yielding results in task order"""
+        settings = self.encoder_settings()
+        cached_results = [self.cache.lookup(task[0], task[3], settings) for task in tasks]
+        fresh_results = self.optimize_pending([
+            task for task, cached in zip(tasks, cached_results) if cached is None
+        ])
         
-        print("\nUpdating pubspec.yaml...")
-        
-        with open(self.pubspec_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Add optimized folder to assets if not already present
-        if 'assets/images/optimized/' not in content:
-            # Find the assets section and add optimized folder
-            assets_pattern = r'(\s+assets:\s*\n(?:\s+-\s+[^\n]+\n)*)'
-            
-            def add_optimized_folder(match):
-                assets_section = match.group(1)
-                if 'assets/images/optimized/' not in assets_section:
-                    assets_section += '    - assets/images/optimized/\n'
-                return assets_section
+        for task, cached in zip(tasks, cached_results):
+            if cached is not None:
+                yield dict(cached, cached=True)
+                continue
             
-            content = re.sub(assets_pattern, add_optimized_folder, content)
+            result = next(fresh_results)
+            if result['success']:
+                self.cache.store(task[0], task[3], settings, result)
+                if self.quality_search is not None:
+                    self.quality_search.remember(result)
+            yield result
         
-        # Write updated pubspec.yaml
-        with open(self.pubspec_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        fresh_results.close()
+
+    def optimize_pending(self, tasks):
+        """Run optimize_image for each task, serially or across a process pool"""
+        jobs = min(self.jobs, len(tasks))
+        if jobs <= 1:
+            for image_file, _, _, output_path in tasks:
+                yield self.optimize_image(image_file, output_path, 'webp')
+            return
         
-        print("Added optimized folder to pubspec.yaml")
+        # Executor.map returns results in submission order, so the log and
+        # report stay identical to the serial path regardless of finish order
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            yield from executor.map(
+                self.optimize_image,
+                [task[0] for task in tasks],
+                [task[3] for task in tasks],
+                ['webp'] * len(tasks),
+            )
+
+    def update_pubspec_yaml(self):
+        """
+        List the referenced images and the outputs generated for them in
+        pubspec.yaml, instead of bundling the whole optimized/ folder
+        """
+        print("\nUpdating pubspec.yaml...")
+        AssetReferenceScanner(self.project_root).run()
 
     def generate_optimization_report(self, optimization_log):
         """Generate a JSON report of optimizations"""
@@ -274,8 +318,117 @@ class TripBasketImageOptimizer:
         
         print(f"Optimization report saved: {report_path}")
 
+class OptimizationReport:
+    """
+    This script's console output, for optimize_all_images and for asset
+    pipeline runs of the optimized target (passed as the pipeline's report)
+    """
+    def __init__(self):
+        self.optimized = 0
+        self.total_original = 0
+        self.total_optimized = 0
+
+    def start(self, pipeline):
+        self.print_header(pipeline.optimizer)
+
+    def planned(self, pipeline, candidates, planned, incremental):
+        image_files = [path for path in candidates if path.suffix.lower() in ('.jpg', '.jpeg', '.png')]
+        self.print_counts(len(image_files), len(planned))
+
+    def source(self, pipeline, path, outputs, results):
+        for output, result in zip(outputs, results):
+            if output['target'] == 'optimized':
+                self.print_result(path.relative_to(pipeline.assets_path), result)
+
+    def summary(self, pipeline, totals, total_original):
+        self.print_summary()
+        print(pipeline.cache.summary())
+        if pipeline.quality_search is not None:
+            print(pipeline.quality_search.summary())
+
+    def print_header(self, optimizer):
+        self.optimized = self.total_original = self.total_optimized = 0
+        print("TripBasket Automatic Image Optimization")
+        print("=" * 60)
+        
+        # Create optimized directory
+        optimizer.create_optimized_directory()
+
+    def print_counts(self, found, optimizing):
+        print(f"Found {found} image files")
+        print(f"Optimizing {optimizing} files")
+        print(f"Preserving {found - optimizing} icons/platform assets")
+        print("-" * 60)
+
+    def print_result(self, rel_path, result):
+        print(f"Processing: {rel_path.name}")
+        if result.get('cached'):
+            print("   Up to date (build cache)")
+        
+        if not result['success']:
+            print(f"   Failed: {result['error']}")
+            print()
+            return
+        
+        self.optimized += 1
+        self.total_original += result['original_size']
+        self.total_optimized += result['optimized_size']
+        
+        if result.get('resized'):
+            original_width, original_height = result['original_dimensions']
+            new_width, new_height = result['dimensions']
+            print(f"   Resized: {original_width}x{original_height} → {new_width}x{new_height}")
+        print(f"   Original: {result['original_size']:,} bytes")
+        print(f"   Optimized: {result['optimized_size']:,} bytes")
+        print(f"   Savings: {result['savings']:,} bytes ({result['savings_percent']:.1f}%)")
+        if result.get('resized'):
+            print(f"   Image resized to fit max dimensions")
+        print()
+
+    def print_summary(self):
+        total_savings = self.total_original - self.total_optimized
+        savings_percent = (total_savings / self.total_original * 100) if self.total_original > 0 else 0
+        
+        print("=" * 60)
+        print("OPTIMIZATION SUMMARY")
+        print("=" * 60)
+        print(f"Successfully optimized: {self.optimized} files")
+        print(f"Original total size:   {self.total_original:,} bytes ({self.total_original/1024/1024:.2f} MB)")
+        print(f"Optimized total size:  {self.total_optimized:,} bytes ({self.total_optimized/1024/1024:.2f} MB)")
+        print(f"Total savings:        {total_savings:,} bytes ({total_savings/1024/1024:.2f} MB)")
+        print(f"Size reduction:       {savings_percent:.1f}%")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='TripBasket automatic image optimization')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='number of worker processes (default: CPU count, 1 = serial)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='re-encode every file, ignoring the build cache')
+    parser.add_argument('--quality-search', action='store_true',
+                        help='choose each image\'s WebP quality by SSIM instead of the fixed quality (needs NumPy)')
+    parser.add_argument('--ssim-target', type=float, default=None,
+                        help=f'SSIM target for --quality-search (default: {DEFAULT_SSIM_TARGET:g})')
+    parser.add_argument('--memory-budget', default=None, metavar='MB|auto',
+                        help='decode large uploads at reduced scale and keep estimated worker memory '
+                             'within this many MB (auto: half the available memory)')
+    parser.add_argument('--max-pixels', type=int, default=DEFAULT_MAX_PIXELS,
+                        help=f'skip sources with more pixels than this, 0 for no limit (default: {DEFAULT_MAX_PIXELS:,})')
+    parser.add_argument('--update-pubspec', action='store_true',
+                        help='list just the referenced images and their outputs in pubspec.yaml afterwards')
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-stage timings as a Chrome trace and summary JSON')
+    parser.add_argument('--watch', action='store_true',
+                        help='after the first run, re-optimize images as they are added, changed or deleted')
+    parser.add_argument('--poll', action='store_true',
+                        help='with --watch, poll for changes instead of using inotify')
+    parser.add_argument('--debounce', type=float, default=None,
+                        help='with --watch, seconds without changes before a batch is processed (default: 0.5)')
+    return parser.parse_args()
+
 def main():
     """Main optimization process"""
+    args = parse_args()
     
     # Check dependencies
     try:
@@ -284,22 +437,31 @@ def main():
         print("ERROR: PIL (Pillow) not found. Install with: pip install Pillow")
         sys.exit(1)
     
+    if args.quality_search:
+        if importlib.util.find_spec('numpy') is None:
+            print("ERROR: --quality-search needs NumPy. Install with: pip install numpy")
+            sys.exit(1)
+    
     # Get project root
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
     
     print(f"Project root: {project_root}")
     
-    # Initialize optimizer
-    optimizer = TripBasketImageOptimizer(project_root)
-    
-    # Run optimization
-    optimization_log = optimizer.optimize_all_images()
+    # Run the optimized/ target through the shared asset pipeline, in this
+    # script's output format; it also writes image_optimization_report.json
+    # (and with --update-pubspec, pubspec.yaml)
+    from asset_pipeline import AssetPipeline, PipelineSettings
+    settings = PipelineSettings(targets=['optimized'], jobs=args.jobs, use_cache=not args.no_cache,
+                                quality_search=args.quality_search, ssim_target=args.ssim_target,
+                                memory_budget=parse_budget(args.memory_budget), max_pixels=args.max_pixels,
+                                update_pubspec=args.update_pubspec, profile=args.profile)
+    pipeline = AssetPipeline(project_root, settings, report=OptimizationReport())
+    pipeline.run()
     
-    # Update pubspec.yaml
-    if optimization_log:
-        optimizer.update_pubspec_yaml(optimization_log)
-        optimizer.generate_optimization_report(optimization_log)
+    if args.watch:
+        from watch_assets import watch, DEFAULT_DEBOUNCE
+        watch(pipeline, debounce=args.debounce or DEFAULT_DEBOUNCE, polling=args.poll)
     
     print("\nAutomatic image optimization completed!")
     print("Next steps:")
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the TripBasket image optimization scripts
+- Generates a deterministic synthetic corpus (hero JPEGs, alpha PNGs, palette images, tiny icons)
+- Times each script's core function: optimize_image, optimize_image_sizes, compress_hero_image
+- Records wall time, CPU time, peak RSS, bytes in/out and encodes per second as JSON
+- Compare mode fails when a metric regresses past its threshold versus a stored baseline
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import statistics
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import PIL
+from PIL import Image, ImageDraw
+
+from auto_optimize_images import TripBasketImageOptimizer
+from optimize_web_images import WebImageOptimizer
+from compress_hero_images import compress_hero_image
+
+RESULTS_VERSION = 1
+DEFAULT_SEED = 2024
+# Relative to the project root, not the working directory
+DEFAULT_RESULTS = Path('build') / 'benchmarks' / 'image_benchmarks.json'
+
+# Corpus composition: kind -> (count, size)
+CORPUS = {
+    'hero': (3, (3000, 2000)),
+    'alpha': (4, (1600, 1200)),
+    'palette': (4, (1200, 800)),
+    'icon': (8, (64, 64)),
+}
+
+# Metric -> (direction, default regression threshold in percent).
+# 'lower' metrics regress when they grow, 'higher' ones when they shrink.
+METRICS = {
+    'wall_s': ('lower', 15.0),
+    'cpu_s': ('lower', 15.0),
+    'peak_rss_mb': ('lower', 20.0),
+    'bytes_out': ('lower', 2.0),
+    'encodes_per_s': ('higher', 15.0),
+}
+
+BENCHMARKS = ['optimize_image', 'optimize_image_sizes', 'compress_hero_image']
+
+
+# Corpus
+
+def draw_scene(rng, size, mode='RGB'):
+    """Gradient plus random shapes: compresses like a photo more than flat noise does"""
+    width, height = size
+    extent = (-2.2 + rng.random() * 0.4, -1.4, 0.8, 1.4 + rng.random() * 0.2)
+    base = Image.effect_mandelbrot(size, extent, 64 + rng.randrange(64))
+    gradient = Image.linear_gradient('L').resize(size)
+    img = Image.merge('RGB', (base, gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    if mode == 'RGBA':
+        img = img.convert('RGBA')
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(1, width // 3 + 2), y0 + rng.randrange(1, height // 3 + 2)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if mode == 'RGBA':
+            color += (rng.randrange(64, 256),)
+        draw.ellipse((x0, y0, x1, y1), fill=color)
+    return img
+
+
+def generate_corpus(directory, seed=DEFAULT_SEED):
+    """Write the synthetic corpus to directory and return {kind: [paths]}"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    corpus = {}
+
+    for kind, (count, size) in CORPUS.items():
+        corpus[kind] = []
+        for n in range(count):
+            if kind == 'hero':
+                path = directory / f"hero_{n}.jpg"
+                draw_scene(rng, size).save(path, 'JPEG', quality=92)
+            elif kind == 'alpha':
+                path = directory / f"alpha_{n}.png"
+                img = draw_scene(rng, size, 'RGBA')
+                # Fade the alpha channel so transparency handling is exercised
+                alpha = Image.linear_gradient('L').resize(size).point(lambda v: 255 - v // 2)
+                img.putalpha(alpha)
+                img.save(path, 'PNG')
+            elif kind == 'palette':
+                path = directory / f"palette_{n}.png"
+                draw_scene(rng, size).quantize(colors=64).save(path, 'PNG')
+            else:
+                path = directory / f"icon_{n}.png"
+                draw_scene(rng, size, 'RGBA').save(path, 'PNG')
+            corpus[kind].append(path)
+
+    return corpus
+
+
+# Benchmarks (run in a fresh worker process so peak RSS is per benchmark)
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def bench_optimize_image(workspace, corpus):
+    optimizer = TripBasketImageOptimizer(workspace, jobs=1, use_cache=False)
+    optimizer.create_optimized_directory()
+    encodes, bytes_out = 0, 0
+    for path in [p for paths in corpus.values() for p in paths]:
+        output_path = optimizer.optimized_path / (path.stem + '.webp')
+        result = optimizer.optimize_image(path, output_path, 'webp')
+        if not result['success']:
+            raise RuntimeError(f"optimize_image failed on {path.name}: {result['error']}")
+        encodes += 1
+        bytes_out += result['optimized_size']
+    return encodes, bytes_out
+
+
+def bench_optimize_image_sizes(workspace, corpus):
+    web = WebImageOptimizer(workspace, use_cache=False)
+    encodes, bytes_out = 0, 0
+    for kind, config_type in (('hero', 'hero'), ('alpha', 'gallery'), ('palette', 'card'), ('icon', 'card')):
+        for path in corpus[kind]:
+            for result in web.optimize_image_sizes(path, web.optimized_path / path.stem, config_type):
+                encodes += 1
+                bytes_out += result['file_size']
+    return encodes, bytes_out
+
+
+def bench_compress_hero_image(workspace, corpus):
+    output_dir = Path(workspace) / 'hero'
+    output_dir.mkdir(parents=True, exist_ok=True)
+    encodes, bytes_out = 0, 0
+    for path in corpus['hero']:
+        output_path = output_dir / (path.stem + '.webp')
+        # A tight budget so the quality/scale search actually iterates
+        result = compress_hero_image(path, output_path, max_size_kb=40, min_scale=0.5)
+        if not result['success']:
+            raise RuntimeError(f"compress_hero_image failed on {path.name}: {result['error']}")
+        encodes += result['encodes']
+        bytes_out += output_path.stat().st_size
+    return encodes, bytes_out
+
+
+def run_benchmark(name, corpus, workspace):
+    """Run one benchmark in the current process and return its metrics"""
+    bench = globals()[f"bench_{name}"]
+    workspace = Path(workspace)
+    shutil.rmtree(workspace, ignore_errors=True)
+    workspace.mkdir(parents=True)
+
+    # The scripts report as they go; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        encodes, bytes_out = bench(workspace, corpus)
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    return {
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu, 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'bytes_in': sum(p.stat().st_size for paths in corpus.values() for p in paths),
+        'bytes_out': bytes_out,
+        'encodes': encodes,
+        'encodes_per_s': round(encodes / wall, 2) if wall else None,
+    }
+
+
+def run_isolated(name, corpus, workspace):
+    """run_benchmark in a fresh process, so imports and peak RSS don't leak between runs"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_benchmark, name, corpus, workspace).result()
+
+
+def run_suite(work_dir, names, repeat=3, seed=DEFAULT_SEED):
+    """Generate the corpus, run each benchmark `repeat` times and keep the median metrics"""
+    work_dir = Path(work_dir)
+    corpus = generate_corpus(work_dir / 'corpus', seed)
+    results = {}
+
+    for name in names:
+        runs = [run_isolated(name, corpus, work_dir / 'workspace') for _ in range(repeat)]
+        median = {}
+        for metric in runs[0]:
+            values = [run[metric] for run in runs if run[metric] is not None]
+            median[metric] = statistics.median_low(values) if values else None
+        median['runs'] = repeat
+        results[name] = median
+        print(f"{name}: {median['wall_s']:.3f}s wall, {median['cpu_s']:.3f}s CPU, "
+              f"{median['encodes']} encodes ({median['encodes_per_s']}/s), "
+              f"{median['bytes_out']:,} bytes out, peak RSS {median['peak_rss_mb']} MB")
+
+    files = [p for paths in corpus.values() for p in paths]
+    return {
+        'version': RESULTS_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'corpus': {
+            'seed': seed,
+            'files': len(files),
+            'bytes': sum(p.stat().st_size for p in files),
+            'kinds': {kind: len(paths) for kind, paths in corpus.items()},
+        },
+        'benchmarks': results,
+    }
+
+
+# Compare mode
+
+def compare(current, baseline, thresholds=None):
+    """Return a list of regression messages (empty when within thresholds)"""
+    thresholds = thresholds or {}
+    regressions = []
+
+    for name, metrics in current['benchmarks'].items():
+        reference = baseline.get('benchmarks', {}).get(name)
+        if reference is None:
+            print(f"{name}: no baseline, skipped")
+            continue
+        for metric, (direction, default) in METRICS.items():
+            value, base = metrics.get(metric), reference.get(metric)
+            if value is None or not base:
+                continue
+            change = (value - base) / base * 100
+            limit = thresholds.get(metric, default)
+            regressed = change > limit if direction == 'lower' else -change > limit
+            marker = "REGRESSION" if regressed else "ok"
+            print(f"  {name}.{metric}: {base} -> {value} ({change:+.1f}%, limit {limit:.0f}%) {marker}")
+            if regressed:
+                regressions.append(f"{name}.{metric} {change:+.1f}% (limit {limit:.0f}%)")
+
+    return regressions
+
+
+def parse_threshold(text):
+    """'wall_s=10' -> ('wall_s', 10.0)"""
+    metric, _, value = text.partition('=')
+    if metric not in METRICS or not value:
+        raise argparse.ArgumentTypeError(f"expected METRIC=PERCENT with METRIC in {', '.join(METRICS)}")
+    return metric, float(value)
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Benchmark the TripBasket image optimization scripts')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS,
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per benchmark; the median is recorded (default: 3)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help=f'corpus seed (default: {DEFAULT_SEED})')
+    parser.add_argument('--output', type=Path, default=None,
+                        help=f'results JSON (default: {DEFAULT_RESULTS})')
+    parser.add_argument('--compare', type=Path, default=None, metavar='BASELINE',
+                        help='fail if results regress versus this baseline JSON')
+    parser.add_argument('--threshold', action='append', type=parse_threshold, default=[],
+                        metavar='METRIC=PERCENT', help='override a regression threshold; repeatable')
+    parser.add_argument('--work-dir', type=Path, default=None,
+                        help='where to build the corpus (default: next to the results file)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    project_root = Path(__file__).parent.parent
+    output = args.output or project_root / DEFAULT_RESULTS
+    work_dir = args.work_dir or output.parent / 'work'
+
+    print("Image Optimization Benchmarks")
+    print("=" * 60)
+    results = run_suite(work_dir, args.benchmarks, repeat=args.repeat, seed=args.seed)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved: {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('corpus', {}).get('seed') != results['corpus']['seed']:
+            print("Warning: baseline was recorded with a different corpus seed")
+
+        print(f"\nComparing against {args.compare}")
+        regressions = compare(results, baseline, dict(args.threshold))
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
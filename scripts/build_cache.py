@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Incremental build cache for the TripBasket image scripts
+- Keys every output on source content hash + encoder settings
+- Persists a JSON index in assets/images/optimized/.build_cache.json
+- Lets scripts skip outputs that are already up to date
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+CACHE_VERSION = 1
+CACHE_FILENAME = '.build_cache.json'
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_digest(settings):
+    """Return a stable digest for a dict of encoder settings"""
+    encoded = json.dumps(settings, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class BuildCache:
+    """Persistent index of source hash + settings → output hash"""
+
+    def __init__(self, project_root, enabled=True):
+        self.project_root = Path(project_root)
+        self.cache_path = self.project_root / 'assets' / 'images' / 'optimized' / CACHE_FILENAME
+        self.enabled = enabled
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._source_hashes = {}
+        self.load()
+
+    def load(self):
+        """Load the index from disk, discarding it if unreadable or outdated"""
+        if not self.enabled or not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable build cache ({e})")
+            self.entries = {}
+
+    def save(self):
+        """Write the index atomically, dropping entries whose outputs are gone"""
+        if not self.enabled:
+            return
+        self.entries = {
+            key: entry for key, entry in self.entries.items()
+            if (self.project_root / key).exists()
+        }
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': self.entries}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.cache_path)
+
+    def _key(self, path):
+        path = Path(path)
+        try:
+            return path.resolve().relative_to(self.project_root.resolve()).as_posix()
+        except ValueError:
+            return path.resolve().as_posix()
+
+    def source_hash(self, source_path):
+        """Content hash of a source file, memoized per (path, size, mtime)"""
+        stat = Path(source_path).stat()
+        memo_key = (str(source_path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._source_hashes:
+            self._source_hashes[memo_key] = hash_file(source_path)
+        return self._source_hashes[memo_key]
+
+    def lookup(self, source_path, output_paths, settings):
+        """
+        Return the stored result for an up-to-date output, or None on a miss.
+        output_paths may be a single path or a list; the first path is the key
+        and every listed file must still match its recorded content hash.
+        """
+        if not self.enabled:
+            return None
+        if not isinstance(output_paths, (list, tuple)):
+            output_paths = [output_paths]
+
+        entry = self.entries.get(self._key(output_paths[0]))
+        if (entry is not None
+                and entry.get('source') == self.source_hash(source_path)
+                and entry.get('settings') == settings_digest(settings)
+                and self._outputs_match(entry.get('outputs', {}), output_paths)):
+            self.hits += 1
+            return entry.get('result', {})
+
+        self.misses += 1
+        return None
+
+    def _outputs_match(self, recorded, output_paths):
+        # The first output is always written; later ones are optional (e.g. a
+        # format that lost to a smaller one) and only checked if they were recorded
+        for index, output_path in enumerate(output_paths):
+            key = self._key(output_path)
+            if key not in recorded:
+                if index == 0:
+                    return False
+                continue
+            if not Path(output_path).exists():
+                return False
+            if hash_file(output_path) != recorded[key]:
+                return False
+        return True
+
+    def store(self, source_path, output_paths, settings, result=None):
+        """Record freshly written outputs for a source and settings"""
+        if not self.enabled:
+            return
+        if not isinstance(output_paths, (list, tuple)):
+            output_paths = [output_paths]
+
+        self.entries[self._key(output_paths[0])] = {
+            'source': self.source_hash(source_path),
+            'source_path': self._key(source_path),
+            'settings': settings_digest(settings),
+            'outputs': {self._key(p): hash_file(p) for p in output_paths if Path(p).exists()},
+            'result': result or {},
+        }
+
+    def forget(self, output_paths):
+        """Drop the entry keyed on output_paths (a path or a list, first path is the key)"""
+        if not isinstance(output_paths, (list, tuple)):
+            output_paths = [output_paths]
+        self.entries.pop(self._key(output_paths[0]), None)
+
+    def forget_source(self, source_path):
+        """Drop every entry built from source_path, returning their recorded output keys"""
+        source_key = self._key(source_path)
+        outputs = []
+        for key, entry in list(self.entries.items()):
+            if entry.get('source_path') == source_key:
+                outputs.extend(entry.get('outputs', {}) or [key])
+                del self.entries[key]
+        return outputs
+
+    def summary(self):
+        """One-line hit/miss summary for the script reports"""
+        if not self.enabled:
+            return "Build cache: disabled"
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0
+        return f"Build cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% up to date)"
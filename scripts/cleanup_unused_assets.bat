@@ -1,4 +1,5 @@
 @echo off
+setlocal enabledelayedexpansion
 echo ========================================
 echo    TripBasket Asset Cleanup
 echo ========================================
@@ -6,36 +7,45 @@ echo.
 
 cd /d "%~dp0.."
 
-echo Analyzing large PNG assets...
-echo.
+:: unused_assets.txt is written by scripts\asset_references.py: every source under
+:: assets\images that is neither referenced from lib\ or web\ nor a build input
+:: of a referenced image
+echo Scanning asset references...
+python scripts\asset_references.py --dry-run >nul
+if errorlevel 1 (
+    echo ❌ Reference scan failed. Run 'python scripts\asset_references.py' for details.
+    goto :end
+)
 
-:: Check for badge design files
-if exist "assets\images\@4xff_badgeDesign_light_small.png" (
-    echo Found: @4xff_badgeDesign_light_small.png
-    for %%A in ("assets\images\@4xff_badgeDesign_light_small.png") do echo   Size: %%~zA bytes (%%~zA / 1024 KB^)
-    
-    :: Check if referenced in code
-    findstr /r /c:"badgeDesign" "lib\*.dart" "lib\**\*.dart" >nul 2>&1
-    if %errorlevel% neq 0 (
-        echo   ⚠️  Not found in Dart code - potentially unused
-    ) else (
-        echo   ✅ Referenced in code - keeping
-    )
+if not exist "unused_assets.txt" (
+    echo No unused_assets.txt found - nothing to clean up.
+    goto :end
 )
 
-if exist "assets\images\@4xff_badgeDesign_dark_small.png" (
-    echo Found: @4xff_badgeDesign_dark_small.png
-    for %%A in ("assets\images\@4xff_badgeDesign_dark_small.png") do echo   Size: %%~zA bytes (%%~zA / 1024 KB^)
-    
-    :: Check if referenced in code
-    findstr /r /c:"badgeDesign" "lib\*.dart" "lib\**\*.dart" >nul 2>&1
-    if %errorlevel% neq 0 (
-        echo   ⚠️  Not found in Dart code - potentially unused
-    ) else (
-        echo   ✅ Referenced in code - keeping
+set "unused_count=0"
+set "unused_size=0"
+echo Unused assets (not referenced from lib\ or web\):
+echo.
+for /f "usebackq delims=" %%F in ("unused_assets.txt") do (
+    if exist "%%F" (
+        set /a "unused_count+=1"
+        for %%A in ("%%F") do (
+            set /a "unused_size+=%%~zA"
+            echo   %%F  ^(%%~zA bytes^)
+        )
     )
 )
 
+if %unused_count%==0 (
+    echo   None - every asset is referenced.
+    goto :end
+)
+
+set /a "unused_kb=%unused_size% / 1024"
+echo.
+echo Found %unused_count% unused assets (~%unused_kb% KB)
+echo Details: asset_usage_report.json
+
 echo.
 echo ========================================
 echo      Asset Cleanup Options
@@ -43,7 +53,7 @@ echo ========================================
 echo.
 echo 1. Keep all assets (no changes)
 echo 2. Move unused assets to backup folder
-echo 3. Delete unused assets (saves ~1.6MB)
+echo 3. Delete unused assets (saves ~%unused_kb% KB)
 echo.
 set /p choice="Enter your choice (1-3): "
 
@@ -62,19 +72,16 @@ goto :end
 echo Creating backup folder...
 if not exist "assets\images\backup" mkdir "assets\images\backup"
 
-if exist "assets\images\@4xff_badgeDesign_light_small.png" (
-    echo Moving badge design files to backup...
-    move "assets\images\@4xff_badgeDesign_light_small.png" "assets\images\backup\"
-    echo   Moved: @4xff_badgeDesign_light_small.png
-)
-
-if exist "assets\images\@4xff_badgeDesign_dark_small.png" (
-    move "assets\images\@4xff_badgeDesign_dark_small.png" "assets\images\backup\"
-    echo   Moved: @4xff_badgeDesign_dark_small.png
+:: backup\ is skipped by the scanner and never listed in pubspec.yaml
+for /f "usebackq delims=" %%F in ("unused_assets.txt") do (
+    if exist "%%F" (
+        move "%%F" "assets\images\backup\" >nul
+        echo   Moved: %%~nxF
+    )
 )
 
 echo ✅ Unused assets moved to assets\images\backup\
-goto :end
+goto :refresh
 
 :delete_assets
 echo.
@@ -87,23 +94,21 @@ if not "%confirm%"=="DELETE" (
     goto :end
 )
 
-set "deleted_size=0"
-
-if exist "assets\images\@4xff_badgeDesign_light_small.png" (
-    for %%A in ("assets\images\@4xff_badgeDesign_light_small.png") do set /a "deleted_size+=%%~zA"
-    del "assets\images\@4xff_badgeDesign_light_small.png"
-    echo   Deleted: @4xff_badgeDesign_light_small.png
+for /f "usebackq delims=" %%F in ("unused_assets.txt") do (
+    if exist "%%F" (
+        del "%%F"
+        echo   Deleted: %%~nxF
+    )
 )
 
-if exist "assets\images\@4xff_badgeDesign_dark_small.png" (
-    for %%A in ("assets\images\@4xff_badgeDesign_dark_small.png") do set /a "deleted_size+=%%~zA"
-    del "assets\images\@4xff_badgeDesign_dark_small.png"
-    echo   Deleted: @4xff_badgeDesign_dark_small.png
-)
+echo.
+echo ✅ Deleted %unused_size% bytes (~%unused_kb% KB) of unused assets
+goto :refresh
 
-set /a "deleted_mb=%deleted_size% / 1024 / 1024"
+:refresh
 echo.
-echo ✅ Deleted %deleted_size% bytes (~%deleted_mb% MB) of unused assets
+echo Refreshing pubspec.yaml image assets...
+python scripts\asset_references.py >nul
 goto :end
 
 :end
@@ -115,4 +120,4 @@ echo - Run 'flutter clean' after asset changes
 echo - Test your app to ensure no missing images
 echo - Use 'build_optimized.bat' for optimized builds
 echo.
-pause
\ No newline at end of file
+pause
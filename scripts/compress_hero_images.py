@@ -6,126 +6,199 @@ Compress hero/banner images for optimal web performance
 - Format: WebP with maximum compression
 """
 
+import io
 import os
 import sys
+import argparse
 from pathlib import Path
 from PIL import Image
-import shutil
 
-def compress_hero_image(input_path, output_path, max_size_kb=150, quality=55):
-    """Compress image to target file size with WebP"""
+from instrumentation import stage
+from image_modes import normalize_for
+
+def encode_webp(img, quality):
+    """Encode an image to WebP in memory and return the bytes"""
+    buffer = io.BytesIO()
+    img.save(buffer, 'WEBP',
+            quality=quality,
+            method=6,  # Maximum compression
+            optimize=True)
+    return buffer.getvalue()
+
+def compress_hero_image(input_path, output_path, max_size_kb=150, quality=55,
+                        min_quality=35, quality_step=5, min_scale=None, scale_steps=4):
+    """
+    Compress image to target file size with WebP.
+    Bisects over quality (and, when min_scale is set and quality alone can't
+    reach the budget, over a downscale factor) encoding in memory, then
+    writes only the winning buffer.
+    """
     try:
         with Image.open(input_path) as img:
-            # Convert RGBA to RGB if needed
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'RGBA':
-                    background.paste(img, mask=img.split()[-1])
-                else:
-                    background.paste(img, mask=img.split()[-1])
-                img = background
-            elif img.mode == 'P':
-                img = img.convert('RGB')
-            
-            # Start with target quality
-            current_quality = quality
-            
-            # Try different qualities until we hit target size
-            for attempt_quality in range(quality, 30, -5):  # Try 55, 50, 45, 40, 35
-                # Save to temporary buffer to check size
-                temp_path = output_path.with_suffix('.temp.webp')
-                
-                img.save(temp_path, 'WEBP', 
-                        quality=attempt_quality, 
-                        method=6,  # Maximum compression
-                        optimize=True)
-                
-                file_size_kb = temp_path.stat().st_size / 1024
-                
-                print(f"   Quality {attempt_quality}%: {file_size_kb:.1f} KB")
-                
-                if file_size_kb <= max_size_kb:
-                    # Found acceptable size, use this version
-                    shutil.move(str(temp_path), str(output_path))
-                    return {
-                        'success': True,
-                        'final_size_kb': file_size_kb,
-                        'final_quality': attempt_quality,
-                        'achieved_target': True
-                    }
-                else:
-                    # Too big, clean up and try lower quality
-                    temp_path.unlink()
-            
-            # If we couldn't reach target, use the lowest quality we tried
-            final_quality = 35
-            img.save(output_path, 'WEBP', 
-                    quality=final_quality, 
-                    method=6,
-                    optimize=True)
-            
-            final_size_kb = output_path.stat().st_size / 1024
-            
-            return {
-                'success': True,
-                'final_size_kb': final_size_kb,
-                'final_quality': final_quality,
-                'achieved_target': final_size_kb <= max_size_kb
-            }
+            return compress_loaded_image(img, output_path, max_size_kb, quality,
+                                         min_quality, quality_step, min_scale, scale_steps)
             
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
-def main():
-    print("Hero Image Compression for Web Performance")
-    print("Target: <=150KB per image with WebP")
-    print("=" * 50)
+def compress_loaded_image(img, output_path, max_size_kb=150, quality=55,
+                          min_quality=35, quality_step=5, min_scale=None, scale_steps=4,
+                          verbose=True):
+    """Compress an already opened image to the byte budget (shared with the asset pipeline)"""
+    # WebP keeps transparency; fully opaque alpha is dropped
+    img = normalize_for(img, 'webp')
     
-    project_root = Path(__file__).parent.parent
-    assets_path = project_root / 'assets' / 'images'
-    optimized_path = assets_path / 'optimized'
+    max_bytes = max_size_kb * 1024
+    encodes = 0
+    best = None      # (quality, scale, data) of the best attempt within budget
+    smallest = None  # (quality, scale, data) of the smallest attempt overall
     
-    # Hero images to compress
-    hero_images = [
-        '200611101955-01-egypt-dahab.webp'
-    ]
-    
-    for image_name in hero_images:
-        input_path = optimized_path / image_name
+    def attempt(candidate, attempt_quality, scale):
+        nonlocal encodes, best, smallest
+        with stage('encode', file=Path(output_path).name, quality=attempt_quality, scale=scale):
+            data = encode_webp(candidate, attempt_quality)
+        encodes += 1
+        
+        if verbose:
+            label = f"Quality {attempt_quality}%" if scale == 1.0 else f"Scale {scale:.0%}, quality {attempt_quality}%"
+            print(f"   {label}: {len(data) / 1024:.1f} KB")
         
-        if not input_path.exists():
-            print(f"❌ {image_name} not found, checking main assets folder...")
-            input_path = assets_path / image_name
+        if smallest is None or len(data) < len(smallest[2]):
+            smallest = (attempt_quality, scale, data)
+        fits = len(data) <= max_bytes
+        if fits and (best is None or (scale, attempt_quality) > (best[1], best[0])):
+            best = (attempt_quality, scale, data)
+        return fits
+    
+    # Candidate qualities, lowest first: 35, 40, 45, 50, 55 by default
+    qualities = list(range(min_quality, quality, quality_step)) + [quality]
+    
+    # Most images fit at the requested quality, so try it before searching
+    if not attempt(img, quality, 1.0):
+        # Bisect for the highest remaining quality that fits
+        lo, hi = 0, len(qualities) - 2
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if attempt(img, qualities[mid], 1.0):
+                lo = mid + 1
+            else:
+                hi = mid - 1
+    
+    if best is None and min_scale is not None and min_scale < 1:
+        # Quality alone can't hit the budget: bisect the largest downscale
+        # factor that fits at the lowest quality
+        lo_scale, hi_scale = min_scale, 1.0
+        for _ in range(scale_steps):
+            scale = (lo_scale + hi_scale) / 2
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            with stage('resize', file=Path(output_path).name, scale=scale):
+                candidate = img.resize(size, Image.Resampling.LANCZOS)
+            if attempt(candidate, min_quality, scale):
+                lo_scale = scale
+            else:
+                hi_scale = scale
+    
+    # If we couldn't reach target, keep the smallest encode we made
+    final_quality, final_scale, data = best if best is not None else smallest
+    
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    
+    return {
+        'success': True,
+        'final_size_kb': len(data) / 1024,
+        'final_quality': final_quality,
+        'final_scale': final_scale,
+        'achieved_target': best is not None,
+        'encodes': encodes
+    }
+
+class HeroReport:
+    """This script's console output for asset pipeline runs of the hero target"""
+    def __init__(self, max_size_kb):
+        self.max_size_kb = max_size_kb
+
+    def start(self, pipeline):
+        pass
+
+    def planned(self, pipeline, candidates, planned, incremental):
+        compressing = {path.name for path, outputs in planned
+                       if any(output['target'] == 'hero' for output in outputs)}
+        for image_name in pipeline.settings.hero_images:
+            source = pipeline.assets_path / image_name
+            copy = pipeline.hero_path(source)
+            if not copy.exists():
+                print(f"❌ {image_name} not found, checking main assets folder...")
+                if not source.exists():
+                    print(f"❌ {image_name} not found in assets")
+                    continue
+            elif source.exists() and pipeline.hero_source(source) == source:
+                print(f"{image_name} changed since it was compressed, using main assets folder...")
             
-            if not input_path.exists():
-                print(f"❌ {image_name} not found in assets")
+            # Compressed ones are reported with their results
+            if image_name in compressing or not source.exists():
                 continue
-        
-        # Get original size
-        original_size_kb = input_path.stat().st_size / 1024
-        print(f"\nCompressing {image_name}")
-        print(f"   Original: {original_size_kb:.1f} KB")
-        
-        if original_size_kb <= 150:
-            print(f"   Already under 150KB, skipping")
-            continue
-        
-        # Compress the image
-        output_path = optimized_path / image_name
-        result = compress_hero_image(input_path, output_path, max_size_kb=150)
-        
-        if result['success']:
-            print(f"   Compressed to {result['final_size_kb']:.1f} KB at {result['final_quality']}% quality")
+            original_size_kb = pipeline.hero_source(source).stat().st_size / 1024
+            print(f"\nCompressing {image_name}")
+            print(f"   Original: {original_size_kb:.1f} KB")
+            print(f"   Already under {self.max_size_kb:g}KB, skipping")
+
+    def source(self, pipeline, path, outputs, results):
+        for output, result in zip(outputs, results):
+            if output['target'] != 'hero':
+                continue
+            print(f"\nCompressing {path.name}")
+            if not result['success']:
+                print(f"   Failed: {result['error']}")
+                continue
+            
+            original_size_kb = result['original_size'] / 1024
+            print(f"   Original: {original_size_kb:.1f} KB")
+            print(f"   Compressed to {result['final_size_kb']:.1f} KB at {result['final_quality']}% quality "
+                  f"({result['encodes']} encodes)")
+            if result['final_scale'] < 1:
+                print(f"   Downscaled to {result['final_scale']:.0%} of original dimensions")
             if result['achieved_target']:
                 print(f"   Target achieved!")
             else:
-                print(f"   Close to target (couldn't get under 150KB)")
+                print(f"   Close to target (couldn't get under {self.max_size_kb:g}KB)")
             
             savings = original_size_kb - result['final_size_kb']
             savings_percent = (savings / original_size_kb) * 100
             print(f"   Savings: {savings:.1f} KB ({savings_percent:.1f}%)")
-        else:
-            print(f"   Failed: {result['error']}")
+
+    def summary(self, pipeline, totals, total_original):
+        pass
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Compress hero/banner images to a byte budget')
+    parser.add_argument('--max-size-kb', type=float, default=150,
+                        help='target size per image in KB (default: 150)')
+    parser.add_argument('--min-scale', type=float, default=None,
+                        help='allow downscaling to this factor when quality alone cannot reach the target')
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-stage timings as a Chrome trace and summary JSON')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    max_size_kb = args.max_size_kb
+    
+    print("Hero Image Compression for Web Performance")
+    print(f"Target: <={max_size_kb:g}KB per image with WebP")
+    print("=" * 50)
+    
+    project_root = Path(__file__).parent.parent
+    
+    # Run the hero target through the shared asset pipeline, in this script's
+    # output format; each listed hero is compressed from its optimized/ copy
+    # when there is one, otherwise from its source in assets/images
+    from asset_pipeline import AssetPipeline, PipelineSettings
+    settings = PipelineSettings(targets=['hero'], hero_max_size_kb=max_size_kb,
+                                hero_min_scale=args.min_scale, profile=args.profile)
+    pipeline = AssetPipeline(project_root, settings, report=HeroReport(max_size_kb))
+    pipeline.run()
     
     print("\n" + "=" * 50)
     print("Hero image compression completed!")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Single-pass source discovery for the TripBasket asset scripts
+- Walks the tree once with os.scandir, matching every extension in the same pass
+- Prunes dependency, VCS and tool directories by name, and the Flutter
+  platform and build folders only at the project root, before descending
+- Optionally persists a (path, size, mtime) index: directories whose mtime is
+  unchanged reuse their cached listing instead of being listed again
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+INDEX_VERSION = 2
+INDEX_FILENAME = 'asset_index.json'
+
+# Directory names that never hold source assets, at any depth
+PRUNED_DIRS = {
+    '.git', '.dart_tool', '.firebase', '.gradle', '.idea', '.symlinks',
+    'node_modules', 'Pods',
+}
+
+# Top-level Flutter platform and build folders: launcher icons, splash screens,
+# web icons and build output, which stay as they are. Pruned only as direct
+# children of the project root, so lib/ui/web/ or assets/images/build/ are kept
+PLATFORM_DIRS = {'android', 'ios', 'web', 'linux', 'macos', 'windows', 'build'}
+
+
+def default_index_path(project_root):
+    """Index location; .dart_tool is a tool cache that is never scanned or bundled"""
+    return Path(project_root) / '.dart_tool' / INDEX_FILENAME
+
+
+class FileIndex:
+    """
+    Scanner over a root directory. With an index_path, each directory's
+    listing is stored keyed on the directory's mtime: adding, removing or
+    renaming an entry changes it, so an unchanged mtime means the cached
+    listing (subdirectories and matching files) is still accurate.
+    Sizes and mtimes of files are refreshed only when their directory changes.
+    """
+
+    def __init__(self, root, extensions, pruned_dirs=None, index_path=None, pruned_paths=None):
+        self.root = Path(root)
+        self.extensions = {ext.lower() for ext in extensions}
+        self.pruned_dirs = PRUNED_DIRS if pruned_dirs is None else set(pruned_dirs)
+        # Directories pruned by their POSIX path relative to root ('web', 'assets/x')
+        self.pruned_paths = set(pruned_paths or ())
+        self.index_path = Path(index_path) if index_path else None
+        self.directories = {}
+        self.listed = 0
+        self.reused = 0
+        self.load()
+
+    def settings_key(self):
+        """Scans with different roots, extensions or pruning share one file under separate keys"""
+        settings = [str(self.root.resolve()), sorted(self.extensions), sorted(self.pruned_dirs),
+                    sorted(self.pruned_paths)]
+        return hashlib.sha256(json.dumps(settings).encode('utf-8')).hexdigest()[:16]
+
+    def read_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                return data.get('scans', {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def load(self):
+        """Load this scan's directory listings from the persisted index"""
+        if self.index_path is None or not self.index_path.exists():
+            return
+        self.directories = self.read_index().get(self.settings_key(), {})
+
+    def save(self):
+        if self.index_path is None:
+            return
+        scans = self.read_index() if self.index_path.exists() else {}
+        scans[self.settings_key()] = self.directories
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'scans': scans}, f, separators=(',', ':'))
+        os.replace(temp_path, self.index_path)
+
+    def list_directory(self, path, key, mtime_ns):
+        """scandir one directory into {'mtime_ns', 'dirs', 'files': {name: [size, mtime_ns]}}"""
+        dirs = []
+        files = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        relative = f"{key}/{entry.name}" if key else entry.name
+                        if entry.name not in self.pruned_dirs and relative not in self.pruned_paths:
+                            dirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in self.extensions:
+                        stat = entry.stat()
+                        files[entry.name] = [stat.st_size, stat.st_mtime_ns]
+                except OSError:
+                    continue
+        self.listed += 1
+        listing = {'mtime_ns': mtime_ns, 'dirs': sorted(dirs), 'files': dict(sorted(files.items()))}
+        self.directories[key] = listing
+        return listing
+
+    def scan(self):
+        """
+        Yield (path, size, mtime_ns) for matching files: each directory's files
+        in sorted order, then its subdirectories depth-first in sorted order
+        """
+        seen = set()
+        stack = ['']
+        while stack:
+            key = stack.pop()
+            path = self.root / key if key else self.root
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(key)
+
+            listing = self.directories.get(key)
+            if listing is not None and listing['mtime_ns'] == mtime_ns:
+                self.reused += 1
+            else:
+                try:
+                    listing = self.list_directory(path, key, mtime_ns)
+                except OSError:
+                    continue
+
+            for name, (size, file_mtime_ns) in listing['files'].items():
+                yield path / name, size, file_mtime_ns
+            for name in reversed(listing['dirs']):
+                stack.append(f"{key}/{name}" if key else name)
+
+        # Forget directories that no longer exist
+        self.directories = {key: value for key, value in self.directories.items() if key in seen}
+        self.save()
+
+    def paths(self):
+        """Matching paths, in scan order"""
+        return [path for path, _, _ in self.scan()]
+
+    def summary(self):
+        return f"File index: {self.listed} directories listed, {self.reused} reused"
+
+
+def project_pruned_paths(project_root, root):
+    """PLATFORM_DIRS when scanning from the project root itself, else nothing"""
+    return PLATFORM_DIRS if Path(root).resolve() == Path(project_root).resolve() else set()
+
+
+def find_files(root, extensions, pruned_dirs=None, index_path=None, pruned_paths=None):
+    """Convenience wrapper: matching paths under root in deterministic order"""
+    return FileIndex(root, extensions, pruned_dirs, index_path, pruned_paths).paths()
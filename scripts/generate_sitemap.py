@@ -1,23 +1,234 @@
 #!/usr/bin/env python3
 """
 Generate dynamic sitemap.xml for TripBasket
-- Fetches trips from Firebase
+- Reads trips and agencies from local Firestore exports or trip CSVs (offline)
 - Creates SEO-optimized URLs
 - Includes priority and change frequency
+- Streams <url> entries to disk, sharding at the 50,000 URL / 50 MB protocol limits
+- Incremental mode rewrites only shards whose entries changed
 """
 
+import os
+import re
+import gzip
 import json
-import xml.etree.ElementTree as ET
+import hashlib
+import argparse
 from datetime import datetime, timezone
 from pathlib import Path
+from xml.sax.saxutils import escape
 
-def generate_sitemap():
-    # Create sitemap root
-    urlset = ET.Element('urlset', xmlns="http://www.sitemaps.org/schemas/sitemap/0.9")
-    
-    base_url = "https://tripbasket-sctkxj.web.app"
-    
-    # Static pages with priorities
+from sitemap_sources import iter_sitemap_records
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+# Sitemap protocol limits per file (size is measured uncompressed)
+MAX_URLS_PER_SITEMAP = 50000
+MAX_BYTES_PER_SITEMAP = 50 * 1024 * 1024
+
+BASE_URL = "https://tripbasket-sctkxj.web.app"
+DEFAULT_OUTPUT_DIR = Path(__file__).parent.parent / 'build' / 'web'
+
+STATE_VERSION = 1
+STATE_FILENAME = '.sitemap-state.json'  # dotfiles are ignored by Firebase Hosting deploys
+
+def today():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+def page_digest(loc, changefreq, priority):
+    """Digest of the entry fields a page's lastmod is derived from"""
+    return hashlib.sha256(f"{loc}\n{changefreq}\n{priority}".encode('utf-8')).hexdigest()[:16]
+
+def load_state(output_dir):
+    """Previous run's page and shard digests, or an empty state"""
+    state_path = Path(output_dir) / STATE_FILENAME
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            return state
+    except (OSError, ValueError):
+        pass
+    return {'version': STATE_VERSION, 'pages': {}, 'shards': {}}
+
+def save_state(output_dir, state):
+    state_path = Path(output_dir) / STATE_FILENAME
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+def write_if_changed(path, data):
+    """Write bytes unless the file already holds exactly them; returns True if written"""
+    path = Path(path)
+    if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return False
+    path.write_bytes(data)
+    return True
+
+class SitemapWriter:
+    """
+    Writes <url> entries incrementally, rolling over to a new shard whenever
+    the next entry would exceed the URL or byte limit. A single shard is
+    named sitemap.xml; multiple shards are named sitemap-1.xml, sitemap-2.xml, ...
+
+    Entries without a lastmod (static pages) get today's date. With a previous
+    state (incremental mode) they keep their prior lastmod while their digest is
+    unchanged, and shards whose content digest matches the previous run are left
+    untouched on disk so their bytes and mtime stay the same.
+    """
+
+    def __init__(self, output_dir, compress=False,
+                 max_urls=MAX_URLS_PER_SITEMAP, max_bytes=MAX_BYTES_PER_SITEMAP, state=None):
+        self.output_dir = Path(output_dir)
+        self.compress = compress
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.extension = '.xml.gz' if compress else '.xml'
+        self.previous_state = state
+        self.default_lastmod = today()
+
+        self.header = (XML_DECLARATION + f'<urlset xmlns="{SITEMAP_NS}">\n').encode('utf-8')
+        self.footer = '</urlset>\n'.encode('utf-8')
+
+        # Closed shards: {'path', 'urls', 'lastmod', 'digest', 'changed'}
+        self.shards = []
+        self.total_urls = 0
+        # Derived lastmods for pages without one of their own, saved for the next run
+        self.pages = {}
+        self._file = None
+        self._shard = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def shard_path(self, number):
+        return self.output_dir / f"sitemap-{number}{self.extension}"
+
+    def _open_shard(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Shards are staged next to their final name and only moved into
+        # place on close, once it's known whether their content changed
+        path = self.shard_path(len(self.shards) + 1).with_suffix('.tmp')
+        if self.compress:
+            # mtime=0 keeps the gzip header, and so the file, deterministic
+            self._file = gzip.GzipFile(path, 'wb', mtime=0)
+        else:
+            self._file = open(path, 'wb')
+        self._shard = {
+            'temp_path': path,
+            'urls': 0,
+            'bytes': len(self.header) + len(self.footer),
+            'lastmod': None,
+            'hash': hashlib.sha256(),
+        }
+        self._write(self.header)
+
+    def _write(self, data):
+        self._file.write(data)
+        self._shard['hash'].update(data)
+
+    def _close_shard(self):
+        self._write(self.footer)
+        self._file.close()
+        self._file = None
+        shard = self._shard
+        shard['digest'] = shard.pop('hash').hexdigest()
+        del shard['bytes']
+        self.shards.append(shard)
+        self._shard = None
+
+    def resolve_lastmod(self, loc, changefreq, priority):
+        """Prior lastmod for an unchanged page in incremental mode, else today"""
+        digest = page_digest(loc, changefreq, priority)
+        previous = (self.previous_state or {}).get('pages', {}).get(loc)
+        lastmod = previous['lastmod'] if previous and previous['digest'] == digest else self.default_lastmod
+        self.pages[loc] = {'digest': digest, 'lastmod': lastmod}
+        return lastmod
+
+    def add(self, loc, lastmod=None, changefreq=None, priority=None):
+        """Append one <url> entry, starting a new shard at the protocol limits"""
+        if not lastmod:
+            lastmod = self.resolve_lastmod(loc, changefreq, priority)
+
+        entry = f"  <url>\n    <loc>{escape(loc)}</loc>\n"
+        entry += f"    <lastmod>{escape(lastmod)}</lastmod>\n"
+        if changefreq:
+            entry += f"    <changefreq>{escape(changefreq)}</changefreq>\n"
+        if priority:
+            entry += f"    <priority>{escape(priority)}</priority>\n"
+        entry += "  </url>\n"
+        data = entry.encode('utf-8')
+
+        if self._shard is not None and (self._shard['urls'] >= self.max_urls
+                                        or self._shard['bytes'] + len(data) > self.max_bytes):
+            self._close_shard()
+        if self._shard is None:
+            self._open_shard()
+
+        self._write(data)
+        self._shard['urls'] += 1
+        self._shard['bytes'] += len(data)
+        if self._shard['lastmod'] is None or lastmod > self._shard['lastmod']:
+            self._shard['lastmod'] = lastmod
+        self.total_urls += 1
+
+    def add_all(self, entries):
+        """Stream an iterable of url dicts (loc, lastmod, changefreq, priority)"""
+        for entry in entries:
+            self.add(entry['loc'], entry.get('lastmod'), entry.get('changefreq'), entry.get('priority'))
+
+    def close(self):
+        """Finish the current shard and move changed shards into place"""
+        if self._shard is None and not self.shards:
+            # No URLs at all: still emit a valid, empty sitemap
+            self._open_shard()
+        if self._shard is not None:
+            self._close_shard()
+
+        previous_shards = (self.previous_state or {}).get('shards', {})
+        for number, shard in enumerate(self.shards, start=1):
+            # A lone shard is published as sitemap.xml
+            if len(self.shards) == 1:
+                shard['path'] = self.output_dir / f"sitemap{self.extension}"
+            else:
+                shard['path'] = self.shard_path(number)
+
+            temp_path = shard.pop('temp_path')
+            previous = previous_shards.get(shard['path'].name)
+            if previous and previous['digest'] == shard['digest'] and shard['path'].exists():
+                temp_path.unlink()
+                shard['changed'] = False
+            else:
+                os.replace(temp_path, shard['path'])
+                shard['changed'] = True
+
+        self.remove_stale_shards()
+        return self.shards
+
+    def state(self):
+        """State to persist for the next incremental run"""
+        return {
+            'version': STATE_VERSION,
+            'pages': self.pages,
+            'shards': {
+                shard['path'].name: {'digest': shard['digest'], 'urls': shard['urls'], 'lastmod': shard['lastmod']}
+                for shard in self.shards
+            },
+        }
+
+    def remove_stale_shards(self):
+        """Delete shards left over from a previous, larger (or differently compressed) run"""
+        current = {shard['path'].name for shard in self.shards}
+        pattern = re.compile(r'^sitemap(-\d+)?\.xml(\.gz)?$')
+        for path in self.output_dir.iterdir():
+            if pattern.match(path.name) and path.name not in current:
+                path.unlink()
+
+def static_page_entries(base_url):
+    """Static pages with priorities"""
     static_pages = [
         {'path': '/', 'priority': '1.0', 'changefreq': 'daily'},
         {'path': '/home', 'priority': '1.0', 'changefreq': 'daily'},
@@ -29,76 +240,125 @@ def generate_sitemap():
         {'path': '/privacy', 'priority': '0.5', 'changefreq': 'yearly'},
         {'path': '/terms', 'priority': '0.5', 'changefreq': 'yearly'},
     ]
-    
-    # Add static pages
+
+    # No lastmod: the writer derives it (today, or the previous run's date
+    # for unchanged pages in incremental mode)
     for page in static_pages:
-        url = ET.SubElement(urlset, 'url')
-        ET.SubElement(url, 'loc').text = f"{base_url}{page['path']}"
-        ET.SubElement(url, 'lastmod').text = datetime.now(timezone.utc).strftime('%Y-%m-%d')
-        ET.SubElement(url, 'changefreq').text = page['changefreq']
-        ET.SubElement(url, 'priority').text = page['priority']
-    
-    # Note: In a real implementation, you would fetch trips from Firebase
-    # For now, we'll add some example trip URLs
+        yield {
+            'loc': f"{base_url}{page['path']}",
+            'changefreq': page['changefreq'],
+            'priority': page['priority'],
+        }
+
+def trip_entries(base_url, trips):
+    """Trip detail pages"""
+    for trip in trips:
+        yield {
+            'loc': f"{base_url}/trips/{trip['id']}",
+            'lastmod': trip['lastmod'],
+            'changefreq': 'weekly',
+            'priority': '0.8',
+        }
+
+def agency_entries(base_url, agencies):
+    """Agency profile pages"""
+    for agency in agencies:
+        yield {
+            'loc': f"{base_url}/agencies/{agency['id']}",
+            'lastmod': agency['lastmod'],
+            'changefreq': 'monthly',
+            'priority': '0.7',
+        }
+
+def record_entries(base_url, records):
+    """Trip and agency pages for records streamed from sitemap_sources"""
+    for record in records:
+        item = {'id': record['slug'], 'lastmod': record['lastmod']}
+        if record['kind'] == 'trip':
+            yield from trip_entries(base_url, [item])
+        else:
+            yield from agency_entries(base_url, [item])
+
+def generate_sitemap(output_dir=DEFAULT_OUTPUT_DIR, base_url=BASE_URL, compress=False,
+                     max_urls=MAX_URLS_PER_SITEMAP, sources=None, incremental=False):
+    """
+    Write the sitemap shards and index. sources is a list of local Firestore
+    export (.json/.ndjson) or trip CSV files; without it, example URLs are used.
+    incremental keeps unchanged pages' lastmod and unchanged files untouched.
+    """
+    # Example trip URLs used when no export/CSV source is given
     example_trips = [
         {'id': 'egypt-dahab-adventure', 'title': 'Egypt Dahab Adventure', 'lastmod': '2024-01-15'},
         {'id': 'cairo-cultural-tour', 'title': 'Cairo Cultural Tour', 'lastmod': '2024-01-10'},
         {'id': 'red-sea-diving', 'title': 'Red Sea Diving Experience', 'lastmod': '2024-01-12'},
     ]
-    
-    # Add trip pages
-    for trip in example_trips:
-        url = ET.SubElement(urlset, 'url')
-        ET.SubElement(url, 'loc').text = f"{base_url}/trips/{trip['id']}"
-        ET.SubElement(url, 'lastmod').text = trip['lastmod']
-        ET.SubElement(url, 'changefreq').text = 'weekly'
-        ET.SubElement(url, 'priority').text = '0.8'
-    
+
     # Add agency pages
     example_agencies = [
         {'id': 'desert-adventures', 'name': 'Desert Adventures', 'lastmod': '2024-01-08'},
         {'id': 'nile-explorers', 'name': 'Nile Explorers', 'lastmod': '2024-01-05'},
     ]
-    
-    for agency in example_agencies:
-        url = ET.SubElement(urlset, 'url')
-        ET.SubElement(url, 'loc').text = f"{base_url}/agencies/{agency['id']}"
-        ET.SubElement(url, 'lastmod').text = agency['lastmod']
-        ET.SubElement(url, 'changefreq').text = 'monthly'
-        ET.SubElement(url, 'priority').text = '0.7'
-    
-    # Pretty print XML
-    ET.indent(urlset, space="  ", level=0)
-    tree = ET.ElementTree(urlset)
-    
-    # Save sitemap
-    sitemap_path = Path(__file__).parent.parent / 'build' / 'web' / 'sitemap.xml'
-    sitemap_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    tree.write(sitemap_path, encoding='utf-8', xml_declaration=True)
-    
-    print(f"Sitemap generated: {sitemap_path}")
-    print(f"Total URLs: {len(urlset)}")
-    
-    # Generate sitemap index if needed
-    generate_sitemap_index(base_url)
-
-def generate_sitemap_index(base_url):
+
+    # Entries are streamed straight to disk, so memory stays constant
+    # regardless of catalog size
+    state = load_state(output_dir) if incremental else None
+    with SitemapWriter(output_dir, compress=compress, max_urls=max_urls, state=state) as writer:
+        writer.add_all(static_page_entries(base_url))
+        if sources:
+            writer.add_all(record_entries(base_url, iter_sitemap_records(sources)))
+        else:
+            writer.add_all(trip_entries(base_url, example_trips))
+            writer.add_all(agency_entries(base_url, example_agencies))
+
+    for shard in writer.shards:
+        status = "generated" if shard['changed'] else "unchanged"
+        print(f"Sitemap {status}: {shard['path']} ({shard['urls']} URLs)")
+    print(f"Total URLs: {writer.total_urls}")
+
+    # Generate sitemap index listing every shard
+    generate_sitemap_index(base_url, writer.shards, output_dir)
+
+    if incremental:
+        save_state(output_dir, writer.state())
+
+    return writer.shards
+
+def generate_sitemap_index(base_url, shards, output_dir=DEFAULT_OUTPUT_DIR):
     """Generate sitemap index for multiple sitemaps"""
-    sitemapindex = ET.Element('sitemapindex', xmlns="http://www.sitemaps.org/schemas/sitemap/0.9")
-    
-    # Main sitemap
-    sitemap = ET.SubElement(sitemapindex, 'sitemap')
-    ET.SubElement(sitemap, 'loc').text = f"{base_url}/sitemap.xml"
-    ET.SubElement(sitemap, 'lastmod').text = datetime.now(timezone.utc).strftime('%Y-%m-%d')
-    
-    # Save sitemap index
-    index_path = Path(__file__).parent.parent / 'build' / 'web' / 'sitemap-index.xml'
-    ET.indent(sitemapindex, space="  ", level=0)
-    tree = ET.ElementTree(sitemapindex)
-    tree.write(index_path, encoding='utf-8', xml_declaration=True)
-    
-    print(f"Sitemap index generated: {index_path}")
+    index_path = Path(output_dir) / 'sitemap-index.xml'
+
+    lines = [XML_DECLARATION, f'<sitemapindex xmlns="{SITEMAP_NS}">\n']
+    for shard in shards:
+        lines.append("  <sitemap>\n")
+        lines.append(f"    <loc>{escape(base_url)}/{escape(shard['path'].name)}</loc>\n")
+        lines.append(f"    <lastmod>{escape(shard['lastmod'] or today())}</lastmod>\n")
+        lines.append("  </sitemap>\n")
+    lines.append("</sitemapindex>\n")
+
+    # Leave an identical index untouched so its mtime (and CDN copy) survive
+    if write_if_changed(index_path, ''.join(lines).encode('utf-8')):
+        print(f"Sitemap index generated: {index_path}")
+    else:
+        print(f"Sitemap index unchanged: {index_path}")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Generate TripBasket sitemaps')
+    parser.add_argument('--output-dir', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help='directory to write sitemaps into (default: build/web)')
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help=f'site origin used in <loc> entries (default: {BASE_URL})')
+    parser.add_argument('--gzip', action='store_true',
+                        help='write .xml.gz shards instead of plain .xml')
+    parser.add_argument('--max-urls', type=int, default=MAX_URLS_PER_SITEMAP,
+                        help=f'URLs per shard before rolling over (default: {MAX_URLS_PER_SITEMAP})')
+    parser.add_argument('--source', action='append', type=Path, default=[],
+                        help='Firestore export (.json/.ndjson) or trips CSV to read; repeatable')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'keep unchanged pages\' lastmod and unchanged files (state in {STATE_FILENAME})')
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    generate_sitemap()
\ No newline at end of file
+    args = parse_args()
+    generate_sitemap(args.output_dir, args.base_url, compress=args.gzip, max_urls=args.max_urls,
+                     sources=args.source, incremental=args.incremental)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Content-hashed filenames for the TripBasket image outputs
+- Names a variant <name>.<hash>.<ext> (first 10 hex digits of its SHA-256);
+  the asset pipeline records those URLs in image_manifest.json
+- After `flutter build web`, `python scripts/hashed_assets.py build/web` copies
+  each variant (with its .br/.zst/.gz sidecars) into build/web/images/optimized
+  under that name and removes copies no manifest entry refers to any more.
+  Nothing is written into the web/ source tree, and the app bundle
+  (pubspec.yaml) keeps only the logical files
+- The logical file stays in place for the build cache and for code that
+  builds names itself (ResponsiveImage, ImageOptimizationHelper)
+- A hashed URL never changes content, so it can be cached forever: the
+  firebase.json rules below mark it immutable and label the sidecars' encoding
+- Copies rather than hard links: encoders rewrite outputs in place, which
+  would change a linked copy's bytes under its hash
+"""
+
+import re
+import sys
+import json
+import shutil
+import argparse
+from pathlib import Path
+
+from build_cache import hash_file
+from precompress import ENCODINGS
+
+HASH_LENGTH = 10
+
+# Copies go into the web build at HASHED_DIR, served at HASHED_URL
+DEFAULT_BUILD_ROOT = Path('build') / 'web'
+HASHED_DIR = Path('images') / 'optimized'
+HASHED_URL = '/images/optimized/'
+
+IMAGE_MANIFEST = Path('assets') / 'images' / 'optimized' / 'image_manifest.json'
+
+HASHED_NAME = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<extension>\.[A-Za-z0-9]+)$' % HASH_LENGTH)
+
+HASHED_EXTENSIONS = ['webp', 'avif', 'jpg', 'jpeg', 'png']
+
+IMMUTABLE = 'public,max-age=31536000,immutable'
+
+
+def hashed_name(path):
+    """<name>.<hash>.<ext> for the current content of path"""
+    path = Path(path)
+    return f"{path.stem}.{hash_file(path)[:HASH_LENGTH]}{path.suffix}"
+
+
+def url_for(path):
+    """Site URL the content-hashed copy of path is served at"""
+    return HASHED_URL + hashed_name(path)
+
+
+def file_for(build_root, url):
+    """Published copy behind a site URL (inverse of url_for), or None for other URLs"""
+    if not url.startswith(HASHED_URL):
+        return None
+    return Path(build_root) / HASHED_DIR / url[len(HASHED_URL):]
+
+
+def is_hashed(path):
+    return HASHED_NAME.match(Path(path).name) is not None
+
+
+def superseded(path, current):
+    """Hashed copies (and their sidecars) of path next to current, other than current"""
+    path = Path(path)
+    stale = []
+    for candidate in current.parent.glob(f"{path.stem}.*"):
+        name = candidate.name
+        for suffix in ENCODINGS:
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+                break
+        match = HASHED_NAME.match(name)
+        if (match and match.group('stem') == path.stem and match.group('extension') == path.suffix
+                and name != current.name):
+            stale.append(candidate)
+    return sorted(stale)
+
+
+def publish(path, directory):
+    """
+    Copy path (and its sidecars) into directory under its content-hashed
+    name, removing copies made for earlier content. Returns the hashed path.
+    """
+    path = Path(path)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / hashed_name(path)
+    for stale in superseded(path, target):
+        stale.unlink()
+    if not target.exists():
+        shutil.copyfile(path, target)
+    for suffix in ENCODINGS:
+        sidecar = path.with_name(path.name + suffix)
+        hashed_sidecar = target.with_name(target.name + suffix)
+        if sidecar.exists():
+            if not hashed_sidecar.exists():
+                shutil.copyfile(sidecar, hashed_sidecar)
+        elif hashed_sidecar.exists():
+            hashed_sidecar.unlink()
+    return target
+
+
+def cache_header_rules():
+    """
+    firebase.json "headers" entries making the hashed image URLs
+    (/images/optimized/...) immutable, and serving their sidecars with the
+    Content-Encoding of their suffix
+    """
+    hashed = '*.' + '[0-9a-f]' * HASH_LENGTH
+    extensions = '|'.join(HASHED_EXTENSIONS)
+    rules = [{
+        'source': f"**/images/optimized/{hashed}.@({extensions})",
+        'headers': [
+            {'key': 'Cache-Control', 'value': IMMUTABLE},
+        ],
+    }]
+    for suffix, encoding in ENCODINGS.items():
+        rules.append({
+            'source': f"**/images/optimized/{hashed}.@({extensions}){suffix}",
+            'headers': [
+                {'key': 'Content-Encoding', 'value': encoding},
+                {'key': 'Cache-Control', 'value': IMMUTABLE},
+                {'key': 'Vary', 'value': 'Accept-Encoding'},
+            ],
+        })
+    return rules
+
+
+def missing_header_rules(project_root):
+    """cache_header_rules() entries whose source pattern is not in firebase.json"""
+    try:
+        with open(Path(project_root) / 'firebase.json', 'r', encoding='utf-8') as f:
+            hosting = json.load(f).get('hosting', {})
+    except (OSError, ValueError):
+        return cache_header_rules()
+    if isinstance(hosting, list):
+        hosting = hosting[0] if hosting else {}
+    sources = {rule.get('source') for rule in hosting.get('headers', [])}
+    return [rule for rule in cache_header_rules() if rule['source'] not in sources]
+
+
+def publish_manifest(project_root, build_root):
+    """
+    Publish the hashed copies image_manifest.json refers to into build_root
+    and remove the other copies there. Returns (published, removed, stale),
+    stale being variants that changed since the manifest was written.
+    """
+    project_root = Path(project_root)
+    directory = Path(build_root) / HASHED_DIR
+    with open(project_root / IMAGE_MANIFEST, 'r') as f:
+        manifest = json.load(f)
+
+    copies = set()
+    published = set()
+    stale = []
+    for entry in manifest.values():
+        for logical, url in entry.get('hashed', {}).items():
+            path = project_root / 'assets' / 'images' / logical
+            if not path.exists():
+                path = project_root / logical
+            if not path.exists() or url_for(path) != url:
+                stale.append(logical)
+                continue
+            target = publish(path, directory)
+            copies.add(target.name)
+            published.add(target.name)
+            published.update(target.name + suffix for suffix in ENCODINGS)
+
+    # Copies for deleted sources and old content
+    removed = []
+    if directory.exists():
+        for candidate in sorted(directory.iterdir()):
+            name = candidate.name
+            for suffix in ENCODINGS:
+                if name.endswith(suffix):
+                    name = name[:-len(suffix)]
+                    break
+            if HASHED_NAME.match(name) and candidate.name not in published:
+                candidate.unlink()
+                removed.append(candidate)
+    return len(copies), removed, stale
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Publish content-hashed image copies into the web build')
+    parser.add_argument('root', nargs='?', type=Path, default=None,
+                        help=f'web build directory (default: {DEFAULT_BUILD_ROOT})')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    project_root = Path(__file__).parent.parent
+    build_root = args.root or project_root / DEFAULT_BUILD_ROOT
+    if not build_root.is_dir():
+        print(f"❌ Directory not found: {build_root} (run 'flutter build web' first)")
+        sys.exit(1)
+    if not (project_root / IMAGE_MANIFEST).exists():
+        print(f"❌ {IMAGE_MANIFEST} not found (run optimize_web_images.py --hashed-names first)")
+        sys.exit(1)
+
+    published, removed, stale = publish_manifest(project_root, build_root)
+    print(f"Published {published} hashed files into {build_root / HASHED_DIR} ({len(removed)} old copies removed)")
+    if stale:
+        print(f"Warning: {len(stale)} variants changed since image_manifest.json was written; "
+              "re-run the asset pipeline with --hashed-names")
+    missing = missing_header_rules(project_root)
+    if missing:
+        print("Warning: firebase.json does not mark hashed images immutable; add to hosting.headers:")
+        print(json.dumps(missing, indent=2))
+
+
+if __name__ == "__main__":
+    main()
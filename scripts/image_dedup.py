@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Duplicate detection for the TripBasket image sources
+- Exact fingerprint: SHA-256 of the file (byte-identical copies)
+- Perceptual fingerprints: 64-bit dHash (gradient) and pHash (DCT), computed
+  with NumPy from a small greyscale thumbnail
+- Near-duplicates need both hashes within max_distance bits and the same
+  aspect ratio, so re-encodes, resaves and rescales match but crops do not
+- Fingerprints are kept in .dart_tool/dedup_index.json and only recomputed
+  when a file's size or mtime changes
+"""
+
+import os
+import json
+from pathlib import Path
+
+from PIL import Image
+
+from build_cache import hash_file
+from image_modes import normalize
+from memory_budget import apply_draft
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INDEX_VERSION = 1
+INDEX_FILENAME = 'dedup_index.json'
+
+# Bits (out of 64) two perceptual hashes may differ by and still be near-duplicates
+DEFAULT_MAX_DISTANCE = 6
+
+# Relative aspect ratio difference allowed between near-duplicates
+ASPECT_TOLERANCE = 0.02
+
+# Side of the greyscale thumbnail the DCT is taken over; pHash keeps its 8x8 lowest frequencies
+PHASH_SAMPLE = 32
+HASH_SIDE = 8
+
+# Rows of the pairwise distance matrix computed at once (bounds memory on large trees)
+DISTANCE_BLOCK = 256
+
+
+def default_index_path(project_root):
+    """Index location; .dart_tool is a tool cache that is never scanned or bundled"""
+    return Path(project_root) / '.dart_tool' / INDEX_FILENAME
+
+
+def _bits_to_hex(bits):
+    return numpy.packbits(bits.flatten()).tobytes().hex()
+
+
+def _dct_matrix(size):
+    """Orthonormal DCT-II basis; matrix @ block @ matrix.T is the 2-D DCT"""
+    k = numpy.arange(size)[:, None]
+    n = numpy.arange(size)[None, :]
+    matrix = numpy.cos(numpy.pi * (2 * n + 1) * k / (2 * size)) * numpy.sqrt(2 / size)
+    matrix[0] /= numpy.sqrt(2)
+    return matrix
+
+
+def dhash(gray):
+    """Difference hash: whether each pixel of a 9x8 thumbnail is brighter than its left neighbour"""
+    pixels = numpy.asarray(gray.resize((HASH_SIDE + 1, HASH_SIDE), Image.Resampling.LANCZOS), dtype=numpy.int16)
+    return _bits_to_hex(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(gray):
+    """DCT hash: whether each of the 8x8 lowest frequencies is above their median (DC excluded)"""
+    pixels = numpy.asarray(gray.resize((PHASH_SAMPLE, PHASH_SAMPLE), Image.Resampling.LANCZOS),
+                           dtype=numpy.float64)
+    basis = _dct_matrix(PHASH_SAMPLE)
+    low = (basis @ pixels @ basis.T)[:HASH_SIDE, :HASH_SIDE]
+    return _bits_to_hex(low > numpy.median(low.flatten()[1:]))
+
+
+def fingerprint(path):
+    """{'sha256', 'dhash', 'phash', 'width', 'height'} for an image file"""
+    with Image.open(path) as img:
+        width, height = img.size
+        # JPEGs are decoded at 1/8 scale where that still covers the thumbnail
+        apply_draft(img, (PHASH_SAMPLE * 2, PHASH_SAMPLE * 2))
+        gray = normalize(img).convert('L')
+    return {'sha256': hash_file(path), 'dhash': dhash(gray), 'phash': phash(gray),
+            'width': width, 'height': height}
+
+
+def hamming_matrix(hashes):
+    """Pairwise bit distances between 64-bit hex hashes, as an n x n array"""
+    values = numpy.array([int(value, 16) for value in hashes], dtype=numpy.uint64)
+    popcount = numpy.array([bin(byte).count('1') for byte in range(256)], dtype=numpy.uint8)
+    distances = numpy.empty((len(values), len(values)), dtype=numpy.uint8)
+    for start in range(0, len(values), DISTANCE_BLOCK):
+        xor = values[start:start + DISTANCE_BLOCK, None] ^ values[None, :]
+        distances[start:start + DISTANCE_BLOCK] = popcount[xor.view(numpy.uint8)].reshape(
+            xor.shape + (8,)).sum(axis=2)
+    return distances
+
+
+class DedupIndex:
+    """
+    Fingerprints sources and groups exact and near-duplicate ones. Each group
+    has one canonical source (most pixels, then largest file, then path) that
+    is encoded; the others become aliases of it.
+    """
+
+    def __init__(self, project_root, max_distance=DEFAULT_MAX_DISTANCE, use_cache=True):
+        if numpy is None:
+            raise RuntimeError("duplicate detection needs NumPy (pip install numpy)")
+        self.project_root = Path(project_root)
+        self.max_distance = max_distance
+        self.index_path = default_index_path(self.project_root) if use_cache else None
+        self.entries = {}
+        self.fingerprinted = 0
+        self.reused = 0
+        self.load()
+
+    def load(self):
+        if self.index_path is None or not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        if self.index_path is None:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'entries': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.index_path)
+
+    def _key(self, path):
+        try:
+            return Path(path).resolve().relative_to(self.project_root.resolve()).as_posix()
+        except ValueError:
+            return Path(path).resolve().as_posix()
+
+    def _path(self, key):
+        return self.project_root / key
+
+    def update(self, paths, prune=False):
+        """
+        Fingerprint paths whose size or mtime changed. With prune (a full
+        scan), entries for paths not listed are dropped.
+        """
+        keys = set()
+        for path in paths:
+            key = self._key(path)
+            keys.add(key)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.entries.pop(key, None)
+                continue
+            entry = self.entries.get(key)
+            if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                self.reused += 1
+                continue
+            try:
+                self.entries[key] = dict(fingerprint(path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                self.fingerprinted += 1
+            except OSError as e:
+                print(f"   Warning: cannot fingerprint {path}: {e}")
+                self.entries.pop(key, None)
+
+        if prune:
+            self.entries = {key: entry for key, entry in self.entries.items() if key in keys}
+
+    def forget(self, path):
+        """Drop a deleted source; returns the other members of its former group"""
+        key = self._key(path)
+        members = self.members(path)
+        self.entries.pop(key, None)
+        return members
+
+    def members(self, path):
+        """Other sources in the group path was placed in by the last groups() call"""
+        key = self._key(path)
+        group = self.entries.get(key, {}).get('group')
+        if group is None:
+            return []
+        return [self._path(other) for other, entry in sorted(self.entries.items())
+                if entry.get('group') == group and other != key]
+
+    def groups(self):
+        """
+        Group the indexed sources. Returns [{'canonical': path, 'aliases':
+        [(path, 'exact' | 'near', distance)]}], and records each member's
+        group in the index for members().
+        """
+        keys = sorted(self.entries)
+        parent = list(range(len(keys)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        # Exact duplicates
+        first_by_hash = {}
+        for i, key in enumerate(keys):
+            union(i, first_by_hash.setdefault(self.entries[key]['sha256'], i))
+
+        # Near-duplicates, between one representative per exact group
+        representatives = sorted(set(first_by_hash.values()))
+        distance = None
+        if len(representatives) > 1:
+            entries = [self.entries[keys[i]] for i in representatives]
+            distance = numpy.maximum(hamming_matrix([entry['dhash'] for entry in entries]),
+                                     hamming_matrix([entry['phash'] for entry in entries]))
+            aspects = numpy.array([entry['width'] / entry['height'] for entry in entries])
+            similar_aspect = numpy.abs(aspects[:, None] / aspects[None, :] - 1) <= ASPECT_TOLERANCE
+            close = numpy.triu((distance <= self.max_distance) & similar_aspect, k=1)
+            for a, b in zip(*numpy.nonzero(close)):
+                union(representatives[a], representatives[b])
+        position = {index: n for n, index in enumerate(representatives)}
+
+        members = {}
+        for i in range(len(keys)):
+            members.setdefault(find(i), []).append(i)
+
+        groups = []
+        for key in keys:
+            self.entries[key].pop('group', None)
+        for indexes in members.values():
+            if len(indexes) < 2:
+                continue
+            ranked = sorted(indexes, key=lambda i: (-self.entries[keys[i]]['width'] * self.entries[keys[i]]['height'],
+                                                    -self.entries[keys[i]]['size'], keys[i]))
+            canonical = ranked[0]
+            canonical_entry = self.entries[keys[canonical]]
+            aliases = []
+            for i in ranked[1:]:
+                entry = self.entries[keys[i]]
+                if entry['sha256'] == canonical_entry['sha256']:
+                    aliases.append((self._path(keys[i]), 'exact', 0))
+                else:
+                    a = position[first_by_hash[entry['sha256']]]
+                    b = position[first_by_hash[canonical_entry['sha256']]]
+                    aliases.append((self._path(keys[i]), 'near', int(distance[a, b])))
+            for i in indexes:
+                self.entries[keys[i]]['group'] = keys[canonical]
+            groups.append({'canonical': self._path(keys[canonical]), 'aliases': aliases})
+        return sorted(groups, key=lambda group: group['canonical'])
+
+    def summary(self, groups):
+        exact = sum(1 for group in groups for _, match, _ in group['aliases'] if match == 'exact')
+        near = sum(1 for group in groups for _, match, _ in group['aliases'] if match == 'near')
+        return (f"Dedup: {exact} exact and {near} near duplicates in {len(groups)} groups "
+                f"({self.fingerprinted} fingerprinted, {self.reused} reused)")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Multi-format encoding for the TripBasket image scripts
+- Encodes a variant as AVIF, WebP and JPEG in memory
+- Finds, per format, the lowest quality up to the variant type's fixed quality
+  that still meets a perceptual target
+- Chooses formats per image: the most compatible format is the fallback, and a
+  more modern format is kept only if it is smaller at the target, or at an
+  equal or better score, at every width
+"""
+
+import io
+import math
+
+from PIL import Image, ImageChops, ImageStat, features
+
+import image_modes
+
+# Format name -> Pillow encoder, file extension, MIME type and fixed save options.
+# WebP uses its slowest, smallest method; AVIF keeps libavif's default speed,
+# since each search runs several encodes and slower speeds cost ~4x for ~5% bytes.
+FORMATS = {
+    'avif': {'encoder': 'AVIF', 'extension': '.avif', 'mime': 'image/avif', 'options': {'speed': 6}},
+    'webp': {'encoder': 'WEBP', 'extension': '.webp', 'mime': 'image/webp', 'options': {'method': 6}},
+    'jpeg': {'encoder': 'JPEG', 'extension': '.jpg', 'mime': 'image/jpeg',
+             'options': {'optimize': True, 'progressive': True}},
+}
+
+# Most modern first; the last format in a list is the fallback that is always kept
+DEFAULT_FORMATS = ['avif', 'webp', 'jpeg']
+
+# Default perceptual target: PSNR against the resized (pre-encode) variant, in dB.
+# The per-type WebP qualities (35/55/65) reach 32-42 dB on the bundled photos
+# and about 35 on the larger variants, which carry most of the bytes
+DEFAULT_QUALITY_TARGET = 35.0
+
+# PSNR differences (dB) within this count as an equal score when a modern
+# format that misses the target is compared with the next kept format
+SCORE_TOLERANCE = 0.25
+
+# Qualities searched per format, lowest first
+QUALITY_GRID = list(range(30, 95, 5))
+
+
+def capped_grid(max_quality, grid=QUALITY_GRID):
+    """grid up to max_quality, which is always included (None = the whole grid)"""
+    if max_quality is None:
+        return list(grid)
+    return [quality for quality in grid if quality < max_quality] + [max_quality]
+
+
+def supported_formats(formats=None):
+    """Requested formats this Pillow build can encode, in the given order"""
+    available = {
+        'avif': features.check('avif') if 'avif' in features.modules else False,
+        'webp': features.check('webp'),
+        'jpeg': True,
+    }
+    return [name for name in (formats or DEFAULT_FORMATS) if available.get(name)]
+
+
+def psnr(image, reference):
+    """Peak signal-to-noise ratio in dB between two images of the same size (compared flattened)"""
+    diff = ImageChops.difference(image_modes.normalize(image), image_modes.normalize(reference))
+    sum2 = ImageStat.Stat(diff).sum2
+    mse = sum(sum2) / (len(sum2) * image.width * image.height)
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 ** 2 / mse)
+
+
+def encode(img, format_name, quality):
+    """Encode an image in memory and return the bytes"""
+    spec = FORMATS[format_name]
+    buffer = io.BytesIO()
+    img.save(buffer, spec['encoder'], quality=quality, **spec['options'])
+    return buffer.getvalue()
+
+
+def score(img, data):
+    """Perceptual score of encoded bytes against the image they were encoded from"""
+    with Image.open(io.BytesIO(data)) as decoded:
+        return psnr(decoded, img)
+
+
+def search_quality(encode_at, scorer, target, grid=QUALITY_GRID):
+    """
+    Bisect the quality grid for the lowest quality whose encode scores at
+    least target. encode_at(quality) returns bytes and scorer(bytes) a score
+    (higher is better). Returns {'quality', 'score', 'data', 'meets_target'};
+    when no quality meets the target the highest-quality attempt is returned.
+    """
+    best = None
+    highest = None
+    lo, hi = 0, len(grid) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        data = encode_at(grid[mid])
+        attempt = {'quality': grid[mid], 'score': scorer(data), 'data': data}
+        if highest is None or attempt['quality'] > highest['quality']:
+            highest = attempt
+        if attempt['score'] >= target:
+            best = attempt
+            hi = mid - 1
+        else:
+            lo = mid + 1
+
+    result = best or highest
+    result['meets_target'] = best is not None
+    return result
+
+
+def encode_at_target(img, format_name, target, grid=QUALITY_GRID):
+    """search_quality for one format scored by PSNR; the result also carries 'format'"""
+    img = image_modes.normalize_for(img, format_name)
+    result = search_quality(lambda quality: encode(img, format_name, quality),
+                            lambda data: score(img, data), target, grid)
+    result['format'] = format_name
+    return result
+
+
+def encode_formats(img, formats=None, target=DEFAULT_QUALITY_TARGET, max_quality=None):
+    """encode_at_target for every supported format, searching no higher than max_quality: {format: encode}"""
+    grid = capped_grid(max_quality)
+    return {name: encode_at_target(img, name, target, grid) for name in supported_formats(formats)}
+
+
+def worth_keeping(candidate, kept):
+    """
+    Whether a more modern encode is worth serving next to a more compatible
+    kept one: smaller, and either meeting the target or scoring at least as
+    well (within SCORE_TOLERANCE)
+    """
+    return (len(candidate['data']) < len(kept['data'])
+            and (candidate['meets_target'] or candidate['score'] >= kept['score'] - SCORE_TOLERANCE))
+
+
+def select_formats(encoded_variants, formats=None):
+    """
+    Formats to keep for one image, most modern first, from the encode_formats()
+    result of each of its variants. The fallback (last format) is always kept;
+    a more modern format is kept only if it is worth keeping over the next kept
+    format at every variant, so each kept format covers every width.
+    """
+    formats = supported_formats(formats)
+    kept = [formats[-1]]
+    for name in reversed(formats[:-1]):
+        if all(worth_keeping(encodes[name], encodes[kept[0]]) for encodes in encoded_variants):
+            kept.insert(0, name)
+    return kept
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Shared colour-mode handling for the TripBasket image scripts
+- Normalizes any Pillow mode to RGB, or RGBA when the target format keeps
+  transparency (WebP, AVIF, PNG) and the image actually uses it
+- Flattens alpha in one pass: RGBA and LA images are pasted onto the
+  background using themselves as the mask, with no RGBA copy first; palette
+  images are flattened by blending the palette rather than the pixels
+- Handles palette transparency (P/PA), 16-bit and float greyscale (I;16, I, F),
+  CMYK and YCbCr sources
+"""
+
+from PIL import Image
+
+# Encoders that store an alpha channel
+ALPHA_FORMATS = {'webp', 'avif', 'png'}
+
+# Transparent pixels are flattened onto white, as the scripts always did
+DEFAULT_BACKGROUND = (255, 255, 255)
+
+# Bumped when normalize() output changes, so build cache entries are invalidated
+MODE_HANDLING_VERSION = 1
+
+
+def supports_alpha(format_name):
+    """Whether an encoder (e.g. 'webp', 'JPEG') can store transparency"""
+    return format_name.lower() in ALPHA_FORMATS
+
+
+def has_alpha(img):
+    """Whether an image carries transparency, including palette transparency"""
+    return img.mode in ('RGBA', 'RGBa', 'LA', 'PA') or (
+        img.mode in ('P', 'L', 'RGB') and 'transparency' in img.info)
+
+
+def to_8bit(img):
+    """
+    Map 16-bit and 32-bit greyscale modes to L. convert('L') clips values
+    above 255, which turns 16-bit PNGs white; values are rescaled instead.
+    """
+    if img.mode.startswith('I;16'):
+        img = img.convert('I')
+    if img.mode in ('I', 'F'):
+        low, high = img.getextrema()
+        if high > 255 or low < 0:
+            top = 65535 if high > 255 and img.mode == 'I' else high
+            scale = 255 / top if top > 0 else 1
+            img = img.point(lambda value: value * scale)
+        img = img.convert('L')
+    return img
+
+
+def _flatten_palette(img, background):
+    """
+    Flatten a transparent P image by blending its palette (at most 256
+    entries) onto the background, so only the final RGB image is allocated
+    """
+    swatch = Image.new('P', (256, 1))
+    swatch.putpalette(img.getpalette())
+    swatch.putdata(range(256))
+    swatch.info['transparency'] = img.info['transparency']
+    palette = flatten(swatch.convert('RGBA'), background)
+
+    img = img.copy()
+    img.putpalette(palette.tobytes())
+    del img.info['transparency']
+    return img.convert('RGB')
+
+
+def flatten(img, background=DEFAULT_BACKGROUND):
+    """
+    Composite a transparent image onto a solid background and return RGB.
+    RGBA and LA are pasted straight onto the canvas, using themselves as
+    the mask; palette images blend their palette instead of their pixels.
+    """
+    if img.mode == 'P' and img.palette.mode == 'RGB' and 'transparency' in img.info:
+        return _flatten_palette(img, background)
+    if img.mode not in ('RGBA', 'LA'):
+        # PA, RGBa and colour-keyed L/RGB
+        img = img.convert('RGBA')
+    if img.getextrema()[-1][0] == 255:
+        return img.convert('RGB')
+    canvas = Image.new('RGB', img.size, background)
+    canvas.paste(img, (0, 0), img)
+    return canvas
+
+
+def normalize(img, keep_alpha=False, background=DEFAULT_BACKGROUND):
+    """
+    Return img as RGB, or as RGBA if keep_alpha and it has any
+    non-opaque pixel. Fully opaque alpha channels are dropped.
+    """
+    img = to_8bit(img)
+
+    if has_alpha(img) and not keep_alpha:
+        # Flattened from its own mode, without an RGBA copy first
+        return flatten(img, background)
+
+    if img.mode in ('P', 'PA', 'L', 'LA', 'RGBa') or (img.mode == 'RGB' and has_alpha(img)):
+        img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+    elif img.mode not in ('RGB', 'RGBA'):
+        # 1, CMYK (Pillow undoes Adobe inversion on decode), YCbCr, LAB, HSV
+        img = img.convert('RGB')
+
+    if img.mode == 'RGBA' and img.getextrema()[3][0] == 255:
+        return img.convert('RGB')
+    return img
+
+
+def normalize_for(img, format_name, background=DEFAULT_BACKGROUND):
+    """normalize() for a target format: alpha kept only where the encoder stores it"""
+    return normalize(img, keep_alpha=supports_alpha(format_name), background=background)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Bulk trip ingestion for TripBasket
+- Streams sample_trips.csv-style files (title, price, location, description, image, itinerary) row by row
+- Validates and normalizes rows the same way the admin CSV upload does
+- Writes 500-document Firestore batches with bounded concurrency and retry: create() for new trips
+  (which sets created_at), merge writes for trips that already exist, so re-imports update them
+- Targets the real project or the local Firestore emulator
+"""
+
+import os
+import re
+import csv
+import sys
+import time
+import random
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+PROJECT_ID = 'tripbasket-sctkxj'
+COLLECTION = 'trips'
+DEFAULT_EMULATOR_HOST = 'localhost:8080'
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_SIZE = 500
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 5
+
+REQUIRED_COLUMNS = ['title', 'price', 'location', 'description', 'image', 'itinerary']
+
+DAY_PATTERN = re.compile(r'^day\s*(\d+)\s*[:.\-]\s*(.*)$', re.IGNORECASE)
+
+class RowError(ValueError):
+    """A CSV row that cannot be turned into a trip document"""
+
+def parse_price(value):
+    """'$1,500' -> 1500; mirrors _parsePrice in the admin upload page"""
+    cleaned = re.sub(r'[^\d.]', '', value or '')
+    try:
+        price = float(cleaned)
+    except ValueError:
+        raise RowError(f"invalid price {value!r}")
+    return int(price)
+
+def parse_itinerary(value):
+    """
+    Split 'Day 1: ... | Day 2: ...' into the itenarary array the app reads.
+    Entries without a 'Day N:' prefix are numbered by position; explicit day
+    numbers must run 1, 2, 3, ... in order.
+    """
+    days = []
+    for position, part in enumerate((p.strip() for p in (value or '').split('|') if p.strip()), start=1):
+        match = DAY_PATTERN.match(part)
+        if match:
+            number, text = int(match.group(1)), match.group(2).strip()
+            if number != position:
+                raise RowError(f"itinerary day {number} found where day {position} was expected")
+        else:
+            text = part
+        if not text:
+            raise RowError(f"itinerary day {position} is empty")
+        days.append(f"Day {position}: {text}")
+    return days
+
+def trip_document_id(title, location):
+    """Stable id so re-running an import updates trips instead of duplicating them"""
+    key = f"{title.strip().lower()}\n{location.strip().lower()}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+def normalize_row(row):
+    """Validate a CSV row and return (document_id, fields)"""
+    missing = [column for column in REQUIRED_COLUMNS[:5] if not (row.get(column) or '').strip()]
+    if missing:
+        raise RowError(f"missing {', '.join(missing)}")
+
+    title = ' '.join(row['title'].split())
+    location = ' '.join(row['location'].split())
+    image = row['image'].strip()
+    if not image.startswith(('http://', 'https://', 'assets/')):
+        raise RowError(f"image is not a URL or asset path: {image[:60]!r}")
+
+    fields = {
+        'title': title,
+        'price': parse_price(row['price']),
+        'location': location,
+        'description': row['description'].strip(),
+        'image': image,
+        'itenarary': parse_itinerary(row.get('itinerary')),  # existing field name with typo
+    }
+    return trip_document_id(title, location), fields
+
+def iter_rows(csv_path):
+    """Yield (line_number, row) without loading the file into memory"""
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        columns = [c.strip().lower() for c in (reader.fieldnames or [])]
+        absent = [c for c in REQUIRED_COLUMNS if c not in columns]
+        if absent:
+            raise RowError(f"{csv_path}: missing columns {', '.join(absent)}")
+        reader.fieldnames = columns
+        for row in reader:
+            yield reader.line_num, row
+
+def iter_batches(csv_path, batch_size, errors):
+    """Group normalized rows into batches; invalid rows are recorded in errors"""
+    batch = []
+    seen = set()
+    for line_number, row in iter_rows(csv_path):
+        try:
+            doc_id, fields = normalize_row(row)
+        except RowError as e:
+            errors.append((line_number, str(e)))
+            continue
+        if doc_id in seen:
+            errors.append((line_number, f"duplicate of an earlier row ({fields['title']})"))
+            continue
+        seen.add(doc_id)
+        batch.append((doc_id, fields))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class TripIngester:
+    def __init__(self, project_id=PROJECT_ID, emulator_host=None, collection=COLLECTION,
+                 batch_size=MAX_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                 retries=DEFAULT_RETRIES, dry_run=False):
+        self.project_id = project_id
+        self.collection = collection
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.dry_run = dry_run
+        self.client = None
+        self.written = 0
+        self.failed = 0
+        self.retried = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+        if emulator_host:
+            # The client library switches to the emulator (no credentials) when this is set
+            os.environ['FIRESTORE_EMULATOR_HOST'] = emulator_host
+
+    def connect(self):
+        from google.cloud import firestore
+        from google.cloud.firestore_v1.bulk_batch import BulkWriteBatch
+        from google.rpc import code_pb2
+        self.firestore = firestore
+        self.BulkWriteBatch = BulkWriteBatch
+        self.codes = code_pb2
+        # Per-document write failures worth retrying, as in is_retryable()
+        self.retryable_codes = {code_pb2.DEADLINE_EXCEEDED, code_pb2.RESOURCE_EXHAUSTED, code_pb2.ABORTED,
+                                code_pb2.INTERNAL, code_pb2.UNAVAILABLE}
+        self.client = firestore.Client(project=self.project_id)
+
+    def is_retryable(self, error):
+        from google.api_core import exceptions
+        return isinstance(error, (exceptions.Aborted, exceptions.DeadlineExceeded,
+                                  exceptions.InternalServerError, exceptions.ResourceExhausted,
+                                  exceptions.ServiceUnavailable, exceptions.TooManyRequests))
+
+    def commit_batch(self, number, documents):
+        """
+        Commit one batch as a non-atomic BatchWrite. Each trip is written with
+        create(), which sets created_at; trips that already exist are retried
+        as merge writes, which keep fields added since the last import. Failed
+        writes back off exponentially (with jitter) on transient errors.
+        """
+        if self.dry_run:
+            with self._lock:
+                self.written += len(documents)
+            return
+
+        collection = self.client.collection(self.collection)
+        pending = [(doc_id, fields, True) for doc_id, fields in documents]
+        attempt = 0
+        while pending:
+            try:
+                batch = self.BulkWriteBatch(self.client)
+                for doc_id, fields, create in pending:
+                    data = dict(fields, modified_at=self.firestore.SERVER_TIMESTAMP)
+                    if create:
+                        batch.create(collection.document(doc_id),
+                                     dict(data, created_at=self.firestore.SERVER_TIMESTAMP))
+                    else:
+                        batch.set(collection.document(doc_id), data, merge=True)
+                statuses = batch.commit().status
+            except Exception as e:
+                if attempt >= self.retries or not self.is_retryable(e):
+                    with self._lock:
+                        self.failed += len(pending)
+                        self.errors.append((f"batch {number}", f"{type(e).__name__}: {e}"))
+                    return
+                attempt = self.back_off(attempt)
+                continue
+
+            existing, transient, failed = [], [], []
+            for (doc_id, fields, create), status in zip(pending, statuses):
+                if status.code == self.codes.ALREADY_EXISTS and create:
+                    existing.append((doc_id, fields, False))
+                elif status.code in self.retryable_codes:
+                    transient.append((doc_id, fields, create))
+                elif status.code != self.codes.OK:
+                    failed.append((doc_id, status.message))
+            if transient and attempt >= self.retries:
+                failed += [(doc_id, "retries exhausted") for doc_id, _, _ in transient]
+                transient = []
+
+            with self._lock:
+                self.written += len(pending) - len(existing) - len(transient) - len(failed)
+                self.failed += len(failed)
+                self.errors += [(f"batch {number}", f"{doc_id}: {message}") for doc_id, message in failed]
+            if transient:
+                attempt = self.back_off(attempt)
+            pending = existing + transient
+
+    def back_off(self, attempt):
+        """Sleep before retrying a batch; returns the next attempt number"""
+        with self._lock:
+            self.retried += 1
+        time.sleep(min(30, 2 ** attempt) * (0.5 + random.random() / 2))
+        return attempt + 1
+
+    def ingest(self, csv_path):
+        """Stream csv_path into Firestore, keeping at most `concurrency` batches in flight"""
+        if not self.dry_run:
+            self.connect()
+
+        start = time.time()
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for number, documents in enumerate(iter_batches(csv_path, self.batch_size, self.errors), start=1):
+                if len(pending) >= self.concurrency:
+                    # Backpressure: don't read further ahead than the writers can keep up with
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.add(pool.submit(self.commit_batch, number, documents))
+                print(f"\rQueued {number} batches, {self.written} trips written...", end='', flush=True)
+            wait(pending)
+
+        print()
+        return time.time() - start
+
+    def report(self, elapsed):
+        target = os.environ.get('FIRESTORE_EMULATOR_HOST') or f"project {self.project_id}"
+        rate = self.written / elapsed if elapsed else 0
+        print("\n" + "=" * 50)
+        print("TRIP INGESTION SUMMARY" + (" (dry run)" if self.dry_run else ""))
+        print("=" * 50)
+        print(f"Target: {target} / {self.collection}")
+        print(f"Trips written: {self.written}")
+        print(f"Trips failed: {self.failed}")
+        print(f"Batch retries: {self.retried}")
+        print(f"Elapsed: {elapsed:.1f}s ({rate:.0f} trips/s)")
+
+        if self.errors:
+            print(f"\nErrors ({len(self.errors)}):")
+            for where, message in self.errors[:10]:
+                print(f"  Line {where}: {message}" if isinstance(where, int) else f"  {where}: {message}")
+            if len(self.errors) > 10:
+                print(f"  ... and {len(self.errors) - 10} more errors")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Bulk-load trips from a CSV into Firestore')
+    parser.add_argument('csv', type=Path, help='sample_trips.csv-style file to import')
+    parser.add_argument('--project', default=PROJECT_ID,
+                        help=f'Firebase project id (default: {PROJECT_ID})')
+    parser.add_argument('--emulator', nargs='?', const=DEFAULT_EMULATOR_HOST, default=None,
+                        metavar='HOST:PORT',
+                        help=f'write to the local Firestore emulator (default host: {DEFAULT_EMULATOR_HOST})')
+    parser.add_argument('--collection', default=COLLECTION,
+                        help=f'target collection (default: {COLLECTION})')
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE,
+                        help=f'documents per batch, at most {MAX_BATCH_SIZE}')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'batches committed in parallel (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f'retries per batch on transient errors (default: {DEFAULT_RETRIES})')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='validate and batch the CSV without writing to Firestore')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if not args.csv.exists():
+        print(f"❌ CSV not found: {args.csv}")
+        sys.exit(1)
+
+    # Check if the Firestore client is available
+    if not args.dry_run:
+        try:
+            from google.cloud import firestore
+        except ImportError:
+            print("❌ google-cloud-firestore not found. Install with: pip install google-cloud-firestore")
+            sys.exit(1)
+
+    ingester = TripIngester(
+        project_id=args.project,
+        emulator_host=args.emulator,
+        collection=args.collection,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        dry_run=args.dry_run,
+    )
+
+    try:
+        elapsed = ingester.ingest(args.csv)
+    except RowError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    ingester.report(elapsed)
+    if ingester.failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Opt-in stage instrumentation for the TripBasket asset scripts
+- Times named stages (discover, decode, resize, encode, compress, ...) per file
+- Optionally samples each stage's peak Python heap with tracemalloc
+  (Pillow's pixel buffers live in C and are not traced)
+- Writes a Chrome trace-event JSON (chrome://tracing, Perfetto) and a summary JSON
+- Disabled by default: stage() then returns a shared no-op context manager
+"""
+
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import nullcontext
+from pathlib import Path
+
+TRACE_FILENAME = 'image_optimization_trace.json'
+SUMMARY_FILENAME = 'image_optimization_profile.json'
+
+_NULL_STAGE = nullcontext()
+
+
+class _Stage:
+    """Context manager recording one stage as a complete ('X') trace event"""
+
+    __slots__ = ('profiler', 'name', 'args', 'start', 'child_peak')
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.child_peak = 0
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        if self.profiler.trace_memory:
+            if stack:
+                # reset_peak() below would lose the parent's peak so far; bank it first
+                stack[-1].child_peak = max(stack[-1].child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter_ns() - self.start
+        stack = self.profiler._stack()
+        stack.pop()
+
+        args = dict(self.args)
+        if self.profiler.trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            args['peak_kb'] = round(peak / 1024, 1)
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+
+        self.profiler.events.append({
+            'name': self.name,
+            'cat': 'stage',
+            'ph': 'X',
+            'ts': self.start // 1000,
+            'dur': duration // 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident() % 100000,
+            'args': args,
+        })
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False, trace_memory=False):
+        self.events = []
+        self._local = threading.local()
+        self.enabled = False
+        self.trace_memory = False
+        self.configure(enabled, trace_memory)
+
+    def __getstate__(self):
+        # Worker processes get the settings; their events come back via drain()
+        return {'enabled': self.enabled, 'trace_memory': self.trace_memory}
+
+    def __setstate__(self, state):
+        self.__init__(state['enabled'], state['trace_memory'])
+
+    def configure(self, enabled=False, trace_memory=False):
+        """Turn instrumentation on or off (memory sampling implies enabled)"""
+        self.enabled = enabled or trace_memory
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def stage(self, name, **args):
+        """Context manager timing one stage; args (e.g. file=...) are attached to the event"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, args)
+
+    def drain(self):
+        """Return and clear the recorded events (used to ship worker events to the parent)"""
+        events, self.events = self.events, []
+        return events
+
+    def merge(self, events):
+        self.events.extend(events)
+
+    def summary(self):
+        """Per-stage totals plus the slowest files"""
+        stages = {}
+        files = {}
+        for event in self.events:
+            duration_ms = event['dur'] / 1000
+            stats = stages.setdefault(event['name'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            if 'peak_kb' in event['args']:
+                stats['peak_kb'] = max(stats.get('peak_kb', 0), event['args']['peak_kb'])
+
+            file = event['args'].get('file')
+            if file:
+                per_file = files.setdefault(file, {})
+                per_file[event['name']] = round(per_file.get(event['name'], 0) + duration_ms, 3)
+
+        for stats in stages.values():
+            stats['mean_ms'] = round(stats['total_ms'] / stats['count'], 3)
+            stats['total_ms'] = round(stats['total_ms'], 3)
+            stats['max_ms'] = round(stats['max_ms'], 3)
+
+        slowest = sorted(files.items(), key=lambda item: sum(item[1].values()), reverse=True)
+        return {
+            'stages': dict(sorted(stages.items(), key=lambda item: item[1]['total_ms'], reverse=True)),
+            'slowest_files': [{'file': file, 'stages_ms': per_file} for file, per_file in slowest[:20]],
+            'memory_traced': self.trace_memory,
+        }
+
+    def write(self, output_dir):
+        """Write the Chrome trace and the summary JSON into output_dir"""
+        output_dir = Path(output_dir)
+        trace_path = output_dir / TRACE_FILENAME
+        summary_path = output_dir / SUMMARY_FILENAME
+
+        with open(trace_path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+        summary = self.summary()
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        print("\nStage timings:")
+        for name, stats in summary['stages'].items():
+            peak = f", peak {stats['peak_kb']:,.0f} KB" if 'peak_kb' in stats else ""
+            print(f"   {name:<10} {stats['total_ms']:>10,.1f} ms over {stats['count']} calls "
+                  f"(max {stats['max_ms']:,.1f} ms{peak})")
+        print(f"Trace saved: {trace_path} (open in chrome://tracing or ui.perfetto.dev)")
+        print(f"Profile summary saved: {summary_path}")
+
+
+# Process-wide profiler used by the image scripts; off unless configured
+PROFILER = Profiler()
+
+
+def stage(name, **args):
+    """Shorthand for PROFILER.stage"""
+    return PROFILER.stage(name, **args)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Memory budgeting for the TripBasket image scripts
+- Estimates the peak memory of decoding and resizing a source from its header
+- Decodes JPEGs at 1/2, 1/4 or 1/8 scale with Image.draft when the outputs
+  are smaller, and shrinks other formats with reduce() before LANCZOS
+- Rejects sources above a decompression pixel limit before any pixels are decoded;
+  that limit replaces Pillow's only while a source header is read
+- Sizes worker pools and admits work so in-flight estimates stay within a budget
+"""
+
+import os
+from collections import deque
+from contextlib import contextmanager
+
+from PIL import Image
+
+# Sources above this many pixels are skipped (a 12,000 x 12,000 upload is 144M)
+DEFAULT_MAX_PIXELS = 150_000_000
+
+# reduce() keeps at least this multiple of the output size for LANCZOS to work from
+REDUCING_GAP = 3
+
+MB = 1024 * 1024
+
+
+class PixelLimitError(ValueError):
+    """A source has more pixels than the configured decompression limit"""
+
+
+def check_pixel_limit(img, max_pixels=DEFAULT_MAX_PIXELS):
+    """Raise PixelLimitError if an opened (header-only) image is over the limit"""
+    if max_pixels and img.width * img.height > max_pixels:
+        raise PixelLimitError(f"{img.width}x{img.height} exceeds the {max_pixels:,} pixel limit")
+
+
+@contextmanager
+def open_image(path, max_pixels=DEFAULT_MAX_PIXELS):
+    """
+    Image.open checked against max_pixels (None = no limit) instead of Pillow's
+    MAX_IMAGE_PIXELS, which is swapped out only while the header is read
+    """
+    previous = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        img = Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = previous
+    with img:
+        check_pixel_limit(img, max_pixels)
+        yield img
+
+
+def bytes_per_pixel(mode):
+    """Bytes Pillow uses per pixel in memory (multi-band modes are stored as 32-bit)"""
+    if mode in ('1', 'L', 'P'):
+        return 1
+    if mode.startswith('I;16'):
+        return 2
+    return 4
+
+
+def bounding_box(boxes):
+    """Smallest box containing every (width, height) box, or None if any is unbounded"""
+    if not boxes or any(box is None for box in boxes):
+        return None
+    return (max(width for width, _ in boxes), max(height for _, height in boxes))
+
+
+def draft_size(size, box, jpeg=True):
+    """Size libjpeg decodes a JPEG of size at when drafted to box (size itself otherwise)"""
+    if not jpeg or box is None:
+        return size
+    width, height = size
+    scale = 1
+    while scale < 8 and width // (scale * 2) >= box[0] and height // (scale * 2) >= box[1]:
+        scale *= 2
+    return (-(-width // scale), -(-height // scale))
+
+
+def apply_draft(img, box):
+    """Ask libjpeg to decode at the smallest DCT scale still covering box (JPEG only)"""
+    if img.format == 'JPEG' and box is not None:
+        img.draft(None, box)
+    return img
+
+
+def reduce_for(img, box):
+    """Box-reduce a decoded image by an integer factor while it stays REDUCING_GAP x box"""
+    if box is None:
+        return img
+    factor = min(img.width // (box[0] * REDUCING_GAP), img.height // (box[1] * REDUCING_GAP))
+    if factor >= 2:
+        return img.reduce(factor)
+    return img
+
+
+def estimate_bytes(size, mode, box=None, jpeg=False):
+    """
+    Rough peak memory of rendering one source from its header: the decoded
+    pixels, one converted copy (mode normalization / reduce) and two
+    output-sized buffers (resize + encode)
+    """
+    width, height = draft_size(size, box, jpeg)
+    decoded = width * height
+    output = box[0] * box[1] if box is not None else decoded
+    return decoded * bytes_per_pixel(mode) + decoded * 4 + output * 4 * 2
+
+
+def available_memory():
+    """Currently available physical memory in bytes, or None where unknown"""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def parse_budget(value):
+    """--memory-budget value in bytes: a number of MB, or 'auto' for half the available memory"""
+    if value is None:
+        return None
+    if value == 'auto':
+        available = available_memory()
+        return available // 2 if available else None
+    return int(float(value) * MB)
+
+
+def pool_size(estimates, budget, max_jobs):
+    """Workers worth starting: as many of the smallest sources as fit the budget, capped at max_jobs"""
+    if not estimates or budget is None:
+        return max_jobs
+    return max(1, min(max_jobs, budget // max(min(estimates), 1)))
+
+
+def budgeted_map(executor, fn, work, estimates, budget):
+    """
+    Like executor.map(fn, *zip(*work)), yielding results in order, but only
+    submitting an item while the estimates of items in flight fit the budget
+    (an item larger than the whole budget runs on its own)
+    """
+    in_flight = deque()
+    in_flight_bytes = 0
+    for args, estimate in zip(work, estimates):
+        while in_flight and in_flight_bytes + estimate > budget:
+            future, done_estimate = in_flight.popleft()
+            in_flight_bytes -= done_estimate
+            yield future.result()
+        in_flight.append((executor.submit(fn, *args), estimate))
+        in_flight_bytes += estimate
+
+    while in_flight:
+        future, _ = in_flight.popleft()
+        yield future.result()
@@ -3,15 +3,22 @@
 TripBasket Image Optimization Script
 Converts PNG assets to WebP format for better web performance
 Preserves platform-specific icons (Android/iOS) as PNG
+Skips PNGs whose WebP output is already up to date (build cache)
 """
 
 import os
 import sys
+import argparse
 import subprocess
 from pathlib import Path
 from PIL import Image
 import shutil
 
+from build_cache import BuildCache
+from file_index import FileIndex, PLATFORM_DIRS, default_index_path
+from instrumentation import stage
+from image_modes import normalize_for, MODE_HANDLING_VERSION
+
 def should_convert_to_webp(file_path):
     """
     Determine if a PNG file should be converted to WebP
@@ -50,7 +57,23 @@ def should_convert_to_webp(file_path):
     
     return False
 
-def convert_png_to_webp(png_path, quality=85):
+def webp_settings(quality):
+    """Settings that affect the bytes written by convert_png_to_webp"""
+    return {'tool': 'optimize_images', 'format': 'webp', 'quality': quality, 'optimize': True,
+            'mode_handling': MODE_HANDLING_VERSION}
+
+def save_as_webp(img, webp_path, quality=85):
+    """
+    Save an already opened image as WebP (shared with the asset pipeline)
+    """
+    # WebP keeps transparency; fully opaque alpha is dropped
+    img = normalize_for(img, 'webp')
+    
+    # Save as WebP
+    with stage('encode', file=Path(webp_path).name):
+        img.save(webp_path, 'WebP', quality=quality, optimize=True)
+
+def convert_png_to_webp(png_path, quality=85, cache=None):
     """
     Convert PNG to WebP with specified quality
     Returns the WebP file path if successful, None otherwise
@@ -58,22 +81,17 @@ def convert_png_to_webp(png_path, quality=85):
     try:
         webp_path = png_path.with_suffix('.webp')
         
+        if cache is not None and cache.lookup(png_path, webp_path, webp_settings(quality)) is not None:
+            print(f"⏭️  Up to date: {png_path.name}")
+            return webp_path
+        
         # Open and convert
         with Image.open(png_path) as img:
-            # Convert RGBA to RGB if necessary for better WebP compression
-            if img.mode in ('RGBA', 'LA'):
-                # Create white background
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                # Paste image on white background using alpha channel as mask
-                if img.mode == 'RGBA':
-                    background.paste(img, mask=img.split()[-1])
-                else:  # LA mode
-                    background.paste(img, mask=img.split()[-1])
-                img = background
-            
-            # Save as WebP
-            img.save(webp_path, 'WebP', quality=quality, optimize=True)
+            save_as_webp(img, webp_path, quality)
             
+        if cache is not None:
+            cache.store(png_path, webp_path, webp_settings(quality))
+        
         # Get file sizes
         original_size = png_path.stat().st_size
         webp_size = webp_path.stat().st_size
@@ -91,17 +109,20 @@ def convert_png_to_webp(png_path, quality=85):
         print(f"❌ Error converting {png_path}: {e}")
         return None
 
-def optimize_images(project_root):
+def optimize_images(project_root, use_cache=True):
     """
     Find and optimize PNG images in the project
     """
     project_path = Path(project_root)
+    cache = BuildCache(project_path, enabled=use_cache)
     
     print("🖼️  TripBasket Image Optimization")
     print("=" * 50)
     
-    # Find all PNG files
-    png_files = list(project_path.rglob("*.png"))
+    # Find all PNG files in one pruned pass (node_modules, .git, the platform and build folders, ...)
+    with stage('discover'):
+        png_files = FileIndex(project_path, ['.png'], index_path=default_index_path(project_path),
+                              pruned_paths=PLATFORM_DIRS).paths()
     
     # Filter files that should be converted
     convertible_files = [f for f in png_files if should_convert_to_webp(f)]
@@ -119,7 +140,7 @@ def optimize_images(project_root):
         original_size = png_file.stat().st_size
         total_original += original_size
         
-        webp_file = convert_png_to_webp(png_file)
+        webp_file = convert_png_to_webp(png_file, cache=cache)
         if webp_file:
             webp_size = webp_file.stat().st_size
             total_webp += webp_size
@@ -138,6 +159,9 @@ def optimize_images(project_root):
     print(f"🚀 Optimized total size:  {total_webp:,} bytes ({total_webp/1024/1024:.2f} MB)")
     print(f"💾 Total savings:        {total_savings:,} bytes ({total_savings/1024/1024:.2f} MB)")
     print(f"📊 Size reduction:       {savings_percent:.1f}%")
+    print(f"🗃️  {cache.summary()}")
+    
+    cache.save()
     
     return successful_conversions
 
@@ -184,8 +208,76 @@ def update_pubspec_references(project_root, converted_files):
     else:
         print("ℹ️  No references found in pubspec.yaml to update")
 
+class ConversionReport:
+    """This script's console output for asset pipeline runs of the webp target"""
+    def __init__(self):
+        self.converted = 0
+        self.total_original = 0
+        self.total_webp = 0
+
+    def start(self, pipeline):
+        self.converted = self.total_original = self.total_webp = 0
+        print("🖼️  TripBasket Image Optimization")
+        print("=" * 50)
+
+    def planned(self, pipeline, candidates, planned, incremental):
+        png_files = [path for path in candidates if path.suffix.lower() == '.png']
+        print(f"📊 Found {len(png_files)} PNG files")
+        print(f"🔄 Converting {len(planned)} files to WebP")
+        print(f"🔒 Preserving {len(png_files) - len(planned)} platform icons as PNG")
+        print("-" * 50)
+
+    def source(self, pipeline, path, outputs, results):
+        for output, result in zip(outputs, results):
+            if output['target'] != 'webp':
+                continue
+            original_size = path.stat().st_size
+            self.total_original += original_size
+            if not result['success']:
+                print(f"❌ Error converting {path}: {result['error']}")
+                print()
+                continue
+            
+            webp_size = output['paths'][0].stat().st_size
+            self.total_webp += webp_size
+            self.converted += 1
+            if result.get('cached'):
+                print(f"⏭️  Up to date: {path.name}")
+            else:
+                savings = original_size - webp_size
+                savings_percent = (savings / original_size) * 100
+                print(f"✅ Converted: {path.name}")
+                print(f"   Original: {original_size:,} bytes")
+                print(f"   WebP:     {webp_size:,} bytes")
+                print(f"   Savings:  {savings:,} bytes ({savings_percent:.1f}%)")
+            print()
+
+    def summary(self, pipeline, totals, total_original):
+        total_savings = self.total_original - self.total_webp
+        savings_percent = (total_savings / self.total_original * 100) if self.total_original > 0 else 0
+        
+        print("=" * 50)
+        print("📈 OPTIMIZATION SUMMARY")
+        print("=" * 50)
+        print(f"✅ Successfully converted: {self.converted} files")
+        print(f"📦 Original total size:   {self.total_original:,} bytes ({self.total_original/1024/1024:.2f} MB)")
+        print(f"🚀 Optimized total size:  {self.total_webp:,} bytes ({self.total_webp/1024/1024:.2f} MB)")
+        print(f"💾 Total savings:        {total_savings:,} bytes ({total_savings/1024/1024:.2f} MB)")
+        print(f"📊 Size reduction:       {savings_percent:.1f}%")
+        print(f"🗃️  {pipeline.cache.summary()}")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='TripBasket PNG to WebP conversion')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='re-encode every PNG, ignoring the build cache')
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-stage timings as a Chrome trace and summary JSON')
+    return parser.parse_args()
+
 def main():
     """Main optimization process"""
+    args = parse_args()
     
     # Check if PIL is available
     try:
@@ -200,12 +292,12 @@ def main():
     
     print(f"📁 Project root: {project_root}")
     
-    # Optimize images
-    converted_files = optimize_images(project_root)
-    
-    # Update pubspec.yaml references
-    if converted_files:
-        update_pubspec_references(project_root, converted_files)
+    # Run the in-place WebP target through the shared asset pipeline, in this
+    # script's output format; it also updates pubspec.yaml references
+    from asset_pipeline import AssetPipeline, PipelineSettings
+    settings = PipelineSettings(targets=['webp'], use_cache=not args.no_cache, profile=args.profile)
+    pipeline = AssetPipeline(project_root, settings, report=ConversionReport())
+    pipeline.run()
     
     print("\n🎉 Image optimization completed!")
     print(f"💡 Next steps:")
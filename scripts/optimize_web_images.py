@@ -3,24 +3,48 @@
 Advanced Web Image Optimization for TripBasket
 - Creates multiple sizes for responsive loading
 - Aggressive WebP compression
-- Generates .webp.gz for even smaller sizes
-- Creates image manifests for optimal loading
+- Writes .br/.zst/.gz sidecars only where they actually save bytes
+- Creates image manifests for optimal loading (dimensions, BlurHash/LQIP placeholders, srcset/sizes)
+- Skips variants that are already up to date (build cache)
+- Optional resize pyramid: decode once, derive each size from the next larger,
+  checked against a direct resize of a centre tile (--min-psnr, --min-ssim)
+- Optional multi-format mode: AVIF/WebP/JPEG, keeping per image the formats that are smaller at every size
+- Optional perceptual quality search: per-variant WebP quality chosen by SSIM
+- Optional content-hashed filenames (--hashed-names) for immutable caching
 """
 
 import os
 import sys
-import gzip
 import json
+import math
+import argparse
+import importlib.util
 from pathlib import Path
 from PIL import Image
 import shutil
 
+from build_cache import BuildCache
+from instrumentation import stage
+from precompress import precompress_file, available_encodings, DEFAULT_MIN_SAVINGS
+import image_formats
+from placeholders import placeholders
+from image_modes import normalize, MODE_HANDLING_VERSION
+from hashed_assets import url_for
+import perceptual_quality
+from perceptual_quality import DEFAULT_SSIM_TARGET
+
+# Side (pixels) of the centre tile the pyramid check compares, at the variant's
+# resolution: only that tile is resized directly from the source
+PYRAMID_CHECK_TILE = 256
+
 class WebImageOptimizer:
-    def __init__(self, project_root):
+    def __init__(self, project_root, use_cache=True, resize_mode='direct', min_psnr=None, min_ssim=None,
+                 formats=None, quality_target=None, quality_search=None, hashed_names=False):
         self.project_root = Path(project_root)
         self.assets_path = self.project_root / 'assets' / 'images'
         self.optimized_path = self.assets_path / 'optimized'
         self.manifest_path = self.optimized_path / 'image_manifest.json'
+        self.minified_manifest_path = self.optimized_path / 'image_manifest.min.json'
         
         # Create optimized directory
         self.optimized_path.mkdir(exist_ok=True, parents=True)
@@ -30,21 +54,250 @@ class WebImageOptimizer:
             'hero': {
                 'sizes': [(480, 320), (768, 512), (1200, 800), (1920, 1280)],
                 'quality': 35,  # Lower quality for backgrounds
-                'suffix': ['_sm', '_md', '_lg', '_xl']
+                'suffix': ['_sm', '_md', '_lg', '_xl'],
+                'sizes_attr': '100vw'  # Full-bleed backgrounds
             },
             'card': {
                 'sizes': [(150, 100), (300, 200), (600, 400)],
                 'quality': 55,  # Medium quality for cards
-                'suffix': ['_sm', '_md', '_lg']
+                'suffix': ['_sm', '_md', '_lg'],
+                'sizes_attr': '(max-width: 600px) 50vw, 300px'
             },
             'gallery': {
                 'sizes': [(300, 200), (600, 400), (1200, 800)],
                 'quality': 65,  # Higher quality for gallery
-                'suffix': ['_sm', '_md', '_lg']
+                'suffix': ['_sm', '_md', '_lg'],
+                'sizes_attr': '(max-width: 1200px) 100vw, 1200px'
             }
         }
         
+        self.image_extensions = ['.jpg', '.jpeg', '.png', '.webp']
+        
+        # WebP is already entropy coded, so sidecars are only kept when they
+        # save at least this many percent (see precompress.py)
+        self.precompress_encodings = available_encodings()
+        self.precompress_min_savings = DEFAULT_MIN_SAVINGS
+        
+        # Resize strategy: 'direct' resamples every variant from the full source,
+        # 'pyramid' decodes once (DCT-downscaled for JPEG) and cascades each
+        # variant from the next larger one
+        self.resize_mode = resize_mode
+        
+        # Minimum PSNR (dB) and luma SSIM a cascaded variant must keep against
+        # the direct resize, compared on a sample tile; below either the direct
+        # resize is used instead. None skips that check.
+        self.pyramid_min_psnr = min_psnr
+        self.pyramid_min_ssim = min_ssim
+        
+        # Output formats, most modern first. ['webp'] encodes at each config's
+        # quality; more than one format switches to multi-format mode, where each
+        # format is searched for the lowest quality up to the config's quality that
+        # meets quality_target (PSNR dB), and only the fallback plus modern formats
+        # that are smaller at every size of the image are kept
+        self.formats = image_formats.supported_formats(formats or ['webp'])
+        self.multi_format = self.formats != ['webp']
+        self.quality_target = (quality_target or image_formats.DEFAULT_QUALITY_TARGET) if self.multi_format else None
+        
+        # Optional perceptual_quality.QualitySearch: each variant is encoded at the
+        # lowest quality up to the config's fixed quality that meets its SSIM
+        # target. WebP-only; multi-format mode has its own per-format search
+        if quality_search is not None and self.multi_format:
+            raise ValueError("quality search is WebP-only and can't be combined with multi-format output")
+        self.quality_search = quality_search
+        
+        # Point the srcset strings at each variant's <name>.<content hash>.<ext>
+        # URL, published into the web build after it is built (see hashed_assets.py)
+        self.hashed_names = hashed_names
+        
         self.manifest = {}
+        self.cache = BuildCache(self.project_root, enabled=use_cache)
+
+    def variant_settings(self, config_type, index):
+        """Settings that affect the bytes of one size variant"""
+        config = self.size_configs[config_type]
+        settings = {
+            'tool': 'optimize_web_images',
+            'size': list(config['sizes'][index]),
+            'quality': config['quality'],
+            'method': 6,
+            'precompress': self.precompress_encodings,
+            'precompress_min_savings': self.precompress_min_savings,
+            'resize_mode': self.resize_mode,
+            'min_psnr': self.pyramid_min_psnr if self.resize_mode == 'pyramid' else None,
+            'min_ssim': self.pyramid_min_ssim if self.resize_mode == 'pyramid' else None,
+            'check_tile': PYRAMID_CHECK_TILE if self.resize_mode == 'pyramid' else None,
+            'mode_handling': MODE_HANDLING_VERSION,
+        }
+        if self.quality_search is not None:
+            # 'quality' stays: it is the highest quality the search may pick
+            settings['quality_search'] = self.quality_search.settings()
+        if self.multi_format:
+            settings.update(formats=self.formats, quality_target=self.quality_target,
+                            quality_grid=image_formats.QUALITY_GRID, score_tolerance=image_formats.SCORE_TOLERANCE,
+                            format_options={name: image_formats.FORMATS[name]['options'] for name in self.formats},
+                            format_selection='image')
+        return settings
+
+    def fit_size(self, source_size, box):
+        """Dimensions of source_size scaled to fit within box, as thumbnail() computes them"""
+        width, height = source_size
+        x, y = box
+        if x >= width and y >= height:
+            return (width, height)
+        
+        def round_aspect(number, key):
+            return max(min(math.floor(number), math.ceil(number), key=key), 1)
+        
+        aspect = width / height
+        if x / y >= aspect:
+            x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+        else:
+            y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+        return (x, y)
+
+    def psnr(self, image, reference):
+        """Peak signal-to-noise ratio in dB between two images of the same size"""
+        return image_formats.psnr(image, reference)
+
+    def check_tile(self, variant, source):
+        """
+        The centre tile (up to PYRAMID_CHECK_TILE square) of a variant, and the
+        same region resized directly from source: only the tile is resampled
+        """
+        width, height = variant.size
+        tile_width, tile_height = min(width, PYRAMID_CHECK_TILE), min(height, PYRAMID_CHECK_TILE)
+        left, top = (width - tile_width) // 2, (height - tile_height) // 2
+        scale_x, scale_y = source.width / width, source.height / height
+        region = (left * scale_x, top * scale_y, (left + tile_width) * scale_x, (top + tile_height) * scale_y)
+        reference = source.resize((tile_width, tile_height), Image.Resampling.LANCZOS, box=region)
+        return variant.crop((left, top, left + tile_width, top + tile_height)), reference
+
+    def cascade_loss(self, variant, source):
+        """
+        Why a cascaded variant fails the pyramid check against a direct resize
+        (PSNR, luma SSIM on a sample tile), or None when it passes
+        """
+        tile, reference = self.check_tile(variant, source)
+        if self.pyramid_min_psnr is not None:
+            score = self.psnr(tile, reference)
+            if score < self.pyramid_min_psnr:
+                return f"PSNR {score:.1f} dB below {self.pyramid_min_psnr} dB"
+        if self.pyramid_min_ssim is not None:
+            score = perceptual_quality.ssim(perceptual_quality.luma_plane(tile),
+                                            perceptual_quality.luma_plane(reference))
+            if score < self.pyramid_min_ssim:
+                return f"SSIM {score:.4f} below {self.pyramid_min_ssim}"
+        return None
+
+    def resize_pyramid(self, img, source_size, boxes):
+        """
+        Yield (box_index, resized_image) largest first, deriving each variant
+        from the previous one instead of from the full-resolution source
+        """
+        targets = [self.fit_size(source_size, box) for box in boxes]
+        order = sorted(range(len(boxes)), key=lambda k: targets[k][0] * targets[k][1], reverse=True)
+        check = self.pyramid_min_psnr is not None or self.pyramid_min_ssim is not None
+        
+        current = img
+        for k in order:
+            target = targets[k]
+            with stage('resize', size=f"{target[0]}x{target[1]}"):
+                variant = current.resize(target, Image.Resampling.LANCZOS) if current.size != target else current.copy()
+            
+            if check and current is not img:
+                # The first variant is resized from img itself, so it is direct already
+                with stage('pyramid_check', size=f"{target[0]}x{target[1]}"):
+                    loss = self.cascade_loss(variant, img)
+                if loss is not None:
+                    print(f"     {target[0]}x{target[1]}: cascade {loss}, using direct resize")
+                    variant = img.resize(target, Image.Resampling.LANCZOS)
+            
+            yield k, variant
+            current = variant
+
+    def should_process(self, image_file):
+        """Top-level assets only, skipping icons and logos"""
+        if image_file.suffix.lower() not in self.image_extensions:
+            return False
+        if image_file.parent == self.optimized_path:
+            return False
+        if any(skip in image_file.name.lower() for skip in ['favicon', 'icon-', 'logo']):
+            return False
+        return True
+
+    def load_manifest(self):
+        """Read an existing image_manifest.json, for incremental updates"""
+        try:
+            with open(self.manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def save_manifest(self):
+        """Write image_manifest.json and the minified copy loaded at runtime"""
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        with open(self.minified_manifest_path, 'w') as f:
+            json.dump(self.manifest, f, separators=(',', ':'))
+
+    def manifest_entry(self, source_path, image_type, variants):
+        """
+        image_manifest.json entry for a source: its dimensions, BlurHash and
+        LQIP placeholders, srcset strings per MIME type, the sizes attribute
+        and the variants with their real width/height. With hashed_names it
+        also maps each variant path to the URL of its content-hashed copy.
+        """
+        with Image.open(source_path) as img:
+            width, height = img.size
+        
+        for variant in variants:
+            if 'width' not in variant:
+                # Results cached before dimensions were recorded
+                box = tuple(int(n) for n in variant['size'].split('x'))
+                variant['width'], variant['height'] = self.fit_size((width, height), box)
+            variant.setdefault('format', 'webp')
+            variant.setdefault('mime', image_formats.FORMATS[variant['format']]['mime'])
+        
+        # Logical path -> URL of the content-hashed copy
+        hashed = {}
+        if self.hashed_names:
+            for variant in variants:
+                for encoded in variant.get('formats') or [variant]:
+                    hashed[encoded['path']] = url_for(self.resolve_manifest_path(encoded['path']))
+        
+        srcset = {}
+        for variant in variants:
+            for encoded in variant.get('formats') or [variant]:
+                url = hashed.get(encoded['path'], encoded['path'])
+                srcset.setdefault(encoded['mime'], []).append(f"{url} {variant['width']}w")
+        
+        entry = {
+            'type': image_type,
+            'original_size': Path(source_path).stat().st_size,
+            'width': width,
+            'height': height,
+            'aspect_ratio': round(width / height, 4),
+            'sizes': self.size_configs[image_type]['sizes_attr'],
+            'srcset': {mime: ', '.join(candidates) for mime, candidates in srcset.items()},
+        }
+        
+        # Placeholders come from the smallest variant's most compatible file
+        smallest = min(variants, key=lambda variant: variant['width'] * variant['height'])
+        fallback = (smallest.get('formats') or [smallest])[-1]
+        try:
+            entry.update(placeholders(self.resolve_manifest_path(fallback['path'])))
+        except OSError as e:
+            print(f"   Warning: no placeholder for {source_path.name} ({e})")
+        
+        entry['variants'] = variants
+        if hashed:
+            entry['hashed'] = hashed
+        return entry
+
+    def resolve_manifest_path(self, manifest_path):
+        """Inverse of manifest_path_for"""
+        path = self.assets_path / manifest_path
+        return path if path.exists() else self.project_root / manifest_path
 
     def detect_image_type(self, filename):
         """Detect image type based on filename patterns"""
@@ -61,35 +314,118 @@ class WebImageOptimizer:
         """Create multiple optimized sizes of an image"""
         try:
             with Image.open(input_path) as img:
-                # Convert RGBA to RGB if needed
-                if img.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'RGBA':
-                        background.paste(img, mask=img.split()[-1])
-                    else:
-                        background.paste(img, mask=img.split()[-1])
-                    img = background
-                elif img.mode == 'P':
-                    img = img.convert('RGB')
-                
-                config = self.size_configs[config_type]
-                original_size = os.path.getsize(input_path)
+                planned = self.plan_variants(img, output_base, config_type)
+                outputs_by_index = dict(planned)
+                slots = {i: slot for slot, (i, _) in enumerate(planned)}
                 results = []
+                pending = []
+                
+                # Image.open only reads the header, so up-to-date variants are
+                # resolved from the build cache without decoding any pixels
+                for i, outputs in planned:
+                    cached = self.cache.lookup(input_path, outputs, self.variant_settings(config_type, i))
+                    results.append(cached)
+                    if cached is None:
+                        pending.append((i, outputs))
                 
-                for i, (width, height) in enumerate(config['sizes']):
-                    # Skip if image is smaller than target size
-                    if img.width <= width and img.height <= height:
-                        continue
-                    
-                    # Resize maintaining aspect ratio
+                if pending and self.multi_format:
+                    # Formats are chosen per image, so its variants are rendered together
+                    pending = planned
+                
+                for i, result in self.render_variants(img, input_path, config_type, pending):
+                    results[slots[i]] = result
+                    if self.quality_search is not None:
+                        self.quality_search.remember(result)
+                    self.cache.store(input_path, outputs_by_index[i], self.variant_settings(config_type, i), result)
+                
+                return results
+                
+        except Exception as e:
+            print(f"Error optimizing {input_path}: {e}")
+            return []
+
+    def plan_variants(self, img, output_base, config_type):
+        """
+        List (size_index, paths) for every variant an image needs: one path per
+        output format, fallback format first (it is always written, so it is
+        the build cache key)
+        """
+        config = self.size_configs[config_type]
+        planned = []
+        
+        for i, (width, height) in enumerate(config['sizes']):
+            # Skip if image is smaller than target size
+            if img.width <= width and img.height <= height:
+                continue
+            
+            # Generate filename with size suffix
+            suffix = config['suffix'][i]
+            planned.append((i, [
+                Path(str(output_base) + suffix + image_formats.FORMATS[name]['extension'])
+                for name in reversed(self.formats)
+            ]))
+        
+        return planned
+
+    def render_variants(self, img, input_path, config_type, pending):
+        """
+        Resize, encode and precompress the pending (size_index, outputs) variants of an
+        opened image, yielding (size_index, result) (shared with the asset pipeline)
+        """
+        if not pending:
+            return
+        
+        config = self.size_configs[config_type]
+        original_size = os.path.getsize(input_path)
+        
+        source_size = img.size
+        if self.resize_mode == 'pyramid' and img.format == 'JPEG':
+            # Let libjpeg scale by 1/2, 1/4 or 1/8 while decoding; draft()
+            # never goes below the requested size, so the largest pending
+            # variant still resamples from at least its own resolution
+            largest = max((self.fit_size(source_size, config['sizes'][i]) for i, _ in pending),
+                          key=lambda size: size[0] * size[1])
+            img.draft(None, largest)
+        
+        # Keep transparency for WebP/AVIF; JPEG encodes are flattened in image_formats
+        img = normalize(img, keep_alpha=True)
+        
+        if self.resize_mode == 'pyramid':
+            resized_variants = (
+                (pending[k], img_resized)
+                for k, img_resized in self.resize_pyramid(
+                    img, source_size, [config['sizes'][i] for i, _ in pending])
+            )
+        else:
+            resized_variants = ((task, None) for task in pending)
+        
+        # Multi-format encodes, written once the formats for the image are chosen
+        encoded = []
+        
+        for (i, outputs), img_resized in resized_variants:
+            width, height = config['sizes'][i]
+            output_path = outputs[0]
+            
+            if img_resized is None:
+                # Resize maintaining aspect ratio
+                with stage('resize', file=input_path.name, size=f"{width}x{height}"):
                     img_resized = img.copy()
                     img_resized.thumbnail((width, height), Image.Resampling.LANCZOS)
-                    
-                    # Generate filename with size suffix
-                    suffix = config['suffix'][i]
-                    output_path = Path(str(output_base) + suffix + '.webp')
-                    
-                    # Save WebP
+            
+            if self.multi_format:
+                with stage('encode', file=input_path.name, size=f"{width}x{height}"):
+                    encodes = image_formats.encode_formats(img_resized, self.formats, self.quality_target,
+                                                           config['quality'])
+                encoded.append((i, outputs, f"{width}x{height}", img_resized.size, encodes))
+                continue
+            
+            # Save WebP
+            chosen = {}
+            with stage('encode', file=input_path.name, size=f"{width}x{height}"):
+                if self.quality_search is not None:
+                    chosen = self.quality_search.choose(img_resized, 'webp', config['quality'])
+                    output_path.write_bytes(chosen.pop('data'))
+                else:
                     img_resized.save(
                         output_path,
                         'WEBP',
@@ -97,38 +433,85 @@ class WebImageOptimizer:
                         method=6,  # Maximum compression
                         optimize=True
                     )
-                    
-                    # Create gzipped version for ultra-small files
-                    self.create_gzipped_version(output_path)
-                    
-                    # Record results
-                    optimized_size = output_path.stat().st_size
-                    results.append({
-                        'size': f"{width}x{height}",
-                        'path': str(output_path.relative_to(self.assets_path)),
-                        'file_size': optimized_size,
-                        'compression_ratio': round((1 - optimized_size/original_size) * 100, 1)
-                    })
-                
-                return results
-                
-        except Exception as e:
-            print(f"Error optimizing {input_path}: {e}")
-            return []
+            
+            # Keep .br/.zst/.gz sidecars only where they pay off
+            with stage('compress', file=input_path.name, size=f"{width}x{height}"):
+                sidecars = precompress_file(output_path, self.precompress_encodings,
+                                            self.precompress_min_savings)['sidecars']
+            
+            # Record results
+            optimized_size = output_path.stat().st_size
+            yield i, {
+                'size': f"{width}x{height}",
+                'path': self.manifest_path_for(output_path),
+                'width': img_resized.width,
+                'height': img_resized.height,
+                'format': 'webp',
+                'mime': image_formats.FORMATS['webp']['mime'],
+                'file_size': optimized_size,
+                'compression_ratio': round((1 - optimized_size/original_size) * 100, 1),
+                'precompressed': sidecars,
+                **chosen
+            }
 
-    def create_gzipped_version(self, webp_path):
-        """Create gzipped version of WebP for ultra compression"""
-        try:
-            gz_path = webp_path.with_suffix('.webp.gz')
-            with open(webp_path, 'rb') as f_in:
-                with gzip.open(gz_path, 'wb', compresslevel=9) as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-        except Exception as e:
-            print(f"Error creating gzipped version: {e}")
+        if encoded:
+            # Formats are chosen per image, so each kept format covers every width
+            kept = image_formats.select_formats([encodes for *_, encodes in encoded], self.formats)
+            for i, outputs, size_label, (width, height), encodes in encoded:
+                result = self.write_formats([encodes[name] for name in kept], outputs, original_size,
+                                            size_label, input_path.name)
+                yield i, dict(result, width=width, height=height)
+
+    def write_formats(self, kept, outputs, original_size, size_label, source_name):
+        """Write one variant's kept encodes (most modern first) and remove the dropped formats"""
+        paths_by_format = dict(zip(reversed(self.formats), outputs))
+        formats = []
+        for encoded in kept:
+            output_path = paths_by_format[encoded['format']]
+            output_path.write_bytes(encoded['data'])
+            with stage('compress', file=source_name, size=size_label):
+                sidecars = precompress_file(output_path, self.precompress_encodings,
+                                            self.precompress_min_savings)['sidecars']
+            formats.append({
+                'format': encoded['format'],
+                'mime': image_formats.FORMATS[encoded['format']]['mime'],
+                'path': self.manifest_path_for(output_path),
+                'file_size': len(encoded['data']),
+                'quality': encoded['quality'],
+                'psnr': round(encoded['score'], 2) if encoded['score'] != float('inf') else None,
+                'precompressed': sidecars
+            })
+        
+        # Remove formats a previous run kept but this one dropped
+        kept_formats = {encoded['format'] for encoded in kept}
+        for name, output_path in paths_by_format.items():
+            if name not in kept_formats and output_path.exists():
+                output_path.unlink()
+        
+        # The most modern kept format is the primary entry; 'formats' lists all, best first
+        best = formats[0]
+        return {
+            'size': size_label,
+            'path': best['path'],
+            'format': best['format'],
+            'mime': best['mime'],
+            'file_size': best['file_size'],
+            'compression_ratio': round((1 - best['file_size']/original_size) * 100, 1),
+            'precompressed': best['precompressed'],
+            'formats': formats
+        }
+
+    def manifest_path_for(self, output_path):
+        """Manifest path of an output: relative to assets/images, else to the project root"""
+        for base in (self.assets_path, self.project_root):
+            try:
+                return str(Path(output_path).relative_to(base))
+            except ValueError:
+                continue
+        return str(output_path)
 
     def process_all_images(self):
         """Process all images in the assets directory"""
-        image_extensions = ['.jpg', '.jpeg', '.png', '.webp']
         processed_count = 0
         total_original_size = 0
         total_optimized_size = 0
@@ -137,11 +520,7 @@ class WebImageOptimizer:
         print("=" * 60)
         
         for image_file in self.assets_path.glob('*'):
-            if image_file.suffix.lower() not in image_extensions:
-                continue
-            if image_file.parent == self.optimized_path:
-                continue
-            if any(skip in image_file.name.lower() for skip in ['favicon', 'icon-', 'logo']):
+            if not self.should_process(image_file):
                 continue
             
             print(f"\nProcessing: {image_file.name}")
@@ -163,11 +542,8 @@ class WebImageOptimizer:
             
             if results:
                 # Add to manifest
-                self.manifest[str(image_file.relative_to(self.assets_path))] = {
-                    'type': image_type,
-                    'original_size': original_size,
-                    'variants': results
-                }
+                self.manifest[str(image_file.relative_to(self.assets_path))] = self.manifest_entry(
+                    image_file, image_type, results)
                 
                 # Calculate total optimized size
                 variant_sizes = sum(r['file_size'] for r in results)
@@ -180,8 +556,7 @@ class WebImageOptimizer:
                 processed_count += 1
         
         # Save manifest
-        with open(self.manifest_path, 'w') as f:
-            json.dump(self.manifest, f, indent=2)
+        self.save_manifest()
         
         # Print summary
         print("\n" + "=" * 60)
@@ -194,18 +569,123 @@ class WebImageOptimizer:
             savings = total_original_size - total_optimized_size
             savings_percent = (savings / total_original_size) * 100
             print(f"Total savings: {savings:,} bytes ({savings_percent:.1f}%)")
+        print(self.cache.summary())
         print(f"Manifest saved: {self.manifest_path}")
+        
+        self.cache.save()
+        if self.quality_search is not None:
+            self.quality_search.save()
+
+class VariantReport:
+    """This script's console output for asset pipeline runs of the variants target"""
+    def __init__(self):
+        self.processed = 0
+        self.total_original = 0
+        self.total_optimized = 0
+
+    def start(self, pipeline):
+        self.processed = self.total_original = self.total_optimized = 0
+        print("Advanced Web Image Optimization Starting...")
+        print("=" * 60)
+
+    def planned(self, pipeline, candidates, planned, incremental):
+        pass
+
+    def source(self, pipeline, path, outputs, results):
+        variants = [(output, result) for output, result in zip(outputs, results) if output['target'] == 'variants']
+        if not variants:
+            return
+        original_size = path.stat().st_size
+        self.total_original += original_size
+        print(f"\nProcessing: {path.name}")
+        print(f"   Type: {variants[0][0]['type']}")
+        print(f"   Original: {original_size:,} bytes")
+        
+        created = [result for _, result in variants if result['success']]
+        for _, result in variants:
+            if not result['success']:
+                print(f"   Failed: {result['error']}")
+        if not created:
+            return
+        
+        self.processed += 1
+        self.total_optimized += sum(result['file_size'] for result in created)
+        print(f"   Created {len(created)} variants:")
+        for result in created:
+            print(f"     {result['size']}: {result['file_size']:,} bytes ({result['compression_ratio']}% smaller)")
+
+    def summary(self, pipeline, totals, total_original):
+        print("\n" + "=" * 60)
+        print("OPTIMIZATION COMPLETE")
+        print("=" * 60)
+        print(f"Images processed: {self.processed}")
+        print(f"Original total: {self.total_original:,} bytes ({self.total_original/1024/1024:.2f} MB)")
+        print(f"Optimized total: {self.total_optimized:,} bytes ({self.total_optimized/1024/1024:.2f} MB)")
+        if self.total_original > 0:
+            savings = self.total_original - self.total_optimized
+            savings_percent = (savings / self.total_original) * 100
+            print(f"Total savings: {savings:,} bytes ({savings_percent:.1f}%)")
+        print(pipeline.cache.summary())
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='TripBasket responsive web image optimization')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='re-encode every variant, ignoring the build cache')
+    parser.add_argument('--resize-mode', choices=['direct', 'pyramid'], default='direct',
+                        help='resample every size from the source, or cascade from the next larger size')
+    parser.add_argument('--min-psnr', type=float, default=None,
+                        help='in pyramid mode, fall back to a direct resize below this PSNR (dB)')
+    parser.add_argument('--min-ssim', type=float, default=None,
+                        help='in pyramid mode, fall back to a direct resize below this luma SSIM (needs NumPy)')
+    parser.add_argument('--formats', nargs='+', choices=list(image_formats.FORMATS), default=['webp'],
+                        help='output formats, most modern first (e.g. avif webp jpeg); the last is the fallback')
+    parser.add_argument('--quality-target', type=float, default=None,
+                        help=f'multi-format PSNR target in dB (default: {image_formats.DEFAULT_QUALITY_TARGET:g})')
+    parser.add_argument('--quality-search', action='store_true',
+                        help='choose each variant\'s WebP quality by SSIM instead of the fixed per-type quality (needs NumPy)')
+    parser.add_argument('--ssim-target', type=float, default=None,
+                        help=f'SSIM target for --quality-search (default: {DEFAULT_SSIM_TARGET:g})')
+    parser.add_argument('--update-pubspec', action='store_true',
+                        help='list just the referenced images and their outputs in pubspec.yaml afterwards')
+    parser.add_argument('--hashed-names', action='store_true',
+                        help='use content-hashed variant URLs in srcset (publish them with hashed_assets.py after the build)')
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-stage timings as a Chrome trace and summary JSON')
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    
     try:
         from PIL import Image
     except ImportError:
         print("ERROR: PIL (Pillow) not found. Install with: pip install Pillow")
         return
     
+    if args.quality_search and args.formats != ['webp']:
+        print("ERROR: --quality-search only applies to WebP output; use --quality-target with --formats")
+        return
+    
+    if args.quality_search or args.min_ssim is not None:
+        if importlib.util.find_spec('numpy') is None:
+            option = '--quality-search' if args.quality_search else '--min-ssim'
+            print(f"ERROR: {option} needs NumPy. Install with: pip install numpy")
+            return
+    
     project_root = Path(__file__).parent.parent
-    optimizer = WebImageOptimizer(project_root)
-    optimizer.process_all_images()
+    
+    # Run the responsive variants target through the shared asset pipeline, in
+    # this script's output format (it prints "Manifest saved:" last, as before)
+    from asset_pipeline import AssetPipeline, PipelineSettings
+    settings = PipelineSettings(targets=['variants'], use_cache=not args.no_cache,
+                                resize_mode=args.resize_mode, min_psnr=args.min_psnr, min_ssim=args.min_ssim,
+                                formats=args.formats, quality_target=args.quality_target,
+                                quality_search=args.quality_search, ssim_target=args.ssim_target,
+                                hashed_names=args.hashed_names, update_pubspec=args.update_pubspec,
+                                profile=args.profile)
+    pipeline = AssetPipeline(project_root, settings, report=VariantReport())
+    pipeline.run()
     
     print("\nNext steps:")
     print("1. Update your Flutter code to use OptimizedImage component")
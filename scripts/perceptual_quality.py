@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Perceptual quality search for the TripBasket image scripts
+- Scores an encode by SSIM against the pixels it was encoded from, computed
+  with vectorized NumPy on a downscaled luma plane
+- Bisects the quality grid for the lowest quality meeting an SSIM target,
+  up to the caller's fixed quality, so flat images get lower qualities and
+  detailed ones keep today's
+- Caches the chosen quality per pixel-content hash in .dart_tool/quality_cache.json
+"""
+
+import io
+import os
+import json
+import hashlib
+from pathlib import Path
+
+from PIL import Image
+
+import image_formats
+import image_modes
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CACHE_VERSION = 1
+CACHE_FILENAME = 'quality_cache.json'
+
+# Default SSIM target (on the downscaled luma plane below): about the median
+# the fixed qualities (75 for optimized/, 35/55/65 per variant type) reach on
+# the bundled photos. 0.98 needed q85+ on most of them, so outputs grew
+DEFAULT_SSIM_TARGET = 0.94
+
+# Luma planes are box-downscaled until their longer side fits this; large
+# variants are scored at about the size they are displayed at
+LUMA_MAX_SIDE = 1024
+
+# SSIM window size (pixels) and the standard stabilising constants for 8-bit data
+SSIM_WINDOW = 7
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def luma_plane(img, max_side=LUMA_MAX_SIDE):
+    """Luma of an image (flattened if transparent) as a float64 array, box-reduced to fit max_side"""
+    luma = image_modes.normalize(img).convert('L')
+    factor = -(-max(luma.size) // max_side)
+    if factor > 1:
+        luma = luma.reduce(factor)
+    return numpy.asarray(luma, dtype=numpy.float64)
+
+
+def _window_means(plane, window):
+    """Mean of every window x window block (valid positions) via a summed-area table"""
+    table = numpy.zeros((plane.shape[0] + 1, plane.shape[1] + 1))
+    table[1:, 1:] = plane.cumsum(axis=0).cumsum(axis=1)
+    sums = (table[window:, window:] - table[:-window, window:]
+            - table[window:, :-window] + table[:-window, :-window])
+    return sums / (window * window)
+
+
+def ssim(plane, reference, window=SSIM_WINDOW):
+    """Mean structural similarity of two equally sized luma planes (1.0 = identical)"""
+    window = min(window, *plane.shape)
+    mu_x = _window_means(plane, window)
+    mu_y = _window_means(reference, window)
+    var_x = _window_means(plane * plane, window) - mu_x * mu_x
+    var_y = _window_means(reference * reference, window) - mu_y * mu_y
+    covariance = _window_means(plane * reference, window) - mu_x * mu_y
+
+    numerator = (2 * mu_x * mu_y + SSIM_C1) * (2 * covariance + SSIM_C2)
+    denominator = (mu_x * mu_x + mu_y * mu_y + SSIM_C1) * (var_x + var_y + SSIM_C2)
+    return float((numerator / denominator).mean())
+
+
+def default_cache_path(project_root):
+    """Cache location; .dart_tool is a tool cache that is never scanned or bundled"""
+    return Path(project_root) / '.dart_tool' / CACHE_FILENAME
+
+
+class QualitySearch:
+    """
+    Chooses an encoder quality per image. Choices are keyed on a hash of the
+    pixels being encoded plus the format and search settings, so a variant
+    whose resized pixels are unchanged reuses its quality with a single encode.
+    Worker processes get a snapshot of the cache; choices travel back in the
+    results ('quality_key', ...) and are recorded with remember().
+    """
+
+    def __init__(self, project_root, target=DEFAULT_SSIM_TARGET, grid=None, use_cache=True):
+        if numpy is None:
+            raise RuntimeError("perceptual quality search needs NumPy (pip install numpy)")
+        self.target = target
+        self.grid = list(grid or image_formats.QUALITY_GRID)
+        self.cache_path = default_cache_path(project_root) if use_cache else None
+        self.entries = {}
+        self.searched = 0
+        self.reused = 0
+        self.load()
+
+    def settings(self):
+        """Search settings; part of every cache key and of the build cache settings"""
+        return {'metric': 'ssim', 'target': self.target, 'grid': self.grid,
+                'luma_max_side': LUMA_MAX_SIDE, 'window': SSIM_WINDOW}
+
+    def load(self):
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.cache_path)
+
+    def content_key(self, img, format_name, max_quality=None):
+        digest = hashlib.blake2b(digest_size=16)
+        settings = dict(self.settings(), format=format_name, max_quality=max_quality,
+                        options=image_formats.FORMATS[format_name]['options'])
+        digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        digest.update(f"{img.mode}:{img.width}x{img.height}".encode('utf-8'))
+        digest.update(img.tobytes())
+        return digest.hexdigest()
+
+    def choose(self, img, format_name='webp', max_quality=None):
+        """
+        Encode img at the lowest quality meeting the SSIM target, searching no
+        higher than max_quality (which is used when nothing lower meets it).
+        Returns {'quality', 'ssim', 'data', 'quality_key', 'quality_cached'};
+        pass it (or a result carrying those keys) to remember() to keep it.
+        """
+        key = self.content_key(img, format_name, max_quality)
+        entry = self.entries.get(key)
+        if entry is not None:
+            data = image_formats.encode(img, format_name, entry['quality'])
+            return {'quality': entry['quality'], 'ssim': entry['ssim'], 'data': data,
+                    'quality_key': key, 'quality_cached': True}
+
+        reference = luma_plane(img)
+
+        def score(data):
+            with Image.open(io.BytesIO(data)) as decoded:
+                return ssim(luma_plane(decoded), reference)
+
+        result = image_formats.search_quality(
+            lambda quality: image_formats.encode(img, format_name, quality), score, self.target,
+            image_formats.capped_grid(max_quality, self.grid))
+        return {'quality': result['quality'], 'ssim': round(result['score'], 4), 'data': result['data'],
+                'quality_key': key, 'quality_cached': False}
+
+    def remember(self, result):
+        """Record a choice made here or in a worker process (no-op for other results)"""
+        if 'quality_key' not in result:
+            return
+        if result['quality_cached']:
+            self.reused += 1
+        else:
+            self.searched += 1
+        self.entries[result['quality_key']] = {'quality': result['quality'], 'ssim': result['ssim']}
+
+    def summary(self):
+        return (f"Quality search: {self.searched} searched, {self.reused} reused "
+                f"(SSIM target {self.target:g})")
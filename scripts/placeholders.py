@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Image placeholders for the TripBasket image manifests
+- BlurHash strings (https://blurha.sh), decodable by the blurhash Dart package
+- LQIP data URIs: a ~16px WebP inlined as base64, ready for an <img> or Image.memory
+- Both are computed from a small variant, so they cost a few milliseconds per image
+"""
+
+import io
+import math
+import base64
+
+from PIL import Image
+
+from image_modes import normalize
+
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+# Pixels sampled per side for BlurHash; the hash only holds a few cosine terms
+BLURHASH_SAMPLE_SIDE = 32
+
+# Longest side and WebP quality of the inlined placeholder
+LQIP_MAX_SIDE = 16
+LQIP_QUALITY = 30
+
+
+def _encode83(value, length):
+    return ''.join(BASE83[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(value):
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def blurhash(img, x_components=None, y_components=None):
+    """BlurHash of an image; 4x3 components for landscape images, 3x4 for portrait"""
+    if x_components is None or y_components is None:
+        x_components, y_components = (4, 3) if img.width >= img.height else (3, 4)
+
+    sample = normalize(img).copy()
+    sample.thumbnail((BLURHASH_SAMPLE_SIDE, BLURHASH_SAMPLE_SIDE), Image.Resampling.BOX)
+    width, height = sample.size
+    linear = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in sample.getdata()]
+
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[i][x] * cos_y[j][y]
+                    pixel = linear[row + x]
+                    r += basis * pixel[0]
+                    g += basis * pixel[1]
+                    b += basis * pixel[2]
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(value) for factor in ac for value in factor)
+        quantised_max = int(max(0, min(82, math.floor(actual_max * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+        result += _encode83(quantised_max, 1)
+    else:
+        maximum = 1
+        result += _encode83(0, 1)
+
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        quantised = [int(max(0, min(18, math.floor(_sign_pow(value / maximum, 0.5) * 9 + 9.5)))) for value in factor]
+        result += _encode83(quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2)
+    return result
+
+
+def lqip_data_uri(img, max_side=LQIP_MAX_SIDE, quality=LQIP_QUALITY):
+    """A tiny WebP of the image as a data: URI (transparency kept)"""
+    tiny = normalize(img, keep_alpha=True).copy()
+    tiny.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    tiny.save(buffer, 'WEBP', quality=quality, method=6)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def placeholders(path):
+    """{'blurhash', 'placeholder'} for an image file (normally the smallest variant)"""
+    with Image.open(path) as img:
+        img.load()
+        return {'blurhash': blurhash(img), 'placeholder': lqip_data_uri(img)}
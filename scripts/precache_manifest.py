@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Service worker precache manifest for the TripBasket web build
+- Lists the app shell files that actually exist in build/web (index.html,
+  main.dart.js, flutter.js, split bundles when present, asset manifests)
+- Adds image variants from image_manifest.json in priority order (hero _sm,
+  hero _md, then card _sm) until a byte budget is used up
+- Each entry has its URL, a content revision and its byte size; content-hashed
+  URLs (hashed_assets.py) need no revision
+- Injects the manifest into web/sw-optimized.js and writes the result into the
+  build, so only entries whose revision changed are downloaded again
+"""
+
+import re
+import sys
+import json
+import argparse
+from pathlib import Path
+
+from build_cache import hash_file, settings_digest
+from hashed_assets import HASH_LENGTH, is_hashed
+
+DEFAULT_ROOT = Path('build') / 'web'
+
+# Precached in this order whenever they exist; the split bundles only exist
+# after build_performance_optimized.bat has split main.dart.js
+SHELL_FILES = [
+    'index.html',
+    'flutter_bootstrap.js',
+    'flutter.js',
+    'main.dart.js',
+    'runtime.js',
+    'vendor.js',
+    'app.js',
+    'manifest.json',
+    'favicon.png',
+    'assets/FontManifest.json',
+    'assets/AssetManifest.bin.json',
+    'assets/AssetManifest.json',
+    'assets/assets/images/optimized/image_manifest.min.json',
+]
+
+# Image variants by priority: (image type, size suffix)
+IMAGE_PRIORITIES = [
+    ('hero', '_sm'),
+    ('hero', '_md'),
+    ('card', '_sm'),
+]
+
+# Flutter web serves the asset assets/images/x.webp at /assets/assets/images/x.webp
+IMAGES_URL = 'assets/assets/images/'
+
+DEFAULT_BUDGET_KB = 5 * 1024
+
+# Dotfile so Firebase Hosting ("ignore": ["**/.*"]) doesn't deploy it
+MANIFEST_FILENAME = '.precache_manifest.json'
+
+SW_TEMPLATE = Path('web') / 'sw-optimized.js'
+SW_FILENAME = 'flutter_service_worker.js'
+
+# Template lines replaced by the generated values
+MANIFEST_MARKER = re.compile(r'^const PRECACHE_MANIFEST = \[\];$', re.MULTILINE)
+VERSION_MARKER = re.compile(r"^const PRECACHE_VERSION = 'dev';$", re.MULTILINE)
+
+
+class PrecacheManifestBuilder:
+    def __init__(self, project_root, build_root=None, budget_kb=DEFAULT_BUDGET_KB):
+        self.project_root = Path(project_root)
+        self.build_root = Path(build_root) if build_root else self.project_root / DEFAULT_ROOT
+        self.image_manifest_path = self.project_root / 'assets' / 'images' / 'optimized' / 'image_manifest.json'
+        self.manifest_path = self.build_root / MANIFEST_FILENAME
+        self.budget = int(budget_kb * 1024)
+
+        # Images left out by the last build(): over the budget, or not in the web build
+        self.over_budget = []
+        self.missing = []
+
+    def entry(self, relative, group):
+        """Precache entry for a file under the build root"""
+        path = self.build_root / relative
+        url = '/' if relative == 'index.html' else '/' + relative
+        # A hashed name already changes with the content
+        revision = None if is_hashed(path) else hash_file(path)[:HASH_LENGTH]
+        return {'url': url, 'revision': revision, 'size': path.stat().st_size, 'group': group}
+
+    def shell(self):
+        return [self.entry(name, 'shell') for name in SHELL_FILES if (self.build_root / name).is_file()]
+
+    def image_candidates(self):
+        """
+        Build-relative image files in priority order: for each variant its
+        content-hashed copy if published, else the logical file, preferring
+        WebP where a variant has several formats
+        """
+        try:
+            with open(self.image_manifest_path, 'r') as f:
+                image_manifest = json.load(f)
+        except (OSError, ValueError):
+            return []
+
+        candidates = []
+        for image_type, suffix in IMAGE_PRIORITIES:
+            for key, entry in sorted(image_manifest.items()):
+                if entry.get('type') != image_type:
+                    continue
+                hashed = entry.get('hashed', {})
+                for variant in entry.get('variants', []):
+                    encoded = variant.get('formats') or [variant]
+                    chosen = next((item for item in encoded if item.get('format') == 'webp'), encoded[-1])
+                    logical = chosen['path']
+                    if not Path(logical.replace('\\', '/')).stem.endswith(suffix):
+                        continue
+                    if logical in hashed:
+                        # Published into the build by hashed_assets.py, served from the site root
+                        relative = hashed[logical].lstrip('/')
+                    else:
+                        relative = IMAGES_URL + logical.replace('\\', '/')
+                    candidates.append((relative, f"{image_type}{suffix}"))
+        return candidates
+
+    def build(self):
+        """Shell files, then images in priority order while they fit the budget"""
+        entries = self.shell()
+        total = sum(entry['size'] for entry in entries)
+        if total > self.budget:
+            print(f"Warning: the app shell alone is {total:,} bytes, over the {self.budget:,} byte budget")
+
+        seen = {entry['url'] for entry in entries}
+        self.missing = []
+        self.over_budget = []
+        for relative, group in self.image_candidates():
+            if '/' + relative in seen:
+                # Aliases (image_dedup.py) share their canonical source's files
+                continue
+            seen.add('/' + relative)
+            if not (self.build_root / relative).is_file():
+                # Not bundled (see asset_references.py); Hosting would answer with index.html
+                self.missing.append(relative)
+                continue
+            entry = self.entry(relative, group)
+            if total + entry['size'] > self.budget:
+                self.over_budget.append(entry)
+                continue
+            entries.append(entry)
+            total += entry['size']
+        return entries
+
+    def version(self, entries):
+        """Changes whenever any precached URL or revision does"""
+        return settings_digest([(entry['url'], entry['revision']) for entry in entries])[:HASH_LENGTH]
+
+    def inject(self, entries, template_path, output_path):
+        """Write the service worker template with the manifest and version filled in"""
+        template = Path(template_path).read_text(encoding='utf-8')
+        if not MANIFEST_MARKER.search(template) or not VERSION_MARKER.search(template):
+            raise ValueError(f"{template_path} has no PRECACHE_MANIFEST / PRECACHE_VERSION placeholder")
+        manifest = [{key: entry[key] for key in ('url', 'revision', 'size')} for entry in entries]
+        script = MANIFEST_MARKER.sub(lambda _: f"const PRECACHE_MANIFEST = {json.dumps(manifest, indent=2)};",
+                                     template, count=1)
+        script = VERSION_MARKER.sub(lambda _: f"const PRECACHE_VERSION = '{self.version(entries)}';",
+                                    script, count=1)
+        Path(output_path).write_text(script, encoding='utf-8')
+
+    def run(self, template_path=None, sw_filename=SW_FILENAME, inject=True):
+        """Build the manifest, save it and inject it into the service worker; returns the entries"""
+        print("Generating Service Worker Precache Manifest...")
+        print("=" * 60)
+        entries = self.build()
+
+        groups = {}
+        for entry in entries:
+            count, size = groups.get(entry['group'], (0, 0))
+            groups[entry['group']] = (count + 1, size + entry['size'])
+        for group, (count, size) in groups.items():
+            print(f"   {group:<10} {count} files, {size:,} bytes")
+
+        total = sum(entry['size'] for entry in entries)
+        print(f"Precached: {len(entries)} files, {total:,} of {self.budget:,} budget bytes")
+        if self.over_budget:
+            print(f"Left to runtime caching: {len(self.over_budget)} images over budget "
+                  f"({sum(entry['size'] for entry in self.over_budget):,} bytes)")
+        if self.missing:
+            print(f"Not in the build: {len(self.missing)} images (not listed in pubspec.yaml?)")
+
+        with open(self.manifest_path, 'w') as f:
+            json.dump({'version': self.version(entries), 'budget': self.budget, 'total': total,
+                       'entries': entries}, f, indent=2)
+        print(f"Manifest saved: {self.manifest_path}")
+
+        if inject:
+            output_path = self.build_root / sw_filename
+            self.inject(entries, template_path or self.project_root / SW_TEMPLATE, output_path)
+            print(f"Service worker written: {output_path}")
+        return entries
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Generate the service worker precache manifest for build/web')
+    parser.add_argument('root', nargs='?', type=Path, default=None,
+                        help=f'web build directory (default: {DEFAULT_ROOT})')
+    parser.add_argument('--budget-kb', type=float, default=DEFAULT_BUDGET_KB,
+                        help=f'precache at most this many KB, app shell first (default: {DEFAULT_BUDGET_KB})')
+    parser.add_argument('--template', type=Path, default=None,
+                        help=f'service worker template (default: {SW_TEMPLATE})')
+    parser.add_argument('--sw-name', default=SW_FILENAME,
+                        help=f'service worker filename written into the build (default: {SW_FILENAME})')
+    parser.add_argument('--manifest-only', action='store_true',
+                        help='write the manifest without generating the service worker')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    project_root = Path(__file__).parent.parent
+    builder = PrecacheManifestBuilder(project_root, build_root=args.root, budget_kb=args.budget_kb)
+    if not builder.build_root.is_dir():
+        print(f"❌ Directory not found: {builder.build_root} (run 'flutter build web' first)")
+        sys.exit(1)
+
+    try:
+        builder.run(template_path=args.template, sw_filename=args.sw_name, inject=not args.manifest_only)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
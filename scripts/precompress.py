@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Precompressed sidecars for TripBasket web assets
+- Compresses each file with Brotli (.br), zstd (.zst) and gzip (.gz)
+- Keeps a sidecar only when it saves more than a threshold; stale ones are removed
+- Runs across a process pool and writes a manifest plus firebase.json headers guidance
+- Covers build/web (JS, wasm, CSS, JSON, HTML, SVG) and the image variants
+"""
+
+import os
+import sys
+import gzip
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from file_index import find_files
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Sidecar suffix -> Content-Encoding token, in preference order
+ENCODINGS = {
+    '.br': 'br',
+    '.zst': 'zstd',
+    '.gz': 'gzip',
+}
+
+# Minimum saving (percent of the original size) for a sidecar to be kept
+DEFAULT_MIN_SAVINGS = 10.0
+
+# Below this size the per-request saving is smaller than the headers involved
+MIN_FILE_SIZE = 1024
+
+DEFAULT_ROOT = Path('build') / 'web'
+WEB_EXTENSIONS = ['.js', '.mjs', '.wasm', '.css', '.json', '.html', '.svg', '.txt', '.xml', '.ttf', '.otf']
+
+# Dotfile so Firebase Hosting ("ignore": ["**/.*"]) doesn't deploy it
+MANIFEST_FILENAME = '.precompress_manifest.json'
+
+
+def available_encodings(requested=None):
+    """Sidecar suffixes whose encoder is installed, in preference order"""
+    encoders = {'.br': brotli is not None, '.zst': zstandard is not None, '.gz': True}
+    return [suffix for suffix in ENCODINGS if encoders[suffix] and (requested is None or suffix in requested)]
+
+
+def compress(data, suffix):
+    """Compress bytes with the encoder for a sidecar suffix (deterministic output)"""
+    if suffix == '.br':
+        return brotli.compress(data, quality=11)
+    if suffix == '.zst':
+        return zstandard.ZstdCompressor(level=19).compress(data)
+    # mtime=0 keeps the gzip header, and so the file, identical across builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress_file(path, encodings=None, min_savings=DEFAULT_MIN_SAVINGS):
+    """
+    Write the sidecars of path that save at least min_savings percent and
+    remove the others. Returns {'size', 'sidecars': {suffix: size}, 'rejected': {suffix: size}}.
+    """
+    path = Path(path)
+    encodings = encodings if encodings is not None else available_encodings()
+    data = path.read_bytes()
+    result = {'size': len(data), 'sidecars': {}, 'rejected': {}}
+
+    for suffix in ENCODINGS:
+        sidecar = Path(str(path) + suffix)
+        compressed = None
+        if suffix in encodings and len(data) >= MIN_FILE_SIZE:
+            compressed = compress(data, suffix)
+            if (1 - len(compressed) / len(data)) * 100 < min_savings:
+                result['rejected'][suffix] = len(compressed)
+                compressed = None
+
+        if compressed is None:
+            # Drop sidecars from earlier builds that no longer pay off
+            if sidecar.exists():
+                sidecar.unlink()
+            continue
+
+        if not sidecar.exists() or sidecar.read_bytes() != compressed:
+            sidecar.write_bytes(compressed)
+        result['sidecars'][suffix] = len(compressed)
+
+    return result
+
+
+def headers_guidance(manifest):
+    """
+    firebase.json "headers" entries for the sidecars that were produced.
+    Hosting never swaps in a sidecar by itself; these apply when clients
+    request the .br/.zst/.gz URL explicitly or a CDN in front maps
+    Accept-Encoding onto the sidecar.
+    """
+    by_suffix = {}
+    for entry in manifest['files'].values():
+        extension = entry['extension'].lstrip('.')
+        for suffix in entry['sidecars']:
+            by_suffix.setdefault(suffix, set()).add(extension)
+
+    headers = []
+    for suffix, extensions in by_suffix.items():
+        patterns = '|'.join(f"{extension}{suffix}" for extension in sorted(extensions))
+        headers.append({
+            'source': f"**/*.@({patterns})",
+            'headers': [
+                {'key': 'Content-Encoding', 'value': ENCODINGS[suffix]},
+                {'key': 'Vary', 'value': 'Accept-Encoding'},
+            ],
+        })
+    return headers
+
+
+class Precompressor:
+    def __init__(self, root, extensions=None, encodings=None, min_savings=DEFAULT_MIN_SAVINGS, jobs=None):
+        self.root = Path(root)
+        self.extensions = extensions or WEB_EXTENSIONS
+        self.encodings = available_encodings(encodings)
+        self.min_savings = min_savings
+        self.jobs = jobs or os.cpu_count() or 1
+        self.manifest_path = self.root / MANIFEST_FILENAME
+
+    def compress_one(self, path):
+        try:
+            return precompress_file(path, self.encodings, self.min_savings)
+        except OSError as e:
+            return {'error': str(e)}
+
+    def run(self):
+        """Precompress every matching file under root and write the manifest"""
+        print("Precompressing Web Assets...")
+        print("=" * 60)
+        missing = [suffix for suffix in ENCODINGS if suffix not in available_encodings()]
+        if missing:
+            print(f"Skipping {', '.join(missing)}: install brotli / zstandard to enable")
+        print(f"Encodings: {', '.join(self.encodings)} (keep if ≥{self.min_savings:g}% smaller)")
+
+        files = find_files(self.root, self.extensions)
+        jobs = min(self.jobs, len(files))
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(self.compress_one, files, chunksize=8))
+        else:
+            results = [self.compress_one(path) for path in files]
+
+        manifest = {'min_savings_percent': self.min_savings, 'encodings': self.encodings, 'files': {}}
+        original_total = 0
+        best_total = 0
+        kept = 0
+        for path, result in zip(files, results):
+            name = path.relative_to(self.root).as_posix()
+            if 'error' in result:
+                print(f"   {name}: failed ({result['error']})")
+                continue
+            original_total += result['size']
+            best_total += min([result['size']] + list(result['sidecars'].values()))
+            kept += len(result['sidecars'])
+            if result['sidecars']:
+                sizes = ', '.join(f"{suffix} {size:,}" for suffix, size in result['sidecars'].items())
+                print(f"   {name}: {result['size']:,} -> {sizes}")
+            manifest['files'][name] = {
+                'extension': path.suffix.lower(),
+                'size': result['size'],
+                'sidecars': result['sidecars'],
+            }
+
+        manifest['headers'] = headers_guidance(manifest)
+        with open(self.manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        print("\n" + "=" * 60)
+        print(f"Files scanned: {len(files)}, sidecars kept: {kept}")
+        if original_total:
+            print(f"Best-case transfer: {best_total:,} of {original_total:,} bytes "
+                  f"({(1 - best_total / original_total) * 100:.1f}% smaller)")
+        print(f"Manifest saved: {self.manifest_path}")
+        return manifest
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Write precompressed .br/.zst/.gz sidecars for web assets')
+    parser.add_argument('roots', nargs='*', type=Path, default=[DEFAULT_ROOT],
+                        help=f'directories to precompress (default: {DEFAULT_ROOT})')
+    parser.add_argument('--encodings', nargs='+', choices=list(ENCODINGS), default=None,
+                        help='sidecars to consider (default: every installed encoder)')
+    parser.add_argument('--min-savings', type=float, default=DEFAULT_MIN_SAVINGS,
+                        help=f'keep a sidecar only if it is this many percent smaller (default: {DEFAULT_MIN_SAVINGS:g})')
+    parser.add_argument('--extensions', nargs='+', default=None,
+                        help='file extensions to consider (default: JS, wasm, CSS, JSON, HTML, SVG, ...)')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('--print-headers', action='store_true',
+                        help='print firebase.json "headers" entries for the sidecars produced')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    for root in args.roots:
+        if not root.is_dir():
+            print(f"❌ Directory not found: {root} (run 'flutter build web' first)")
+            sys.exit(1)
+
+        precompressor = Precompressor(root, extensions=args.extensions, encodings=args.encodings,
+                                      min_savings=args.min_savings, jobs=args.jobs)
+        manifest = precompressor.run()
+
+        if args.print_headers:
+            print("\nfirebase.json \"headers\" entries:")
+            print(json.dumps(manifest['headers'], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Remote trip image prefetch for TripBasket
+- Downloads the image URLs of a trips CSV concurrently over pooled keep-alive connections
+- Renders each download through WebImageOptimizer's size configs (via the asset pipeline)
+- Overlaps network and CPU: an image is encoded as soon as its download lands
+- Rewrites the CSV and writes a manifest pointing at the generated variants
+- Variants stay under build/; --publish copies them into build/web after `flutter build web`
+"""
+
+import io
+import os
+import csv
+import json
+import sys
+import time
+import asyncio
+import shutil
+import hashlib
+import argparse
+import threading
+import http.client
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from PIL import Image
+
+from asset_pipeline import AssetPipeline, PipelineSettings
+
+# Downloaded originals and their variants; build/ is never committed, bundled
+# or scanned for assets
+DOWNLOAD_DIR = Path('build') / 'remote_images'
+DEFAULT_OUTPUT_DIR = DOWNLOAD_DIR / 'trips'
+
+# Where --publish copies the variants in the web build (served from DEFAULT_PUBLIC_URL)
+PUBLISH_DIR = Path('build') / 'web' / 'images' / 'trips'
+DEFAULT_PUBLIC_URL = 'https://tripbasket-sctkxj.web.app/images/trips'
+MANIFEST_FILENAME = 'trip_image_manifest.json'
+
+DEFAULT_CONNECTIONS = 8
+MAX_REDIRECTS = 5
+USER_AGENT = 'TripBasket-asset-pipeline/1.0'
+
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+class FetchError(Exception):
+    """A remote image that could not be downloaded"""
+
+
+def url_key(url):
+    """Stable short name for a URL, used for download and variant filenames"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+def timed_process_source(pipeline, source_path, outputs):
+    """AssetPipeline.process_source plus the seconds it took inside the worker"""
+    start = time.time()
+    results = pipeline.process_source(source_path, outputs)
+    return time.time() - start, results
+
+
+class PooledHTTPFetcher:
+    """
+    Blocking HTTP(S) fetcher that keeps one keep-alive connection per
+    (thread, host), so a pool of download threads reuses its TLS sessions.
+    Plain http:// works too, e.g. against a local `python -m http.server`.
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, scheme, netloc):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        if (scheme, netloc) not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[(scheme, netloc)] = connection_class(netloc, timeout=self.timeout)
+        return connections[(scheme, netloc)]
+
+    def _drop(self, scheme, netloc):
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+    def _get(self, url):
+        parts = urlsplit(url)
+        target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        headers = {'User-Agent': USER_AGENT, 'Accept': 'image/webp,image/jpeg,image/png,image/*'}
+
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request('GET', target, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                # The server may have closed an idle keep-alive connection; reconnect once
+                self._drop(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                self._drop(parts.scheme, parts.netloc)
+            return response, body
+
+    def fetch(self, url):
+        """Return the body of url, following redirects"""
+        for _ in range(MAX_REDIRECTS + 1):
+            response, body = self._get(url)
+            location = response.getheader('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            if response.status != 200:
+                raise FetchError(f"HTTP {response.status} for {url}")
+            return body
+        raise FetchError(f"too many redirects for {url}")
+
+
+class DirectoryFetcher:
+    """
+    Local stand-in for PooledHTTPFetcher: serves each URL from a file in
+    directory named url_key(url) (any extension) or after the URL's basename.
+    Useful for offline runs and for exercising the pipeline without network.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def fetch(self, url):
+        key = url_key(url)
+        basename = os.path.basename(urlsplit(url).path)
+        for path in sorted(self.directory.iterdir()):
+            if path.stem == key or (basename and path.name == basename):
+                return path.read_bytes()
+        raise FetchError(f"no local file for {url}")
+
+
+class RemoteImagePrefetcher:
+    def __init__(self, project_root, fetcher=None, output_dir=None, public_url=DEFAULT_PUBLIC_URL,
+                 image_type='gallery', connections=DEFAULT_CONNECTIONS, jobs=None, use_cache=True,
+                 refresh=False, resize_mode='direct', min_psnr=None, min_ssim=None):
+        self.project_root = Path(project_root)
+        self.fetcher = fetcher or PooledHTTPFetcher()
+        self.output_dir = self.project_root / (output_dir or DEFAULT_OUTPUT_DIR)
+        self.download_path = self.project_root / DOWNLOAD_DIR
+        self.manifest_path = self.output_dir / MANIFEST_FILENAME
+        self.public_url = public_url.rstrip('/')
+        self.connections = max(1, connections)
+        self.refresh = refresh
+
+        # Rendering goes through the asset pipeline's variants target, so the
+        # same size configs, decode path and build cache apply to remote images
+        settings = PipelineSettings(targets=['variants'], jobs=jobs, use_cache=use_cache,
+                                    resize_mode=resize_mode, min_psnr=min_psnr, min_ssim=min_ssim)
+        self.pipeline = AssetPipeline(self.project_root, settings)
+        self.web = self.pipeline.web
+        self.cache = self.pipeline.cache
+        self.image_type = image_type
+        self.jobs = self.pipeline.jobs
+
+        # Busy time per side (summed across workers), to show how much downloads and encodes overlapped
+        self.download_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.downloaded_bytes = 0
+        self.manifest = {}
+        self._lock = threading.Lock()
+
+    def read_image_urls(self, csv_path):
+        """Unique http(s) image URLs of a trips CSV, in row order"""
+        urls = []
+        seen = set()
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                url = (row.get('image') or '').strip()
+                if url.startswith(('http://', 'https://')) and url not in seen:
+                    seen.add(url)
+                    urls.append(url)
+        return urls
+
+    # Network side
+
+    def download(self, url):
+        """Fetch url into the download directory unless already there; returns (path, fetched)"""
+        key = url_key(url)
+        if not self.refresh:
+            for existing in self.download_path.glob(key + '.*'):
+                if existing.suffix != '.tmp':
+                    return existing, False
+
+        start = time.time()
+        body = self.fetcher.fetch(url)
+        with Image.open(io.BytesIO(body)) as img:
+            extension = FORMAT_EXTENSIONS.get(img.format)
+        if extension is None:
+            raise FetchError(f"unsupported image format from {url}")
+
+        self.download_path.mkdir(parents=True, exist_ok=True)
+        path = self.download_path / (key + extension)
+        temp_path = path.with_suffix('.tmp')
+        temp_path.write_bytes(body)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self.download_seconds += time.time() - start
+            self.downloaded_bytes += len(body)
+        return path, True
+
+    # CPU side
+
+    def plan(self, url, source_path):
+        """Variant outputs for a downloaded image, in the asset pipeline's output format"""
+        # Image.open only reads the header here
+        with Image.open(source_path) as img:
+            planned = self.web.plan_variants(img, self.output_dir / url_key(url), self.image_type)
+        return [{
+            'target': 'variants',
+            'paths': paths,
+            'settings': self.web.variant_settings(self.image_type, index),
+            'box': self.web.size_configs[self.image_type]['sizes'][index],
+            'type': self.image_type,
+            'index': index,
+        } for index, paths in planned]
+
+    async def process(self, url, loop, download_pool, encode_pool):
+        """Download one URL, then hand it straight to the encoder pool"""
+        try:
+            source_path, fetched = await loop.run_in_executor(download_pool, self.download, url)
+        except Exception as e:
+            return {'url': url, 'success': False, 'error': f"download failed: {e}"}
+
+        outputs = self.plan(url, source_path)
+        cached = [self.cache.lookup(source_path, output['paths'], output['settings']) for output in outputs]
+        pending = [output for output, hit in zip(outputs, cached) if hit is None]
+
+        fresh = iter(())
+        if pending:
+            seconds, results = await loop.run_in_executor(encode_pool, timed_process_source,
+                                                          self.pipeline, source_path, pending)
+            self.encode_seconds += seconds
+            fresh = iter(results)
+
+        results = []
+        for output, hit in zip(outputs, cached):
+            if hit is not None:
+                results.append(dict(hit, cached=True))
+                continue
+            result = next(fresh)
+            if result['success']:
+                self.cache.store(source_path, output['paths'], output['settings'], result)
+            results.append(result)
+
+        failed = [result for result in results if not result.get('success', True)]
+        return {
+            'url': url,
+            'success': not failed,
+            'error': failed[0]['error'] if failed else None,
+            'source': source_path,
+            'fetched': fetched,
+            'outputs': outputs,
+            'results': results,
+        }
+
+    async def prefetch(self, urls):
+        """Process every URL; downloads and encodes run in separate pools and overlap"""
+        loop = asyncio.get_running_loop()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.jobs > 1:
+            encode_pool = ProcessPoolExecutor(max_workers=self.jobs)
+        else:
+            # A single encode thread still overlaps with the download threads
+            encode_pool = ThreadPoolExecutor(max_workers=1)
+
+        with ThreadPoolExecutor(max_workers=self.connections) as download_pool, encode_pool:
+            return await asyncio.gather(*[
+                self.process(url, loop, download_pool, encode_pool) for url in urls
+            ])
+
+    # Manifest
+
+    def variant_url(self, output_path):
+        return f"{self.public_url}/{Path(output_path).relative_to(self.output_dir).as_posix()}"
+
+    def record(self, item):
+        """Manifest entry for a processed URL; None when there is nothing to point at"""
+        if not item['success'] or not item['outputs']:
+            return None
+        variants = []
+        for output, result in zip(item['outputs'], item['results']):
+            variants.append({
+                'size': result['size'],
+                'url': self.variant_url(output['paths'][0].with_name(Path(result['path']).name)),
+                'path': result['path'],
+                'file_size': result['file_size'],
+                'compression_ratio': result['compression_ratio'],
+            })
+        return {
+            'type': self.image_type,
+            'source': item['source'].relative_to(self.project_root).as_posix(),
+            'original_size': item['source'].stat().st_size,
+            # The largest variant replaces the original in the CSV
+            'image': variants[-1]['url'],
+            'variants': variants,
+        }
+
+    def save_manifest(self):
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+
+    def rewrite_csv(self, csv_path, output_csv):
+        """Copy the CSV row by row, pointing image at the generated variant"""
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f_in:
+            reader = csv.DictReader(f_in)
+            rows_rewritten = 0
+            with open(output_csv, 'w', encoding='utf-8', newline='') as f_out:
+                writer = csv.DictWriter(f_out, fieldnames=reader.fieldnames)
+                writer.writeheader()
+                for row in reader:
+                    entry = self.manifest.get((row.get('image') or '').strip())
+                    if entry:
+                        row['image'] = entry['image']
+                        rows_rewritten += 1
+                    writer.writerow(row)
+        return rows_rewritten
+
+    def publish(self, publish_dir=PUBLISH_DIR):
+        """
+        Copy the variants and manifest into the web build (run after `flutter
+        build web`, which recreates build/web); returns the number of files copied
+        """
+        publish_dir = self.project_root / publish_dir
+        copied = 0
+        for path in sorted(self.output_dir.rglob('*')):
+            if not path.is_file():
+                continue
+            target = publish_dir / path.relative_to(self.output_dir)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, target)
+            copied += 1
+        return copied
+
+    def run(self, csv_path, output_csv=None):
+        """Prefetch and optimize every image of csv_path and write the rewritten CSV"""
+        csv_path = Path(csv_path)
+        output_csv = Path(output_csv) if output_csv else csv_path.with_name(csv_path.stem + '.optimized.csv')
+
+        print("Remote Trip Image Prefetch Starting...")
+        print("=" * 60)
+
+        urls = self.read_image_urls(csv_path)
+        print(f"Image URLs: {len(urls)} ({self.connections} connections, {self.jobs} encode workers)")
+
+        start = time.time()
+        items = asyncio.run(self.prefetch(urls))
+        elapsed = time.time() - start
+
+        failures = []
+        for item in items:
+            entry = self.record(item)
+            if entry:
+                self.manifest[item['url']] = entry
+            label = item['url'][:70]
+            if not item['success']:
+                failures.append(item)
+                print(f"\n❌ {label}\n   {item['error']}")
+                continue
+            print(f"\n{'⬇️ ' if item['fetched'] else '📦'} {label}")
+            if not entry:
+                print("   Smaller than every variant size, keeping the original URL")
+                continue
+            for output, result in zip(item['outputs'], item['results']):
+                status = "up to date" if result.get('cached') else f"{result['compression_ratio']}% smaller"
+                print(f"   {result['size']}: {result['file_size']:,} bytes ({status})")
+
+        self.save_manifest()
+        rows_rewritten = self.rewrite_csv(csv_path, output_csv)
+        self.cache.save()
+
+        print("\n" + "=" * 60)
+        print("PREFETCH COMPLETE")
+        print("=" * 60)
+        print(f"Images optimized: {len(self.manifest)}/{len(urls)}")
+        print(f"Downloaded: {sum(1 for item in items if item.get('fetched'))} "
+              f"({self.downloaded_bytes / 1024 / 1024:.2f} MB)")
+        print(f"Elapsed: {elapsed:.1f}s (download busy {self.download_seconds:.1f}s, "
+              f"encode busy {self.encode_seconds:.1f}s)")
+        print(self.cache.summary())
+        print(f"Manifest saved: {self.manifest_path}")
+        print(f"CSV rewritten: {output_csv} ({rows_rewritten} rows)")
+
+        return not failures
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Prefetch and optimize the remote images of a trips CSV')
+    parser.add_argument('csv', type=Path, help='sample_trips.csv-style file')
+    parser.add_argument('--output-csv', type=Path, default=None,
+                        help='rewritten CSV (default: <csv>.optimized.csv)')
+    parser.add_argument('--output-dir', type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help=f'variant directory, relative to the project root (default: {DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('--publish', action='store_true',
+                        help=f'afterwards copy the variants into {PUBLISH_DIR} (run after flutter build web)')
+    parser.add_argument('--public-url', default=DEFAULT_PUBLIC_URL,
+                        help=f'URL the variant directory is served from (default: {DEFAULT_PUBLIC_URL})')
+    parser.add_argument('--type', choices=['hero', 'card', 'gallery'], default='gallery',
+                        help='WebImageOptimizer size config to render (default: gallery)')
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS,
+                        help=f'concurrent downloads (default: {DEFAULT_CONNECTIONS})')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='encode worker processes (default: CPU count, 1 = single thread)')
+    parser.add_argument('--from-dir', type=Path, default=None,
+                        help='serve URLs from local files instead of the network (offline runs)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='download again even if an original is already cached')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='re-encode every variant, ignoring the build cache')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not args.csv.exists():
+        print(f"❌ CSV not found: {args.csv}")
+        sys.exit(1)
+
+    project_root = Path(__file__).parent.parent
+    prefetcher = RemoteImagePrefetcher(
+        project_root,
+        fetcher=DirectoryFetcher(args.from_dir) if args.from_dir else None,
+        output_dir=args.output_dir,
+        public_url=args.public_url,
+        image_type=args.type,
+        connections=args.connections,
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+        refresh=args.refresh,
+    )
+    success = prefetcher.run(args.csv, args.output_csv)
+
+    if args.publish:
+        if not (project_root / PUBLISH_DIR).parent.parent.exists():
+            print(f"ERROR: {PUBLISH_DIR.parent.parent} not found; run 'flutter build web' first")
+            sys.exit(1)
+        copied = prefetcher.publish()
+        print(f"Published {copied} files to {PUBLISH_DIR}")
+
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Offline data sources for the TripBasket sitemap
+- Reads local Firestore exports (JSON or NDJSON) and sample_trips.csv-style CSVs
+- Streams records lazily so the sitemap writer never holds the catalog in memory
+- Derives URL slugs from titles/names and lastmod from record timestamps
+"""
+
+import re
+import csv
+import json
+import unicodedata
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Firestore collections that map to sitemap sections
+TRIP_COLLECTIONS = {'trips'}
+AGENCY_COLLECTIONS = {'agency', 'agencies'}
+
+# Record fields checked for lastmod, most specific first
+TIMESTAMP_FIELDS = ['modified_at', 'updated_at', 'updatedAt', 'created_at', 'createdAt', 'lastmod']
+
+def slugify(text):
+    """'Egypt Dahab Adventure!' -> 'egypt-dahab-adventure'"""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+class SlugRegistry:
+    """Hands out unique slugs, suffixing the document id (or a counter) on collisions"""
+
+    def __init__(self):
+        self.seen = set()
+
+    def unique(self, text, doc_id=None):
+        base = slugify(text) or slugify(doc_id or '') or 'item'
+        slug = base
+        if slug in self.seen and doc_id:
+            slug = f"{base}-{slugify(doc_id)}"
+        counter = 2
+        while slug in self.seen:
+            slug = f"{base}-{counter}"
+            counter += 1
+        self.seen.add(slug)
+        return slug
+
+def normalize_timestamp(value):
+    """
+    Convert the timestamp shapes found in Firestore exports to YYYY-MM-DD:
+    ISO strings, epoch seconds/milliseconds, {'_seconds': ...},
+    {'__datatype__': 'timestamp', 'value': {...}} and REST {'timestampValue': ...}
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, dict):
+        if 'timestampValue' in value:
+            return normalize_timestamp(value['timestampValue'])
+        if value.get('__datatype__') == 'timestamp':
+            return normalize_timestamp(value.get('value'))
+        for key in ('_seconds', 'seconds'):
+            if key in value:
+                return normalize_timestamp(int(value[key]))
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        # Treat large values as milliseconds
+        seconds = value / 1000 if value > 1e11 else value
+        return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%d')
+    if isinstance(value, str):
+        text = value.strip()
+        if text.isdigit():
+            return normalize_timestamp(int(text))
+        try:
+            parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc)
+        return parsed.strftime('%Y-%m-%d')
+    return None
+
+def decode_rest_value(value):
+    """Unwrap a typed Firestore REST value ({'stringValue': ...}, {'mapValue': ...})"""
+    if not isinstance(value, dict) or len(value) != 1:
+        return value
+    kind, inner = next(iter(value.items()))
+    if kind == 'mapValue':
+        return {k: decode_rest_value(v) for k, v in inner.get('fields', {}).items()}
+    if kind == 'arrayValue':
+        return [decode_rest_value(v) for v in inner.get('values', [])]
+    if kind == 'timestampValue':
+        return inner
+    if kind == 'integerValue':
+        return int(inner)
+    if kind in ('stringValue', 'doubleValue', 'booleanValue', 'nullValue', 'referenceValue'):
+        return inner
+    return value
+
+def rest_document(document):
+    """(collection, doc_id, fields) for a REST-format document ({'name', 'fields', 'updateTime'})"""
+    segments = document['name'].split('/documents/', 1)[-1].split('/')
+    fields = {k: decode_rest_value(v) for k, v in document.get('fields', {}).items()}
+    if 'updateTime' in document:
+        fields.setdefault('updated_at', document['updateTime'])
+    return segments[-2], segments[-1], fields
+
+def iter_ndjson_documents(path):
+    """One document per line: REST format, or a plain dict with 'collection'/'id' keys"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            document = json.loads(line)
+            if 'name' in document and 'fields' in document:
+                yield rest_document(document)
+            else:
+                fields = dict(document)
+                collection = fields.pop('collection', None) or fields.pop('__collection__', 'trips')
+                doc_id = fields.pop('id', None) or fields.pop('__id__', None)
+                yield collection, doc_id, fields
+
+def iter_json_documents(path):
+    """
+    Whole-file JSON exports:
+    {'__collections__': {name: {id: doc}}} (node-firestore-import-export),
+    {name: {id: doc}} / {name: [doc, ...]} (Admin SDK dumps) or a list of REST documents.
+    Use NDJSON for exports too large to load at once.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, list):
+        for document in data:
+            yield rest_document(document)
+        return
+
+    collections = data.get('__collections__', data)
+    for collection, documents in collections.items():
+        if isinstance(documents, dict):
+            documents = [dict(doc, id=doc_id) for doc_id, doc in documents.items() if isinstance(doc, dict)]
+        for document in documents:
+            fields = {k: v for k, v in document.items() if k not in ('id', '__collections__')}
+            yield collection, document.get('id'), fields
+
+def iter_csv_documents(path, collection='trips'):
+    """Rows of a sample_trips.csv-style file (title, price, location, description, image, itinerary)"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            yield collection, row.get('id') or None, row
+
+def iter_documents(path):
+    """Dispatch on file extension"""
+    suffix = Path(path).suffix.lower()
+    if suffix == '.csv':
+        return iter_csv_documents(path)
+    if suffix in ('.ndjson', '.jsonl'):
+        return iter_ndjson_documents(path)
+    return iter_json_documents(path)
+
+def record_lastmod(fields):
+    """First parseable timestamp among TIMESTAMP_FIELDS"""
+    for key in TIMESTAMP_FIELDS:
+        lastmod = normalize_timestamp(fields.get(key))
+        if lastmod:
+            return lastmod
+    return None
+
+def iter_sitemap_records(paths):
+    """
+    Stream {'kind': 'trip'|'agency', 'slug', 'lastmod'} from local export files.
+    lastmod comes from the record's timestamps, falling back to the file's mtime.
+    """
+    slugs = {'trip': SlugRegistry(), 'agency': SlugRegistry()}
+
+    for path in paths:
+        file_date = datetime.fromtimestamp(Path(path).stat().st_mtime, timezone.utc).strftime('%Y-%m-%d')
+        for collection, doc_id, fields in iter_documents(path):
+            if collection in TRIP_COLLECTIONS:
+                kind, label = 'trip', fields.get('title')
+            elif collection in AGENCY_COLLECTIONS:
+                kind, label = 'agency', fields.get('name')
+            else:
+                continue
+
+            yield {
+                'kind': kind,
+                'slug': slugs[kind].unique(label or doc_id or '', doc_id),
+                'lastmod': record_lastmod(fields) or file_date,
+            }
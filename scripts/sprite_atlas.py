@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Sprite atlases for the TripBasket icons and badges
+- Collects the small images the optimizers deliberately skip (icons, favicons,
+  badges, anything under 10 KB) and packs them into one or a few atlases
+- Deterministic shelf packing: the same set of images always gives the same
+  layout and the same bytes, and unchanged atlases are not rewritten, so they
+  stay cache-stable between builds
+- Lossless WebP (or PNG) atlases with transparent padding between sprites
+- Writes the coordinate map to assets/images/optimized/sprite_atlas.json,
+  next to image_manifest.json
+"""
+
+import io
+import json
+import math
+import argparse
+from pathlib import Path
+
+from PIL import Image
+
+from file_index import find_files, PRUNED_DIRS, default_index_path
+from image_modes import normalize
+from auto_optimize_images import TripBasketImageOptimizer
+from optimize_web_images import WebImageOptimizer
+
+ATLAS_VERSION = 1
+
+SPRITE_EXTENSIONS = {'.png', '.webp', '.jpg', '.jpeg'}
+
+# Images with a longer side above this are pictures, not icons, whatever their size
+MAX_SPRITE_SIDE = 256
+
+# Largest atlas side; 2048 is safe for GPU texture limits on every target
+ATLAS_MAX_SIDE = 2048
+
+# Transparent pixels between sprites so filtering never samples a neighbour
+PADDING = 2
+
+ATLAS_FORMATS = {
+    'webp': {'extension': '.webp', 'save': {'format': 'WEBP', 'lossless': True, 'quality': 100, 'method': 6}},
+    'png': {'extension': '.png', 'save': {'format': 'PNG', 'optimize': True}},
+}
+
+
+def shelf_pack(boxes, max_side=ATLAS_MAX_SIDE, padding=PADDING):
+    """
+    Pack (name, width, height) boxes, tallest first, into shelves of as few
+    atlases as needed. Returns [{'width', 'height', 'placements': [(name, x, y)]}].
+    Ties are broken by name, so the layout depends only on the input set.
+    """
+    if not boxes:
+        return []
+    ordered = sorted(boxes, key=lambda box: (-box[2], -box[1], box[0]))
+
+    # Roughly square atlases: the power of two covering the padded area
+    area = sum((width + padding) * (height + padding) for _, width, height in ordered)
+    widest = max(width for _, width, _ in ordered)
+    atlas_width = 1
+    while atlas_width < max(widest, math.isqrt(area)) and atlas_width < max_side:
+        atlas_width *= 2
+
+    atlases = []
+    placements = []
+    x = y = shelf_height = 0
+    for name, width, height in ordered:
+        if x and x + width > atlas_width:
+            # Next shelf
+            x, y, shelf_height = 0, y + shelf_height + padding, 0
+        if y and y + height > max_side:
+            atlases.append(placements)
+            placements = []
+            x = y = shelf_height = 0
+        placements.append((name, x, y, width, height))
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+    atlases.append(placements)
+
+    return [{
+        'width': max(x + width for _, x, _, width, _ in placed),
+        'height': max(y + height for _, _, y, _, height in placed),
+        'placements': [(name, x, y) for name, x, y, _, _ in placed],
+    } for placed in atlases]
+
+
+class SpriteAtlasPacker:
+    """
+    Packs the images skipped by TripBasketImageOptimizer.should_optimize or
+    WebImageOptimizer.should_process into atlases under assets/images/optimized
+    """
+
+    def __init__(self, project_root, atlas_format='webp', max_side=ATLAS_MAX_SIDE,
+                 max_sprite_side=MAX_SPRITE_SIDE, optimizer=None, web=None, use_index=True):
+        self.project_root = Path(project_root)
+        self.assets_path = self.project_root / 'assets' / 'images'
+        self.optimizer = optimizer or TripBasketImageOptimizer(self.project_root, use_cache=False)
+        self.web = web or WebImageOptimizer(self.project_root, use_cache=False)
+        self.optimized_path = self.web.optimized_path
+        self.map_path = self.optimized_path / 'sprite_atlas.json'
+
+        self.atlas_format = atlas_format
+        self.max_side = max_side
+        self.max_sprite_side = max_sprite_side
+        self.index_path = default_index_path(self.project_root) if use_index else None
+
+        self.written = 0
+        self.unchanged = 0
+
+    def settings(self):
+        return {'version': ATLAS_VERSION, 'format': self.atlas_format, 'max_side': self.max_side,
+                'max_sprite_side': self.max_sprite_side, 'padding': PADDING}
+
+    def is_candidate(self, path):
+        """Whether a source is a sprite: skipped by an optimizer and small in both dimensions"""
+        if path.suffix.lower() not in SPRITE_EXTENSIONS or self.optimized_path in path.parents:
+            return False
+        if self.optimizer.should_optimize(path) and self.web.should_process(path):
+            return False
+        try:
+            with Image.open(path) as img:
+                return max(img.size) <= self.max_sprite_side
+        except OSError:
+            return False
+
+    def collect(self):
+        """Sprite sources in sorted order; a PNG converted in place to WebP is packed once"""
+        paths = [path for path in find_files(self.assets_path, SPRITE_EXTENSIONS,
+                                             PRUNED_DIRS | {self.optimized_path.name}, self.index_path)
+                 if self.is_candidate(path)]
+        chosen = {}
+        for path in sorted(paths):
+            stem = path.with_suffix('')
+            if stem not in chosen or path.suffix.lower() == '.png':
+                chosen[stem] = path
+        return sorted(chosen.values())
+
+    def atlas_path(self, index):
+        return self.optimized_path / f"sprites_{index}{ATLAS_FORMATS[self.atlas_format]['extension']}"
+
+    def render(self, layout, sprites):
+        """Encode one atlas from its layout; returns the file bytes"""
+        atlas = Image.new('RGBA', (layout['width'], layout['height']), (0, 0, 0, 0))
+        for name, x, y in layout['placements']:
+            atlas.paste(sprites[name], (x, y))
+        buffer = io.BytesIO()
+        atlas.save(buffer, **ATLAS_FORMATS[self.atlas_format]['save'])
+        return buffer.getvalue()
+
+    def write_if_changed(self, path, data):
+        """Write data unless the file already holds exactly these bytes (keeps its mtime and ETag)"""
+        if path.exists() and path.read_bytes() == data:
+            self.unchanged += 1
+            return
+        path.write_bytes(data)
+        self.written += 1
+
+    def pack(self):
+        """Collect, pack and write the atlases and sprite_atlas.json; returns the map"""
+        self.written = self.unchanged = 0
+        sprites = {}
+        for path in self.collect():
+            with Image.open(path) as img:
+                img.load()
+                sprites[path.relative_to(self.assets_path).as_posix()] = normalize(img, keep_alpha=True)
+
+        layouts = shelf_pack([(name, img.width, img.height) for name, img in sprites.items()],
+                             self.max_side, PADDING)
+
+        self.optimized_path.mkdir(parents=True, exist_ok=True)
+        atlas_map = {'settings': self.settings(), 'atlases': [], 'sprites': {}}
+        for index, layout in enumerate(layouts):
+            path = self.atlas_path(index)
+            data = self.render(layout, sprites)
+            self.write_if_changed(path, data)
+            atlas_file = path.relative_to(self.assets_path).as_posix()
+            atlas_map['atlases'].append({'file': atlas_file, 'width': layout['width'],
+                                         'height': layout['height'], 'file_size': len(data),
+                                         'sprites': len(layout['placements'])})
+            for name, x, y in layout['placements']:
+                atlas_map['sprites'][name] = {'atlas': atlas_file, 'x': x, 'y': y,
+                                              'width': sprites[name].width, 'height': sprites[name].height}
+        atlas_map['sprites'] = dict(sorted(atlas_map['sprites'].items()))
+
+        # Atlases left over from a larger previous set
+        for stale in sorted(self.optimized_path.glob('sprites_*.*')):
+            if stale.name not in {Path(atlas['file']).name for atlas in atlas_map['atlases']}:
+                stale.unlink()
+
+        map_data = (json.dumps(atlas_map, indent=2) + '\n').encode('utf-8')
+        if not (self.map_path.exists() and self.map_path.read_bytes() == map_data):
+            self.map_path.write_bytes(map_data)
+        return atlas_map
+
+    def summary(self, atlas_map):
+        return (f"Sprite atlas: {len(atlas_map['sprites'])} images in {len(atlas_map['atlases'])} atlases "
+                f"({self.written} written, {self.unchanged} unchanged)")
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Pack TripBasket icons and badges into sprite atlases')
+    parser.add_argument('--format', choices=sorted(ATLAS_FORMATS), default='webp',
+                        help='atlas format (default: lossless webp)')
+    parser.add_argument('--max-side', type=int, default=ATLAS_MAX_SIDE,
+                        help=f'largest atlas width/height in pixels (default: {ATLAS_MAX_SIDE})')
+    parser.add_argument('--max-sprite-side', type=int, default=MAX_SPRITE_SIDE,
+                        help=f'images larger than this are not packed (default: {MAX_SPRITE_SIDE})')
+    parser.add_argument('--no-index', action='store_true',
+                        help='list every directory again instead of reusing the file index')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    project_root = Path(__file__).parent.parent
+    print(f"Project root: {project_root}")
+
+    packer = SpriteAtlasPacker(project_root, atlas_format=args.format, max_side=args.max_side,
+                               max_sprite_side=args.max_sprite_side, use_index=not args.no_index)
+    atlas_map = packer.pack()
+
+    for atlas in atlas_map['atlases']:
+        print(f"   {atlas['file']}: {atlas['width']}x{atlas['height']}, "
+              f"{atlas['sprites']} sprites, {atlas['file_size']:,} bytes")
+    print(packer.summary(atlas_map))
+    print(f"Coordinate map saved: {packer.map_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""
+Shared setup for the image script tests
+- The scripts import each other as top-level modules, so scripts/ goes on sys.path
+- Run with: python -m pytest scripts/tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,74 @@
+"""
+file_index.py: cached directory listings reused while a directory's mtime
+is unchanged, and relisted once it changes
+"""
+
+import os
+
+import pytest
+
+from file_index import FileIndex
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'assets'
+    (root / 'images' / 'trips').mkdir(parents=True)
+    (root / 'images' / 'hero.jpg').write_bytes(b'jpeg')
+    (root / 'images' / 'trips' / 'beach.png').write_bytes(b'png')
+    (root / 'images' / 'notes.txt').write_text('skipped')
+    (root / 'node_modules').mkdir()
+    (root / 'node_modules' / 'icon.png').write_bytes(b'png')
+    return root
+
+
+def scan(root, index_path):
+    index = FileIndex(root, ['.jpg', '.png'], index_path=index_path)
+    return index, index.paths()
+
+
+def touch_dir(path):
+    """Move a directory's mtime forward, as adding or removing an entry does"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_first_scan_lists_every_directory(tree, tmp_path):
+    index, paths = scan(tree, tmp_path / 'index.json')
+    assert paths == [tree / 'images' / 'hero.jpg', tree / 'images' / 'trips' / 'beach.png']
+    assert (index.listed, index.reused) == (3, 0)
+
+
+def test_unchanged_directories_reuse_their_listing(tree, tmp_path):
+    _, first = scan(tree, tmp_path / 'index.json')
+    index, second = scan(tree, tmp_path / 'index.json')
+    assert second == first
+    assert (index.listed, index.reused) == (0, 3)
+
+
+def test_changed_directory_is_listed_again(tree, tmp_path):
+    scan(tree, tmp_path / 'index.json')
+    (tree / 'images' / 'trips' / 'dahab.jpg').write_bytes(b'jpeg')
+    touch_dir(tree / 'images' / 'trips')
+
+    index, paths = scan(tree, tmp_path / 'index.json')
+    assert tree / 'images' / 'trips' / 'dahab.jpg' in paths
+    assert (index.listed, index.reused) == (1, 2)
+
+
+def test_removed_directories_are_forgotten(tree, tmp_path):
+    scan(tree, tmp_path / 'index.json')
+    (tree / 'images' / 'trips' / 'beach.png').unlink()
+    (tree / 'images' / 'trips').rmdir()
+    touch_dir(tree / 'images')
+
+    index, paths = scan(tree, tmp_path / 'index.json')
+    assert paths == [tree / 'images' / 'hero.jpg']
+    assert 'images/trips' not in index.directories
+
+
+def test_different_settings_do_not_share_listings(tree, tmp_path):
+    scan(tree, tmp_path / 'index.json')
+    index = FileIndex(tree, ['.txt'], index_path=tmp_path / 'index.json')
+    assert index.paths() == [tree / 'images' / 'notes.txt']
+    assert index.reused == 0
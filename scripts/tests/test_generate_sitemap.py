@@ -0,0 +1,56 @@
+"""
+generate_sitemap.py: shard rollover at the URL and byte limits, and
+incremental rewrites
+"""
+
+from generate_sitemap import SitemapWriter
+
+
+def write(output_dir, count, state=None, **limits):
+    writer = SitemapWriter(output_dir, state=state, **limits)
+    with writer:
+        for number in range(count):
+            writer.add(f"https://example.com/trips/{number}", lastmod='2026-01-01')
+    return writer
+
+
+def test_single_shard_is_published_as_sitemap_xml(tmp_path):
+    writer = write(tmp_path, 3, max_urls=10)
+    assert [shard['path'].name for shard in writer.shards] == ['sitemap.xml']
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['sitemap.xml']
+
+
+def test_rolls_over_at_the_url_limit(tmp_path):
+    writer = write(tmp_path, 5, max_urls=2)
+    assert [shard['urls'] for shard in writer.shards] == [2, 2, 1]
+    assert [shard['path'].name for shard in writer.shards] == ['sitemap-1.xml', 'sitemap-2.xml', 'sitemap-3.xml']
+    assert not list(tmp_path.glob('*.tmp'))
+    for shard in writer.shards:
+        text = shard['path'].read_text(encoding='utf-8')
+        assert text.startswith('<?xml') and text.endswith('</urlset>\n')
+        assert text.count('<url>') == shard['urls']
+
+
+def test_rolls_over_before_the_byte_limit(tmp_path):
+    entry_bytes = len(write(tmp_path / 'one', 1).shards[0]['path'].read_bytes())
+    # Room for the header, footer and two entries but not three
+    writer = write(tmp_path / 'many', 5, max_bytes=entry_bytes * 2)
+    assert all(shard['path'].stat().st_size <= entry_bytes * 2 for shard in writer.shards)
+    assert sum(shard['urls'] for shard in writer.shards) == 5
+    assert len(writer.shards) > 1
+
+
+def test_unchanged_shards_are_not_rewritten(tmp_path):
+    first = write(tmp_path, 5, max_urls=2)
+    second = write(tmp_path, 5, max_urls=2, state=first.state())
+    assert [shard['changed'] for shard in second.shards] == [False, False, False]
+
+    # One more URL only changes the last shard
+    third = write(tmp_path, 6, max_urls=2, state=second.state())
+    assert [shard['changed'] for shard in third.shards] == [False, False, True]
+
+
+def test_shards_from_a_larger_run_are_removed(tmp_path):
+    write(tmp_path, 5, max_urls=2)
+    write(tmp_path, 1, max_urls=2)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['sitemap.xml']
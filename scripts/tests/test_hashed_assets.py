@@ -0,0 +1,31 @@
+"""
+hashed_assets.py: which published copies a new content hash supersedes
+"""
+
+from hashed_assets import superseded, hashed_name
+
+
+def test_older_copies_and_their_sidecars_are_superseded(tmp_path):
+    source = tmp_path / 'beach_md.webp'
+    source.write_bytes(b'new content')
+    current = tmp_path / 'published' / hashed_name(source)
+    current.parent.mkdir()
+    for name in [current.name, current.name + '.br', 'beach_md.0123456789.webp',
+                 'beach_md.0123456789.webp.gz', 'beach_md.abcdefabcd.webp.zst']:
+        (current.parent / name).write_bytes(b'')
+
+    assert [path.name for path in superseded(source, current)] == [
+        'beach_md.0123456789.webp', 'beach_md.0123456789.webp.gz', 'beach_md.abcdefabcd.webp.zst']
+
+
+def test_other_images_and_formats_are_left_alone(tmp_path):
+    source = tmp_path / 'beach_md.webp'
+    source.write_bytes(b'content')
+    current = tmp_path / hashed_name(source)
+    for name in ['beach_md.0123456789.avif',     # another format of the same variant
+                 'beach_md.extra.0123456789.webp',  # another image sharing the prefix
+                 'beach_md.webp.br',             # the logical file's sidecar
+                 'beach_md.nothex1234.webp']:
+        (tmp_path / name).write_bytes(b'')
+
+    assert superseded(source, current) == []
@@ -0,0 +1,39 @@
+"""
+image_dedup.py: pairwise Hamming distances between perceptual hashes
+"""
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+from image_dedup import hamming_matrix
+import image_dedup
+
+
+def test_distances_count_differing_bits():
+    hashes = ['0000000000000000', '0000000000000001', 'ffffffffffffffff', '8000000000000003']
+    distances = hamming_matrix(hashes)
+    assert distances.shape == (4, 4)
+    assert distances[0, 1] == 1
+    assert distances[0, 2] == 64
+    assert distances[0, 3] == 3
+    assert distances[1, 3] == 2
+    assert distances[2, 3] == 61
+
+
+def test_distances_are_symmetric_with_a_zero_diagonal():
+    hashes = ['0123456789abcdef', 'fedcba9876543210', '0f0f0f0f0f0f0f0f']
+    distances = hamming_matrix(hashes)
+    assert (distances == distances.T).all()
+    assert (numpy.diag(distances) == 0).all()
+
+
+def test_blocked_rows_match_a_direct_count(monkeypatch):
+    # Several row blocks, including a partial last one
+    monkeypatch.setattr(image_dedup, 'DISTANCE_BLOCK', 3)
+    values = [(0x9e3779b97f4a7c15 * (i + 1)) % 2 ** 64 for i in range(8)]
+    distances = hamming_matrix([f"{value:016x}" for value in values])
+    for i, a in enumerate(values):
+        for j, b in enumerate(values):
+            assert distances[i, j] == bin(a ^ b).count('1')
@@ -0,0 +1,58 @@
+"""
+image_formats.py: the capped quality grid and the bisecting quality search
+"""
+
+import pytest
+
+pytest.importorskip('PIL')
+
+from image_formats import capped_grid, search_quality, QUALITY_GRID
+
+
+def test_capped_grid_ends_at_the_cap():
+    assert capped_grid(55) == [30, 35, 40, 45, 50, 55]
+    assert capped_grid(62) == [30, 35, 40, 45, 50, 55, 60, 62]
+
+
+def test_capped_grid_below_the_grid_is_the_cap_alone():
+    assert capped_grid(20) == [20]
+
+
+def test_capped_grid_without_a_cap_is_the_whole_grid():
+    grid = capped_grid(None)
+    assert grid == QUALITY_GRID
+    assert grid is not QUALITY_GRID
+
+
+def search(target, grid=QUALITY_GRID):
+    """search_quality over fake encodes whose score is the quality itself"""
+    encoded = []
+
+    def encode_at(quality):
+        encoded.append(quality)
+        return bytes(quality)
+
+    return search_quality(encode_at, len, target, grid), encoded
+
+
+def test_search_finds_the_lowest_quality_meeting_the_target():
+    result, encoded = search(target=52)
+    assert result['quality'] == 55
+    assert result['score'] == 55
+    assert result['data'] == bytes(55)
+    assert result['meets_target']
+    # Bisection, not a linear scan of the grid
+    assert len(encoded) <= 4
+
+
+def test_search_takes_the_bottom_of_the_grid_when_everything_passes():
+    result, _ = search(target=0)
+    assert result['quality'] == QUALITY_GRID[0]
+    assert result['meets_target']
+
+
+def test_search_returns_the_highest_attempt_when_nothing_passes():
+    result, encoded = search(target=1000, grid=capped_grid(65))
+    assert result['quality'] == 65
+    assert not result['meets_target']
+    assert max(encoded) == 65
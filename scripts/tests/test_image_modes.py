@@ -0,0 +1,78 @@
+"""
+image_modes.py: 16-bit and float greyscale rescaling, and alpha flattening
+"""
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from image_modes import to_8bit, flatten, normalize
+
+
+def test_16bit_greyscale_is_rescaled_instead_of_clipped():
+    img = Image.new('I;16', (2, 1))
+    img.putpixel((0, 0), 0)
+    img.putpixel((1, 0), 65535)
+    result = to_8bit(img)
+    assert result.mode == 'L'
+    assert [result.getpixel((0, 0)), result.getpixel((1, 0))] == [0, 255]
+
+
+def test_16bit_values_are_scaled_to_the_full_16bit_range_not_the_image_maximum():
+    img = Image.new('I', (1, 1), 13107)
+    assert to_8bit(img).getpixel((0, 0)) == 51
+
+
+def test_8bit_range_values_are_kept():
+    img = Image.new('F', (2, 1))
+    img.putpixel((0, 0), 10.0)
+    img.putpixel((1, 0), 200.0)
+    result = to_8bit(img)
+    assert [result.getpixel((0, 0)), result.getpixel((1, 0))] == [10, 200]
+
+
+def test_other_modes_pass_through():
+    img = Image.new('RGB', (1, 1))
+    assert to_8bit(img) is img
+
+
+def reference_flatten(img, background):
+    """Composite via an RGBA copy, as flatten() did before it worked from the source mode"""
+    rgba = img.convert('RGBA')
+    canvas = Image.new('RGB', img.size, background)
+    canvas.paste(rgba, (0, 0), rgba)
+    return canvas
+
+
+def half_transparent(mode):
+    img = Image.new('RGBA', (4, 2), (200, 40, 90, 0))
+    img.putpixel((1, 0), (10, 250, 30, 128))
+    img.putpixel((2, 1), (60, 60, 60, 255))
+    return img.convert(mode) if mode != 'RGBA' else img
+
+
+@pytest.mark.parametrize('mode', ['RGBA', 'LA', 'PA', 'RGBa'])
+def test_flatten_matches_compositing_an_rgba_copy(mode):
+    img = half_transparent(mode)
+    assert flatten(img, (0, 128, 255)).tobytes() == reference_flatten(img, (0, 128, 255)).tobytes()
+
+
+@pytest.mark.parametrize('transparency', [3, bytes([0, 64, 128, 255, 32])])
+def test_flatten_blends_palette_transparency(transparency):
+    img = Image.new('P', (5, 1))
+    img.putpalette([0, 0, 0, 255, 0, 0, 0, 255, 0, 0, 0, 255, 9, 9, 9])
+    img.putdata([0, 1, 2, 3, 4])
+    img.info['transparency'] = transparency
+    result = flatten(img, (255, 255, 255))
+    assert result.mode == 'RGB'
+    assert result.tobytes() == reference_flatten(img, (255, 255, 255)).tobytes()
+    # The caller's image keeps its transparency
+    assert img.info['transparency'] == transparency
+
+
+def test_normalize_keeps_alpha_only_when_asked():
+    img = half_transparent('RGBA')
+    assert normalize(img).mode == 'RGB'
+    assert normalize(img, keep_alpha=True).mode == 'RGBA'
+    opaque = Image.new('RGBA', (2, 2), (1, 2, 3, 255))
+    assert normalize(opaque, keep_alpha=True).mode == 'RGB'
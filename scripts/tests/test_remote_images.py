@@ -0,0 +1,119 @@
+"""
+remote_images.py against a local http.server: 404s, the keep-alive
+reconnect and the rewritten CSV
+"""
+
+import io
+import csv
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from remote_images import PooledHTTPFetcher, RemoteImagePrefetcher, FetchError, DEFAULT_PUBLIC_URL
+
+
+def jpeg_bytes(size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Serves server.files over keep-alive; with server.drop_reused, hangs up on a reused connection"""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.served = 0
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.server.drop_reused and self.served:
+            # Like a server closing an idle keep-alive connection: no response at all
+            self.close_connection = True
+            return
+        self.served += 1
+        self.server.requests.append(self.path)
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    httpd.files = {'/beach.jpg': jpeg_bytes()}
+    httpd.drop_reused = False
+    httpd.connections = 0
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_reuses_keep_alive_connection(server):
+    fetcher = PooledHTTPFetcher(timeout=5)
+    assert fetcher.fetch(server.url + '/beach.jpg') == server.files['/beach.jpg']
+    assert fetcher.fetch(server.url + '/beach.jpg') == server.files['/beach.jpg']
+    assert server.connections == 1
+
+
+def test_fetch_reconnects_once_when_server_drops_idle_connection(server):
+    server.drop_reused = True
+    fetcher = PooledHTTPFetcher(timeout=5)
+    fetcher.fetch(server.url + '/beach.jpg')
+    assert fetcher.fetch(server.url + '/beach.jpg') == server.files['/beach.jpg']
+    assert server.connections == 2
+    assert len(server.requests) == 2
+
+
+def test_fetch_404_raises_fetch_error(server):
+    with pytest.raises(FetchError, match='HTTP 404'):
+        PooledHTTPFetcher(timeout=5).fetch(server.url + '/missing.jpg')
+
+
+def test_run_rewrites_csv_and_keeps_failed_rows(server, tmp_path):
+    csv_path = tmp_path / 'trips.csv'
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['title', 'image'])
+        writer.writerow(['Beach', server.url + '/beach.jpg'])
+        writer.writerow(['Gone', server.url + '/missing.jpg'])
+        writer.writerow(['Local', 'assets/images/card.jpg'])
+
+    prefetcher = RemoteImagePrefetcher(tmp_path, fetcher=PooledHTTPFetcher(timeout=5), jobs=1,
+                                       connections=2, use_cache=False)
+    output_csv = tmp_path / 'trips.optimized.csv'
+    assert prefetcher.run(csv_path, output_csv) is False
+
+    with open(output_csv, encoding='utf-8', newline='') as f:
+        rows = {row['title']: row['image'] for row in csv.DictReader(f)}
+    assert rows['Beach'].startswith(DEFAULT_PUBLIC_URL + '/')
+    assert rows['Gone'] == server.url + '/missing.jpg'
+    assert rows['Local'] == 'assets/images/card.jpg'
+
+    # The largest variant the CSV points at exists, under build/ rather than web/
+    variant = rows['Beach'][len(DEFAULT_PUBLIC_URL) + 1:]
+    assert (prefetcher.output_dir / variant).is_file()
+    assert (tmp_path / 'build') in prefetcher.output_dir.parents
+    assert not (tmp_path / 'web').exists()
+
+    assert prefetcher.publish() > 0
+    assert (tmp_path / 'build' / 'web' / 'images' / 'trips' / variant).is_file()
@@ -0,0 +1,69 @@
+"""
+InotifyWatcher: files and watches that go away with a deleted or moved-out directory
+"""
+
+import sys
+import shutil
+
+import pytest
+
+from watch_assets import InotifyWatcher
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'images'
+    (root / 'trips' / 'egypt').mkdir(parents=True)
+    (root / 'trips' / 'beach.jpg').write_bytes(b'jpeg')
+    (root / 'trips' / 'egypt' / 'dahab.webp').write_bytes(b'webp')
+    (root / 'logo.png').write_bytes(b'png')
+    return root
+
+
+def drain(watcher):
+    changed = set()
+    while True:
+        more = watcher.changes(0.2)
+        if not more:
+            return changed
+        changed |= more
+
+
+def test_deleted_directory_reports_its_files_and_drops_its_watches(tree):
+    watcher = InotifyWatcher(tree, ['.jpg', '.png', '.webp'], set())
+    try:
+        shutil.rmtree(tree / 'trips')
+        assert drain(watcher) == {tree / 'trips' / 'beach.jpg', tree / 'trips' / 'egypt' / 'dahab.webp'}
+        assert set(watcher.watches.values()) == {tree}
+        assert watcher.files == {tree / 'logo.png'}
+    finally:
+        watcher.close()
+
+
+def test_moved_out_directory_is_no_longer_watched(tree, tmp_path):
+    watcher = InotifyWatcher(tree, ['.jpg', '.png', '.webp'], set())
+    try:
+        (tree / 'trips').rename(tmp_path / 'archive')
+        assert drain(watcher) == {tree / 'trips' / 'beach.jpg', tree / 'trips' / 'egypt' / 'dahab.webp'}
+        assert set(watcher.watches.values()) == {tree}
+
+        # Writes at the new location are outside the tree
+        (tmp_path / 'archive' / 'new.jpg').write_bytes(b'jpeg')
+        assert drain(watcher) == set()
+    finally:
+        watcher.close()
+
+
+def test_moved_in_directory_reports_its_files(tree, tmp_path):
+    incoming = tmp_path / 'incoming'
+    incoming.mkdir()
+    (incoming / 'card.jpg').write_bytes(b'jpeg')
+    watcher = InotifyWatcher(tree, ['.jpg', '.png', '.webp'], set())
+    try:
+        incoming.rename(tree / 'incoming')
+        assert drain(watcher) == {tree / 'incoming' / 'card.jpg'}
+        assert tree / 'incoming' in watcher.watches.values()
+    finally:
+        watcher.close()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Watch mode for the TripBasket asset pipeline
+- Watches assets/images with inotify (Linux, via ctypes) or by polling
+- Debounces bursts of events (copies, exports and unzips write in several steps)
+- Re-runs the pipeline on added/changed sources only, removes the outputs of
+  deleted sources and updates image_manifest.json incrementally
+"""
+
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+from pathlib import Path
+
+from file_index import FileIndex, PRUNED_DIRS
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Files are reported once fully written (CLOSE_WRITE) rather than on every write
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct('iIII')
+
+# Seconds without events before a batch is processed
+DEFAULT_DEBOUNCE = 0.5
+
+# Upper bound on how long a continuous burst can delay processing
+MAX_BATCH_WAIT = 10.0
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Returned instead of paths when events were lost; the caller rescans everything
+RESCAN = object()
+
+
+class InotifyWatcher:
+    """Recursive inotify watch over a directory tree (Linux only)"""
+
+    kind = 'inotify'
+
+    def __init__(self, root, extensions, pruned_dirs):
+        self.root = Path(root)
+        self.extensions = {ext.lower() for ext in extensions}
+        self.pruned_dirs = set(pruned_dirs)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+        # Matching files known to be in the tree, so a directory that is
+        # deleted or moved out can report the files that went with it
+        self.files = set()
+        self.add_tree(self.root)
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+        self.watches[wd] = Path(directory)
+
+    def add_tree(self, root):
+        """Watch root and its unpruned subdirectories; return the matching files already in them"""
+        found = set()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if name not in self.pruned_dirs]
+            self.add_watch(dirpath)
+            found.update(Path(dirpath) / name for name in filenames
+                         if os.path.splitext(name)[1].lower() in self.extensions)
+        self.files |= found
+        return found
+
+    def remove_tree(self, root):
+        """Stop watching root and its subdirectories; return the matching files known to be in them"""
+        for wd, directory in list(self.watches.items()):
+            if directory == root or root in directory.parents:
+                # Fails harmlessly if the kernel already dropped it (IN_IGNORED)
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+        gone = {path for path in self.files if root in path.parents}
+        self.files -= gone
+        return gone
+
+    def changes(self, timeout):
+        """Paths created, written, moved or deleted within timeout seconds (or RESCAN)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0'))
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                return RESCAN
+            if mask & IN_IGNORED:
+                # The watched directory is gone (or was unwatched)
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / name
+            if mask & IN_ISDIR:
+                # A directory moved or copied in brings its files with it; one
+                # deleted or moved out takes them away (and its watches with it)
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in self.pruned_dirs:
+                    changed.update(self.add_tree(path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    changed.update(self.remove_tree(path))
+                continue
+            if mask & IN_CREATE:
+                # Wait for the CLOSE_WRITE of the same file
+                continue
+            if path.suffix.lower() in self.extensions:
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.files.discard(path)
+                else:
+                    self.files.add(path)
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback watcher comparing (size, mtime) snapshots of the tree"""
+
+    kind = 'polling'
+
+    def __init__(self, root, extensions, pruned_dirs, interval=DEFAULT_POLL_INTERVAL):
+        self.index = FileIndex(root, extensions, pruned_dirs)
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        return {path: (size, mtime_ns) for path, size, mtime_ns in self.index.scan()}
+
+    def changes(self, timeout):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = self.scan()
+        changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                   if snapshot.get(path) != self.snapshot.get(path)}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, extensions, pruned_dirs, polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """inotify where available, otherwise polling"""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root, extensions, pruned_dirs)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), polling every {poll_interval:g}s instead")
+    return PollingWatcher(root, extensions, pruned_dirs, poll_interval)
+
+
+def next_batch(watcher, debounce, poll_interval):
+    """Block until something changes, then gather events until debounce seconds pass quietly"""
+    changed = set()
+    while not changed:
+        changed = watcher.changes(poll_interval)
+    deadline = time.monotonic() + MAX_BATCH_WAIT
+    while changed is not RESCAN and time.monotonic() < deadline:
+        more = watcher.changes(debounce)
+        if not more:
+            break
+        changed = RESCAN if more is RESCAN else changed | more
+    return changed
+
+
+def process_batch(pipeline, changed):
+    """Run the pipeline for changed sources and clean up after deleted ones"""
+    if changed is RESCAN:
+        print(f"\n[{time.strftime('%H:%M:%S')}] Events were dropped, rescanning everything")
+        pipeline.run()
+        return
+
+    existing = sorted(path for path in changed if path.exists())
+    deleted = sorted(path for path in changed if not path.exists())
+    print(f"\n[{time.strftime('%H:%M:%S')}] {len(existing)} added/changed, {len(deleted)} deleted")
+
+    for path in deleted:
+        # Duplicates of a deleted canonical source need their own outputs again
+        duplicates = pipeline.duplicates_of(path)
+        removed = pipeline.remove_source(path)
+        print(f"Removed {path.name}: {len(removed)} orphaned outputs deleted")
+        existing = sorted(set(existing) | set(duplicates))
+    if existing:
+        pipeline.run(sources=existing)
+    elif deleted:
+        # A deleted icon still has to leave its atlas
+        pipeline.pack_atlases()
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def written_outputs(pipeline):
+    """
+    {path: (size, mtime_ns)} of the files the last run wrote into the watched
+    tree (the webp target converts in place), so their events can be ignored
+    """
+    written = {}
+    for _, outputs, results in pipeline.records:
+        for output, result in zip(outputs, results):
+            if not result['success']:
+                continue
+            for path in output['paths']:
+                if pipeline.assets_path in path.parents and pipeline.web.optimized_path not in path.parents:
+                    written[path] = file_signature(path)
+    return written
+
+
+def watch(pipeline, debounce=DEFAULT_DEBOUNCE, polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Watch the pipeline's assets directory until interrupted"""
+    from asset_pipeline import IMAGE_EXTENSIONS
+
+    # Outputs land in optimized/; watching it would feed the pipeline its own files
+    pruned_dirs = PRUNED_DIRS | {pipeline.web.optimized_path.name}
+    watcher = make_watcher(pipeline.assets_path, IMAGE_EXTENSIONS, pruned_dirs, polling, poll_interval)
+    print(f"\nWatching {pipeline.assets_path} ({watcher.kind}), Ctrl+C to stop")
+
+    # Files the pipeline itself wrote, ignored while they are as it left them
+    own = {}
+    try:
+        while True:
+            changed = next_batch(watcher, debounce, poll_interval)
+            if changed is not RESCAN:
+                changed = {path for path in changed if path not in own or file_signature(path) != own[path]}
+                if not changed:
+                    continue
+            try:
+                pipeline.reset()
+                process_batch(pipeline, changed)
+                own.update(written_outputs(pipeline))
+            except Exception as e:
+                print(f"❌ Pipeline run failed: {e}")
+            print(f"\nWatching {pipeline.assets_path} ({watcher.kind}), Ctrl+C to stop")
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        watcher.close()
@@ -2,39 +2,41 @@
 // Targets: TBT < 500ms, Speed Index < 5s
 const CACHE_NAME = 'tripbasket-v2.0-perf';
 const ASSETS_CACHE = 'tripbasket-assets-v2.0';
+const PRECACHE_CACHE = 'tripbasket-precache-v2.0';
 
-// Critical resources for immediate caching
-const CRITICAL_RESOURCES = [
-  '/',
-  '/main.dart.js',
-  '/flutter.js',
-  '/runtime.js', // Split bundle
-  '/vendor.js',  // Split bundle
-  '/app.js',     // Split bundle
-  '/manifest.json',
-  '/favicon.png'
-];
+// Precache manifest ({url, revision, size}): app shell files that exist in
+// the build plus hero variants within a byte budget. Filled in at build time
+// by scripts/precache_manifest.py, which writes the result into build/web
+const PRECACHE_MANIFEST = [];
+const PRECACHE_VERSION = 'dev';
+
+// Cache key per precached URL; revisioned so only changed files are refetched
+// (content-hashed URLs carry no revision)
+const PRECACHE_KEYS = new Map(PRECACHE_MANIFEST.map(entry => [
+  entry.url,
+  entry.revision ? `${entry.url}?__rev=${entry.revision}` : entry.url
+]));
 
 // Asset patterns for performance-first caching
 const ASSET_PATTERNS = [
   /\.(?:js|css|woff2|webp)$/,
-  /\/assets\/images\/optimized\//,
+  /\/images\/optimized\//, // Bundled (/assets/assets/images/...) and hashed copies
   /\/icons\//
 ];
 
+// Content-hashed images (scripts/hashed_assets.py) never change under their URL;
+// other optimized images keep their name when re-encoded, so they are revalidated
+const HASHED_IMAGE = /\.[0-9a-f]{10}\.(?:webp|avif|jpe?g|png)$/;
+const OPTIMIZED_IMAGE = /\/assets\/images\/optimized\//;
+
 // Performance-optimized install
 self.addEventListener('install', event => {
   console.log('🚀 SW: Installing performance-optimized service worker');
   
   event.waitUntil(
     Promise.all([
-      // Cache critical resources immediately
-      caches.open(CACHE_NAME).then(cache => {
-        console.log('🎯 SW: Caching critical resources');
-        return cache.addAll(CRITICAL_RESOURCES.map(url => new Request(url, {
-          cache: 'reload' // Always get fresh versions during install
-        })));
-      }),
+      // Precache the manifest entries not already cached at their revision
+      precacheManifest(),
       
       // Open assets cache
       caches.open(ASSETS_CACHE)
@@ -65,6 +67,9 @@ self.addEventListener('activate', event => {
         return Promise.all(deletions);
       }),
       
+      // Drop precached files no longer in the manifest (or at an old revision)
+      prunePrecache(),
+      
       // Take control of all clients immediately
       self.clients.claim()
     ]).then(() => {
@@ -90,19 +95,9 @@ self.addEventListener('fetch', event => {
     return;
   }
   
-  // Critical resources: Cache-first with network fallback
-  if (CRITICAL_RESOURCES.includes(url.pathname) || url.pathname === '/') {
-    event.respondWith(cacheFirstStrategy(request));
-    return;
-  }
-  
-  // Split bundle files: Cache-first
-  if (url.pathname.endsWith('.js') && (
-    url.pathname.includes('runtime.js') || 
-    url.pathname.includes('vendor.js') || 
-    url.pathname.includes('app.js')
-  )) {
-    event.respondWith(cacheFirstStrategy(request));
+  // Precached resources: served from the precache, network as fallback
+  if (PRECACHE_KEYS.has(url.pathname)) {
+    event.respondWith(precacheFirst(request, PRECACHE_KEYS.get(url.pathname)));
     return;
   }
   
@@ -116,6 +111,51 @@ self.addEventListener('fetch', event => {
   event.respondWith(networkFirstWithFallback(request));
 });
 
+// Fetch the manifest entries missing from the precache
+async function precacheManifest() {
+  const cache = await caches.open(PRECACHE_CACHE);
+  const cached = new Set((await cache.keys()).map(request => {
+    const url = new URL(request.url);
+    return url.pathname + url.search;
+  }));
+  const missing = PRECACHE_MANIFEST.filter(entry => !cached.has(PRECACHE_KEYS.get(entry.url)));
+  
+  await Promise.all(missing.map(async entry => {
+    // Always get fresh versions during install
+    const response = await fetch(new Request(entry.url, { cache: 'reload' }));
+    if (!response.ok) {
+      throw new Error(`${entry.url}: HTTP ${response.status}`);
+    }
+    await cache.put(PRECACHE_KEYS.get(entry.url), response);
+  }));
+  
+  const bytes = missing.reduce((total, entry) => total + entry.size, 0);
+  console.log(`🎯 SW: Precache ${PRECACHE_VERSION}: fetched ${missing.length} of ` +
+              `${PRECACHE_MANIFEST.length} resources (${bytes} bytes)`);
+}
+
+// Delete precache entries the current manifest doesn't list
+async function prunePrecache() {
+  const cache = await caches.open(PRECACHE_CACHE);
+  const wanted = new Set(PRECACHE_KEYS.values());
+  const stale = (await cache.keys()).filter(request => {
+    const url = new URL(request.url);
+    return !wanted.has(url.pathname + url.search);
+  });
+  await Promise.all(stale.map(request => cache.delete(request)));
+}
+
+// Precached response for a URL, or the network if it is missing
+async function precacheFirst(request, key) {
+  const cache = await caches.open(PRECACHE_CACHE);
+  const cached = await cache.match(key);
+  if (cached) {
+    console.log(`⚡ SW: Precache hit for ${request.url}`);
+    return cached;
+  }
+  return fetch(request);
+}
+
 // Cache-first strategy for maximum performance
 async function cacheFirstStrategy(request, cacheName = CACHE_NAME) {
   try {
@@ -126,8 +166,9 @@ async function cacheFirstStrategy(request, cacheName = CACHE_NAME) {
       // Serve cached version immediately
       console.log(`⚡ SW: Cache hit for ${request.url}`);
       
-      // Background update for critical resources
-      if (CRITICAL_RESOURCES.includes(new URL(request.url).pathname)) {
+      // Background update for unhashed optimized images
+      const path = new URL(request.url).pathname;
+      if (OPTIMIZED_IMAGE.test(path) && !HASHED_IMAGE.test(path)) {
         updateCacheInBackground(request, cache);
       }
       
@@ -210,19 +251,8 @@ self.addEventListener('sync', event => {
 // Update critical assets in background
 async function updateCriticalAssets() {
   try {
-    const cache = await caches.open(STATIC_CACHE);
-    const updatePromises = CRITICAL_ASSETS.map(async (asset) => {
-      try {
-        const response = await fetch(asset);
-        if (response.ok) {
-          await cache.put(asset, response);
-        }
-      } catch (err) {
-        console.log('[SW] Failed to update asset:', asset, err);
-      }
-    });
-    
-    await Promise.all(updatePromises);
+    // Refetches whatever is missing from the precache
+    await precacheManifest();
     console.log('[SW] Critical assets updated');
   } catch (err) {
     console.log('[SW] Failed to update critical assets:', err);